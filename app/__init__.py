@@ -3,24 +3,37 @@ from flask_sqlalchemy import SQLAlchemy
 import os
 import click
 from flask_login import LoginManager
+from sqlalchemy import inspect
+from sqlalchemy.exc import OperationalError
 
-db = SQLAlchemy()
+from app.database import RoutingSession
+
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 login_manager = LoginManager()
 login_manager.login_view = 'auth.login'
 
 @login_manager.user_loader
 def load_user(user_id):
-    from app.models import User
-    return User.query.get(int(user_id))
+    from app import identity
+    return identity.load_user(int(user_id))
 
 def create_app(config_class="app.config.Config"):
     app = Flask(__name__)
     app.config.from_object(config_class)
 
+    from . import broker, database, identity, instrumentation, llm_cache
+
     # Initialize extensions
+    database.configure(app)
     db.init_app(app)
     login_manager.init_app(app)
 
+    database.init_app(app)
+    broker.init_app(app)
+    llm_cache.init_app(app)
+    identity.init_app(app)
+    instrumentation.init_app(app)
+
     # Register blueprints
     from .auth import bp as auth_bp
     app.register_blueprint(auth_bp)
@@ -28,7 +41,7 @@ def create_app(config_class="app.config.Config"):
     from .main import bp as main_bp
     app.register_blueprint(main_bp)
 
-    _ensure_sqlite_database(app)
+    _ensure_database(app)
 
     # Register CLI commands
     register_cli_commands(app)
@@ -44,21 +57,192 @@ def register_cli_commands(app):
         from seed_demo import seed_all
         seed_all(reset=reset)
 
-
-def _ensure_sqlite_database(app):
-    """Create SQLite DB (if missing) the first time the app boots."""
-    uri = app.config.get("SQLALCHEMY_DATABASE_URI", "")
-    if not uri.startswith("sqlite"):
-        return
-
-    # Extract filesystem path from sqlite:/// URI
-    db_path = uri.replace("sqlite:///", "", 1)
-    if not os.path.isabs(db_path):
-        db_path = os.path.join(app.root_path, db_path)
-
-    if not os.path.exists(db_path):
-        os.makedirs(os.path.dirname(db_path), exist_ok=True)
-        with app.app_context():
-            db.create_all()
-
-
+    @app.cli.command('rebuild-gradebook')
+    @click.option('--course', 'course_code', default=None, help='Only rebuild this course code')
+    def rebuild_gradebook_command(course_code):
+        """Recompute the gradebook rollup from submissions and assignments."""
+        from app import gradebook
+        if course_code:
+            written = gradebook.rebuild_for_course_code(course_code)
+            if written is None:
+                raise click.ClickException(f"Unknown course code: {course_code}")
+        else:
+            written = gradebook.rebuild()
+        db.session.commit()
+        click.echo(f"Gradebook rebuilt: {written} entries written.")
+
+    @app.cli.command('rebuild-inbox')
+    def rebuild_inbox_command():
+        """Recompute conversation summaries and unread counts from messages."""
+        from app import messaging
+        messaging.rebuild_summaries()
+        db.session.commit()
+        click.echo("Inbox summaries rebuilt.")
+
+    @app.cli.command('migrate-enrollments')
+    def migrate_enrollments_command():
+        """Re-run the Classes JSON to Enrollment conversion that db-upgrade applies (idempotent)."""
+        from app import enrollments, migrations
+        migrations.upgrade()
+        records, created, skipped = enrollments.migrate_classes()
+        db.session.commit()
+        click.echo(
+            f"Read {records} class records: {created} enrollments created, "
+            f"{skipped} entries skipped."
+        )
+
+    @app.cli.command('export-gradebook')
+    @click.argument('course_code')
+    @click.option('--format', 'fmt', type=click.Choice(['csv', 'parquet']), default='csv', show_default=True)
+    @click.option('--output', '-o', type=click.Path(dir_okay=False), default=None,
+                  help='File to write (CSV defaults to stdout)')
+    def export_gradebook_command(course_code, fmt, output):
+        """Export a course gradebook: one row per student, one column per assignment."""
+        from app import gradebook_export
+        from app.models import Course
+        course = Course.query.filter_by(course_code=course_code).first()
+        if course is None:
+            raise click.ClickException(f"Unknown course code: {course_code}")
+        if fmt == 'parquet':
+            if not output:
+                raise click.ClickException("Parquet export needs --output.")
+            try:
+                gradebook_export.write_parquet(course.id, output)
+            except gradebook_export.ParquetUnavailable as exc:
+                raise click.ClickException(str(exc))
+            click.echo(f"Gradebook written to {output}.", err=True)
+            return
+        if output is None:
+            for line in gradebook_export.csv_lines(course.id):
+                click.echo(line, nl=False)
+            return
+        with open(output, 'w', newline='', encoding='utf-8') as stream:
+            for line in gradebook_export.csv_lines(course.id):
+                stream.write(line)
+        click.echo(f"Gradebook written to {output}.", err=True)
+
+    @app.cli.command('import-roster')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--course', 'course_code', default=None, help='Enroll every row in this course code')
+    @click.option('--workers', type=int, default=os.cpu_count() or 1, show_default=True,
+                  help='Processes used to hash passwords')
+    @click.option('--batch-size', type=int, default=None, help='Rows inserted per transaction')
+    def import_roster_command(path, course_code, workers, batch_size):
+        """Create accounts and enrollments from a roster CSV (safe to re-run)."""
+        from app import passwords, roster
+        from app.models import Course
+        course = None
+        if course_code:
+            course = Course.query.filter_by(course_code=course_code).first()
+            if course is None:
+                raise click.ClickException(f"Unknown course code: {course_code}")
+        with passwords.process_pool(workers) as pool, open(path, newline='', encoding='utf-8-sig') as stream:
+            try:
+                report = roster.import_roster(stream, course=course, batch_size=batch_size, executor=pool)
+            except roster.RosterError as exc:
+                raise click.ClickException(str(exc))
+        for line, message in report.errors[:50]:
+            click.echo(f"line {line}: {message}")
+        if len(report.errors) > 50:
+            click.echo(f"... and {len(report.errors) - 50} more rejected rows")
+        click.echo(report.summary())
+
+    @app.cli.command('at-risk')
+    @click.option('--full', is_flag=True, help='Recompute the whole term instead of changes since the last run')
+    @click.option('--show', 'course_code', default=None, help='Print the ranked at-risk list for this course code')
+    def at_risk_command(full, course_code):
+        """Score students for falling behind (incremental; meant to run from cron)."""
+        from app import at_risk
+        from app.models import Course
+        course = None
+        if course_code:
+            course = Course.query.filter_by(course_code=course_code).first()
+            if course is None:
+                raise click.ClickException(f"Unknown course code: {course_code}")
+        click.echo(at_risk.refresh(full=full).summary())
+        if course is not None:
+            for row, rank in at_risk.ranked([course.id], per_course=20):
+                trend = "n/a" if row.trend is None else f"{row.trend:+.1f}"
+                click.echo(
+                    f"{rank:>3}. {row.student.username:<20} risk {row.risk:>5.1f}  "
+                    f"missed {row.missed}/{row.past_due}  late {row.late}/{row.submitted}  trend {trend}"
+                )
+
+    @app.cli.command('db-upgrade')
+    def db_upgrade_command():
+        """Apply pending schema migrations (new columns and indexes)."""
+        from app import migrations
+        applied = migrations.upgrade()
+        for version, name in applied:
+            click.echo(f"Applied migration {version}: {name}")
+        click.echo(f"Database is at schema version {migrations.current_version()}.")
+
+    @app.cli.command('explain-queries')
+    def explain_queries_command():
+        """Show EXPLAIN QUERY PLAN for the hot queries; fail on full table scans."""
+        from app import migrations
+        if db.engine.dialect.name != "sqlite":
+            raise click.ClickException("EXPLAIN QUERY PLAN checks need a SQLite database.")
+        failures = []
+        for name, plan, scans in migrations.explain_hot_queries():
+            click.echo(f"{'SCAN' if scans else 'ok  '}  {name}")
+            for detail in plan:
+                click.echo(f"        {detail}")
+            if scans:
+                failures.append(name)
+        if failures:
+            raise click.ClickException(f"Full table scans in: {', '.join(failures)}")
+
+    @app.cli.command('db-maintenance')
+    def db_maintenance_command():
+        """Checkpoint the SQLite write-ahead log and run PRAGMA optimize."""
+        from app import database
+        if db.engine.dialect.name != "sqlite":
+            raise click.ClickException("Maintenance only applies to SQLite databases.")
+        busy, wal_pages, checkpointed = database.maintain()
+        if wal_pages < 0:
+            click.echo("Database is not in WAL mode; nothing to checkpoint.")
+        elif busy:
+            click.echo(f"Checkpoint blocked by active readers: {checkpointed} of {wal_pages} WAL pages copied.")
+        else:
+            click.echo(f"Checkpointed {checkpointed} WAL pages.")
+        click.echo("Query planner statistics optimized.")
+
+    @app.cli.command('llm-cache')
+    @click.option('--clear', is_flag=True, help='Remove every cached answer')
+    def llm_cache_command(clear):
+        """Show (or clear) the AI answer cache."""
+        from app import llm_cache
+        from app.cache import hit_rate
+        cache = llm_cache.get_cache()
+        if clear:
+            cache.clear()
+            click.echo("AI answer cache cleared.")
+        stats = cache.stats()
+        rate = hit_rate(stats)
+        click.echo(f"{type(cache).__name__}: {stats['entries']} cached answers.")
+        click.echo(
+            f"{stats['hits']} hits, {stats['misses']} misses, "
+            f"hit rate {'n/a' if rate is None else f'{rate:.0%}'}."
+        )
+
+
+def _ensure_database(app):
+    """Create the schema in an empty database the first time the app boots, else warn if it needs migrating."""
+    from app import migrations
+    with app.app_context():
+        engine = db.engine
+        if engine.dialect.name == "sqlite" and engine.url.database not in (None, "", ":memory:"):
+            os.makedirs(os.path.dirname(os.path.abspath(engine.url.database)), exist_ok=True)
+        try:
+            version = migrations.current_version()
+            if version == 0 and not inspect(engine).get_table_names():
+                migrations.upgrade()
+                return
+        except OperationalError as exc:
+            app.logger.warning("Could not check the database schema: %s", exc.orig)
+            return
+    if version < migrations.HEAD:
+        app.logger.warning(
+            "Database schema is at version %d of %d; run `flask db-upgrade`.", version, migrations.HEAD
+        )
@@ -0,0 +1,138 @@
+"""Paginated assignment lists with their status badges computed in SQL.
+
+A student's status for an assignment (Closed, Graded, Submitted, Overdue or
+Pending) is a ``CASE`` over the assignment and a ``LEFT JOIN`` to that
+student's latest submission (the highest id, as everywhere else a later
+submission replaces an earlier one), using the
+``ix_submission_assignment_student`` index.
+Filtering by status, course and due window and paging therefore all happen
+in one query. A page costs the same however many assignments the catalog
+holds, and nothing is decorated in a Python loop over every assignment.
+
+Students only see assignments from their enrolled courses, plus general ones
+that have no course.
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import case, func, literal, select
+from sqlalchemy.orm import aliased, joinedload
+
+from app import db, enrollments
+from app.models import Assignment, Submission
+
+BADGE_CLASSES = {
+    "Closed": "bg-gray-100 text-gray-700",
+    "Graded": "bg-green-100 text-green-700",
+    "Submitted": "bg-blue-100 text-blue-700",
+    "Overdue": "bg-red-100 text-red-700",
+    "Pending": "bg-yellow-100 text-yellow-700",
+}
+STATUSES = tuple(label.lower() for label in BADGE_CLASSES)
+# due windows offered as filters: name -> (label, days from now, or None for "already due")
+DUE_WINDOWS = {
+    "week": ("Due in the next 7 days", 7),
+    "month": ("Due in the next 30 days", 30),
+    "upcoming": ("Not yet due", 0),
+    "past": ("Past due", None),
+}
+
+
+def badge(label):
+    return {"label": label, "class": BADGE_CLASSES[label]}
+
+
+def visible_to(query, user):
+    """Limit an ``Assignment`` query to what ``user`` may see (students: enrolled and general courses)."""
+    if user.role == "student":
+        query = query.filter(
+            Assignment.course_id.is_(None)
+            | Assignment.course_id.in_(enrollments.course_ids_subquery(user.id))
+        )
+    return query
+
+
+def latest_submission(student_id):
+    """ON clause joining ``Submission`` to ``student_id``'s latest submission for each ``Assignment``."""
+    earlier = aliased(Submission)
+    latest_id = (
+        select(func.max(earlier.id))
+        .where(earlier.assignment_id == Assignment.id, earlier.student_id == student_id)
+        .correlate(Assignment)
+        .scalar_subquery()
+    )
+    return Submission.id == latest_id
+
+
+def status_column(now, with_submission=True):
+    """The badge label as a SQL expression; mirrors the order of checks on the assignment page."""
+    whens = [(Assignment.allow_submissions.is_(False), "Closed")]
+    if with_submission:
+        whens += [(Submission.status == "Graded", "Graded"), (Submission.id.isnot(None), "Submitted")]
+    whens.append((Assignment.due_date < now, "Overdue"))
+    return case(*whens, else_="Pending").label("status")
+
+
+class AssignmentFilters:
+    """Validated ``status``, ``course`` and ``due`` query-string filters; unknown values are ignored."""
+
+    def __init__(self, args):
+        status = (args.get("status") or "").lower()
+        self.status = status if status in STATUSES else None
+        self.course_id = args.get("course", type=int)
+        due = args.get("due") or None
+        self.due = due if due in DUE_WINDOWS else None
+
+    def as_args(self):
+        """The active filters, for building page links."""
+        return {
+            key: value
+            for key, value in (("status", self.status), ("course", self.course_id), ("due", self.due))
+            if value is not None
+        }
+
+
+def page(user, filters, page=1, per_page=25, now=None):
+    """Return ``(assignments, has_next)`` for one page of ``user``'s assignments by due date.
+
+    Each assignment gets ``progress_badge`` and ``submission_score`` (the
+    student's score, or ``None``) from the same row, and its course is
+    eagerly loaded, so rendering the page issues no further queries.
+    """
+    now = now or datetime.utcnow()
+    page = max(page, 1)
+    is_student = user.role == "student"
+    status = status_column(now, with_submission=is_student)
+    score = Submission.score if is_student else literal(None)
+
+    query = db.session.query(Assignment, status, score.label("score")).options(joinedload(Assignment.course))
+    if is_student:
+        query = query.outerjoin(Submission, latest_submission(user.id))
+    query = visible_to(query, user)
+
+    if filters.status:
+        query = query.filter(status == filters.status.capitalize())
+    if filters.course_id is not None:
+        query = query.filter(
+            Assignment.course_id.is_(None) if filters.course_id == 0 else Assignment.course_id == filters.course_id
+        )
+    if filters.due:
+        days = DUE_WINDOWS[filters.due][1]
+        if days is None:
+            query = query.filter(Assignment.due_date < now)
+        else:
+            query = query.filter(Assignment.due_date >= now)
+            if days:
+                query = query.filter(Assignment.due_date < now + timedelta(days=days))
+
+    rows = (
+        query.order_by(Assignment.due_date.asc(), Assignment.id.asc())
+        .offset((page - 1) * per_page)
+        .limit(per_page + 1)
+        .all()
+    )
+    assignments = []
+    for assignment, label, points in rows[:per_page]:
+        assignment.progress_badge = badge(label)
+        assignment.submission_score = points
+        assignments.append(assignment)
+    return assignments, len(rows) > per_page
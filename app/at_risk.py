@@ -0,0 +1,308 @@
+"""At-risk students: batch signals over assignments, submissions and enrollments.
+
+``refresh`` computes three signals for each student enrolled in a course:
+
+* ``missed``: past-due assignments that still accept submissions and that the
+  student has not submitted, i.e. the dashboard's "Overdue" badge;
+* ``late_ratio``: the share of the student's submitted assignments that were
+  turned in after the due date;
+* ``trend``: the least-squares slope of the student's graded percentages over
+  the course's assignments in due-date order, in percentage points per
+  assignment. A negative trend means the student is slipping.
+
+``risk`` (0-100) combines them using ``RISK_WEIGHTS``. It weights the share of
+past-due work that was missed, the late ratio, and the decline. A trend of
+``-TREND_FLOOR`` or steeper counts as a full decline. Results are stored in
+``StudentRisk``, and the instructor dashboard ranks each course's students
+at or above ``AT_RISK_THRESHOLD``.
+
+Runs are incremental. The ``at_risk`` ``PipelineWatermark`` records when the
+last run started, and the next run only recomputes:
+
+* students whose submissions were created or changed since then
+  (``Submission.updated_at``);
+* students who enrolled since then;
+* every student of a course whose assignments were edited or fell due since
+  then, because that changes everyone's missed count;
+* every student of a course that an assignment was deleted from or moved out
+  of. Nothing left in the course shows that change, so a ``CourseRescore``
+  row is written when it is flushed.
+
+Each signal is one grouped query over the affected students, so nothing loops
+over submissions in Python. The first run, or ``full=True``, covers the whole
+term. ``flask at-risk`` runs it and is meant to run from cron.
+"""
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import and_, case, delete, distinct, event, exists, false, func, insert, inspect, or_, select, tuple_
+from sqlalchemy.orm import joinedload
+
+from app import db, gradebook
+from app.models import Assignment, CourseRescore, Enrollment, PipelineWatermark, StudentRisk, Submission
+
+WATERMARK = "at_risk"
+RISK_WEIGHTS = {"missed": 50, "late": 25, "decline": 25}
+TREND_FLOOR = 10.0
+# re-read a little before the watermark so rows committed while the last run was reading are not lost
+OVERLAP = timedelta(minutes=5)
+# past this many individual students, recompute their whole courses instead of listing pairs
+MAX_PAIRS = 2000
+
+
+class RefreshReport:
+    """What one ``refresh`` recomputed."""
+
+    def __init__(self, since):
+        self.since = since
+        self.courses = 0
+        self.students = 0
+        self.removed = 0
+        self.seconds = 0.0
+
+    def summary(self):
+        scope = "full term" if self.since is None else f"changes since {self.since:%Y-%m-%d %H:%M}"
+        return (
+            f"At-risk refresh ({scope}): {self.students} students scored in {self.courses} courses, "
+            f"{self.removed} stale rows removed in {self.seconds:.2f}s."
+        )
+
+
+def threshold():
+    return current_app.config.get("AT_RISK_THRESHOLD", 25)
+
+
+def _scope(course_column, student_column, courses, pairs):
+    """Restrict to whole ``courses`` plus individual ``(course_id, student_id)`` pairs."""
+    conditions = []
+    if courses:
+        conditions.append(course_column.in_(sorted(courses)))
+    if pairs:
+        conditions.append(tuple_(course_column, student_column).in_(sorted(pairs)))
+    return or_(*conditions) if conditions else false()
+
+
+def _changes(since, now):
+    """Return ``(courses, pairs)`` that need recomputing after ``since``."""
+    courses = set(db.session.execute(
+        select(Assignment.course_id).where(
+            Assignment.course_id.isnot(None),
+            or_(Assignment.updated_at > since, and_(Assignment.due_date > since, Assignment.due_date <= now)),
+        ).distinct()
+    ).scalars())
+    courses |= set(db.session.execute(
+        select(CourseRescore.course_id).where(CourseRescore.marked_at > since).distinct()
+    ).scalars())
+    pairs = set(db.session.execute(
+        select(Assignment.course_id, Submission.student_id)
+        .join(Assignment, Assignment.id == Submission.assignment_id)
+        .where(Submission.updated_at > since, Assignment.course_id.isnot(None))
+        .distinct()
+    ).tuples())
+    pairs |= set(db.session.execute(
+        select(Enrollment.course_id, Enrollment.user_id)
+        .where(Enrollment.created_at > since, Enrollment.role == "student")
+    ).tuples())
+    pairs = {pair for pair in pairs if pair[0] not in courses}
+    if len(pairs) > MAX_PAIRS:
+        courses |= {course_id for course_id, _ in pairs}
+        pairs = set()
+    return courses, pairs
+
+
+def _slope(n, sum_x, sum_y, sum_xy, sum_xx):
+    denominator = n * sum_xx - sum_x * sum_x
+    if n < 2 or not denominator:
+        return None
+    return (n * sum_xy - sum_x * sum_y) / denominator
+
+
+def risk_score(past_due, missed, late_ratio, trend):
+    missed_share = missed / past_due if past_due else 0.0
+    decline = min(max(-trend, 0.0) / TREND_FLOOR, 1.0) if trend is not None else 0.0
+    return round(
+        RISK_WEIGHTS["missed"] * missed_share
+        + RISK_WEIGHTS["late"] * (late_ratio or 0.0)
+        + RISK_WEIGHTS["decline"] * decline,
+        1,
+    )
+
+
+def _signals(now, courses=None, pairs=None):
+    """Compute ``StudentRisk`` rows for the scope (everything when both are ``None``)."""
+    full = courses is None and pairs is None
+
+    enrolled = select(Enrollment.course_id, Enrollment.user_id).where(Enrollment.role == "student")
+    if not full:
+        enrolled = enrolled.where(_scope(Enrollment.course_id, Enrollment.user_id, courses, pairs))
+    students = db.session.execute(enrolled).tuples().all()
+    if not students:
+        return []
+    in_courses = (
+        Assignment.course_id.isnot(None) if full
+        else Assignment.course_id.in_(sorted({course_id for course_id, _ in students}))
+    )
+
+    open_past_due = and_(Assignment.allow_submissions.is_(True), Assignment.due_date < now)
+    past_due = dict(db.session.execute(
+        select(Assignment.course_id, func.count())
+        .where(in_courses, open_past_due)
+        .group_by(Assignment.course_id)
+    ).tuples().all())
+
+    late = and_(Submission.submitted_at.isnot(None), Submission.submitted_at > Assignment.due_date)
+    activity = (
+        select(
+            Assignment.course_id,
+            Submission.student_id,
+            func.count(distinct(case((open_past_due, Submission.assignment_id)))),
+            func.count(distinct(case((Submission.submitted_at.isnot(None), Submission.assignment_id)))),
+            func.count(distinct(case((late, Submission.assignment_id)))),
+        )
+        .join(Assignment, Assignment.id == Submission.assignment_id)
+        .where(in_courses)
+        .group_by(Assignment.course_id, Submission.student_id)
+    )
+    if not full:
+        activity = activity.where(_scope(Assignment.course_id, Submission.student_id, courses, pairs))
+    counts = {(c, s): rest for c, s, *rest in db.session.execute(activity).tuples()}
+
+    sequence = (
+        select(
+            Assignment.id.label("assignment_id"),
+            Assignment.course_id,
+            Assignment.points,
+            func.row_number().over(
+                partition_by=Assignment.course_id, order_by=(Assignment.due_date, Assignment.id)
+            ).label("x"),
+        )
+        .where(in_courses)
+        .subquery()
+    )
+    y = Submission.score * 100.0 / sequence.c.points
+    grades = (
+        select(
+            sequence.c.course_id,
+            Submission.student_id,
+            func.count(),
+            func.sum(sequence.c.x),
+            func.sum(y),
+            func.sum(sequence.c.x * y),
+            func.sum(sequence.c.x * sequence.c.x),
+        )
+        .join(sequence, sequence.c.assignment_id == Submission.assignment_id)
+        .where(gradebook.graded(), sequence.c.points > 0)
+        .group_by(sequence.c.course_id, Submission.student_id)
+    )
+    if not full:
+        grades = grades.where(_scope(sequence.c.course_id, Submission.student_id, courses, pairs))
+    trends = {(c, s): _slope(*(float(v) for v in sums)) for c, s, *sums in db.session.execute(grades).tuples()}
+
+    rows = []
+    for course_id, student_id in students:
+        submitted_past_due, submitted, late_count = counts.get((course_id, student_id), (0, 0, 0))
+        course_past_due = past_due.get(course_id, 0)
+        missed = course_past_due - submitted_past_due
+        late_ratio = late_count / submitted if submitted else None
+        trend = trends.get((course_id, student_id))
+        rows.append({
+            "course_id": course_id,
+            "student_id": student_id,
+            "past_due": course_past_due,
+            "missed": missed,
+            "submitted": submitted,
+            "late": late_count,
+            "late_ratio": round(late_ratio, 3) if late_ratio is not None else None,
+            "trend": round(trend, 2) if trend is not None else None,
+            "risk": risk_score(course_past_due, missed, late_ratio, trend),
+            "computed_at": now,
+        })
+    return rows
+
+
+def refresh(full=False, now=None):
+    """Recompute at-risk rows changed since the last run (or all of them) and commit."""
+    began = time.perf_counter()
+    now = now or datetime.utcnow()
+    mark = db.session.get(PipelineWatermark, WATERMARK)
+    since = None if full or mark is None else mark.high_water - OVERLAP
+    report = RefreshReport(since)
+
+    if since is None:
+        courses = pairs = None
+        db.session.execute(delete(StudentRisk))
+    else:
+        courses, pairs = _changes(since, now)
+    rows = _signals(now, courses, pairs) if since is None or courses or pairs else []
+    if since is not None and rows:
+        db.session.execute(
+            delete(StudentRisk).where(_scope(StudentRisk.course_id, StudentRisk.student_id, courses, pairs))
+        )
+    if rows:
+        db.session.execute(insert(StudentRisk), rows)
+
+    # students who left a course since the last run
+    removed = db.session.execute(
+        delete(StudentRisk).where(~exists().where(
+            Enrollment.course_id == StudentRisk.course_id,
+            Enrollment.user_id == StudentRisk.student_id,
+            Enrollment.role == "student",
+        ))
+    )
+
+    # the next run reads from now - OVERLAP, so older markers have been handled
+    db.session.execute(delete(CourseRescore).where(CourseRescore.marked_at <= now - OVERLAP))
+
+    if mark is None:
+        db.session.add(PipelineWatermark(name=WATERMARK, high_water=now))
+    else:
+        mark.high_water = now
+    db.session.commit()
+
+    report.courses = len({row["course_id"] for row in rows})
+    report.students = len(rows)
+    report.removed = removed.rowcount or 0
+    report.seconds = time.perf_counter() - began
+    return report
+
+
+def ranked(course_ids, per_course=5):
+    """The highest-risk students at or above ``AT_RISK_THRESHOLD`` in each course.
+
+    Returns ``(StudentRisk, rank)`` pairs ordered by course, then rank.
+    ``course_ids`` may be a list or a selectable of ids.
+    """
+    rank = func.row_number().over(
+        partition_by=StudentRisk.course_id, order_by=(StudentRisk.risk.desc(), StudentRisk.id)
+    ).label("rank")
+    top = (
+        select(StudentRisk.id, rank)
+        .where(StudentRisk.course_id.in_(course_ids), StudentRisk.risk >= threshold())
+        .subquery()
+    )
+    return (
+        db.session.query(StudentRisk, top.c.rank)
+        .join(top, top.c.id == StudentRisk.id)
+        .filter(top.c.rank <= per_course)
+        .options(joinedload(StudentRisk.student), joinedload(StudentRisk.course))
+        .order_by(StudentRisk.course_id, top.c.rank)
+        .all()
+    )
+
+
+def _mark_for_rescore(connection, course_id):
+    connection.execute(insert(CourseRescore).values(course_id=course_id, marked_at=datetime.utcnow()))
+
+
+@event.listens_for(Assignment, "after_delete")
+def _assignment_deleted(mapper, connection, target):
+    if target.course_id is not None:
+        _mark_for_rescore(connection, target.course_id)
+
+
+@event.listens_for(Assignment, "after_update")
+def _assignment_moved(mapper, connection, target):
+    for course_id in inspect(target).attrs.course_id.history.deleted:
+        if course_id is not None:
+            _mark_for_rescore(connection, course_id)
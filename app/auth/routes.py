@@ -3,7 +3,7 @@ from flask_login import login_user, logout_user, login_required
 from . import bp
 from app.forms import LoginForm
 from app.forms import CreateAccountForm
-from app import db
+from app import db, passwords
 from app.models import User
 
 
@@ -16,6 +16,10 @@ def login():
         
 
         if user and user.check_password(form.password.data):  
+            if passwords.needs_rehash(user.password):
+                # the hash policy changed since this password was stored
+                user.set_password(form.password.data)
+                db.session.commit()
             login_user(user)
             return redirect("/home")  # Simple redirect, or use url_for('main.home')
         else:
@@ -0,0 +1,256 @@
+"""Publish/subscribe brokers for real-time events.
+
+``MESSAGE_BROKER_URL`` picks the backend:
+
+* ``memory://`` (default) delivers events between threads of one process,
+  which is all a single worker needs.
+* ``redis://host:port`` speaks the Redis protocol (RESP) over a plain socket, so
+  several workers or hosts can share events through a Redis server, or anything
+  that implements ``PUBLISH``/``SUBSCRIBE``. No client library is required.
+
+Events are JSON-serializable dicts. Subscribers poll with ``get(timeout)``,
+which returns ``None`` when nothing arrived in time.
+"""
+import json
+import queue
+import socket
+import threading
+from collections import defaultdict
+from urllib.parse import urlparse
+
+from flask import current_app
+
+CHANNEL_PREFIX = "spartansync:"
+
+
+class MemorySubscription:
+    def __init__(self, broker, channels):
+        self._broker = broker
+        self.channels = channels
+        self._queue = queue.Queue(maxsize=broker.max_pending)
+
+    def _deliver(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            # a stalled client must not block publishers; it reloads on reconnect
+            pass
+
+    def get(self, timeout=None):
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self._broker._unsubscribe(self)
+
+
+class MemoryBroker:
+    """In-process broker: every subscriber gets its own bounded queue."""
+
+    def __init__(self, max_pending=1000):
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def publish(self, channel, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            subscription._deliver(event)
+        return len(subscribers)
+
+    def subscribe(self, *channels):
+        subscription = MemorySubscription(self, channels)
+        with self._lock:
+            for channel in channels:
+                self._subscribers[channel].add(subscription)
+        return subscription
+
+    def _unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._subscribers.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscribers[channel]
+
+
+class RespError(Exception):
+    """Error reply from the server, or a broken connection."""
+
+
+def encode_command(*args):
+    parts = [f"*{len(args)}\r\n".encode()]
+    for arg in args:
+        if not isinstance(arg, bytes):
+            arg = str(arg).encode()
+        parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+    return b"".join(parts)
+
+
+class _Incomplete(Exception):
+    pass
+
+
+def _parse(buffer, pos=0):
+    """Parse one RESP value from ``buffer`` at ``pos``; returns ``(value, next_pos)``."""
+    end = buffer.find(b"\r\n", pos)
+    if end < 0:
+        raise _Incomplete()
+    kind, line = buffer[pos:pos + 1], buffer[pos + 1:end]
+    pos = end + 2
+    if kind == b"+":
+        return line.decode(), pos
+    if kind == b"-":
+        return RespError(line.decode()), pos
+    if kind == b":":
+        return int(line), pos
+    if kind == b"$":
+        length = int(line)
+        if length < 0:
+            return None, pos
+        if len(buffer) < pos + length + 2:
+            raise _Incomplete()
+        return buffer[pos:pos + length], pos + length + 2
+    if kind == b"*":
+        count = int(line)
+        if count < 0:
+            return None, pos
+        items = []
+        for _ in range(count):
+            item, pos = _parse(buffer, pos)
+            items.append(item)
+        return items, pos
+    raise RespError(f"unexpected RESP type {kind!r}")
+
+
+class RespConnection:
+    """Minimal blocking RESP client connection."""
+
+    def __init__(self, host, port, password=None, connect_timeout=5):
+        self._sock = socket.create_connection((host, port), timeout=connect_timeout)
+        self._buffer = b""
+        if password:
+            self.call("AUTH", password)
+
+    def send(self, *args):
+        self._sock.sendall(encode_command(*args))
+
+    def read(self, timeout=None):
+        """Read one reply; returns ``None`` if ``timeout`` expires first."""
+        self._sock.settimeout(timeout)
+        while True:
+            try:
+                value, pos = _parse(self._buffer)
+            except _Incomplete:
+                try:
+                    chunk = self._sock.recv(65536)
+                except socket.timeout:
+                    return None
+                if not chunk:
+                    raise RespError("connection closed by server")
+                self._buffer += chunk
+                continue
+            self._buffer = self._buffer[pos:]
+            if isinstance(value, RespError):
+                raise value
+            return value
+
+    def call(self, *args):
+        self.send(*args)
+        return self.read(timeout=None)
+
+    def close(self):
+        try:
+            self._sock.close()
+        except OSError:
+            pass
+
+
+class RedisSubscription:
+    def __init__(self, broker, channels):
+        self.channels = channels
+        self._conn = broker._connect()
+        self._conn.send("SUBSCRIBE", *(CHANNEL_PREFIX + c for c in channels))
+        confirmed = 0
+        while confirmed < len(channels):
+            reply = self._conn.read(timeout=broker.connect_timeout)
+            if reply is None:
+                raise RespError("timed out waiting for SUBSCRIBE confirmation")
+            if reply[0] == b"subscribe":
+                confirmed += 1
+
+    def get(self, timeout=None):
+        reply = self._conn.read(timeout=timeout)
+        if not reply or reply[0] != b"message":
+            return None
+        return json.loads(reply[2])
+
+    def close(self):
+        self._conn.close()
+
+
+class RedisBroker:
+    """Broker backed by a Redis-protocol server; one socket per subscriber."""
+
+    def __init__(self, host="localhost", port=6379, password=None, connect_timeout=5):
+        self.host = host
+        self.port = port
+        self.password = password
+        self.connect_timeout = connect_timeout
+        self._publish_lock = threading.Lock()
+        self._publisher = None
+
+    def _connect(self):
+        return RespConnection(self.host, self.port, self.password, self.connect_timeout)
+
+    def publish(self, channel, event):
+        payload = json.dumps(event)
+        with self._publish_lock:
+            for attempt in range(2):
+                try:
+                    if self._publisher is None:
+                        self._publisher = self._connect()
+                    return self._publisher.call("PUBLISH", CHANNEL_PREFIX + channel, payload)
+                except (OSError, RespError):
+                    if self._publisher is not None:
+                        self._publisher.close()
+                        self._publisher = None
+                    if attempt:
+                        raise
+
+    def subscribe(self, *channels):
+        return RedisSubscription(self, channels)
+
+
+def create_broker(url):
+    parsed = urlparse(url or "memory://")
+    if parsed.scheme == "memory":
+        return MemoryBroker()
+    if parsed.scheme == "redis":
+        return RedisBroker(
+            host=parsed.hostname or "localhost",
+            port=parsed.port or 6379,
+            password=parsed.password,
+        )
+    raise ValueError(f"Unsupported MESSAGE_BROKER_URL scheme: {parsed.scheme!r}")
+
+
+def init_app(app):
+    app.extensions["broker"] = create_broker(app.config.get("MESSAGE_BROKER_URL"))
+
+
+def get_broker():
+    return current_app.extensions["broker"]
+
+
+def publish(channel, event):
+    """Publish without letting a broker outage fail the request that triggered it."""
+    try:
+        return get_broker().publish(channel, event)
+    except (OSError, RespError):
+        current_app.logger.exception("Could not publish event to %s", channel)
+        return 0
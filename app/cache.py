@@ -0,0 +1,92 @@
+"""In-process caches shared by the AI answer cache and the identity cache.
+
+``MemoryCache`` is a thread-safe LRU with a time-to-live; ``NullCache`` has the
+same interface and stores nothing, for when a cache is turned off. Both count
+their hits and misses.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class CountingCache:
+    """Base class: counts lookups that hit and miss."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._counter_lock = threading.Lock()
+
+    def _count(self, hit):
+        with self._counter_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self)}
+
+
+def hit_rate(stats):
+    """Fraction of lookups answered from the cache, or ``None`` before the first lookup."""
+    lookups = stats["hits"] + stats["misses"]
+    return stats["hits"] / lookups if lookups else None
+
+
+class NullCache(CountingCache):
+    def get(self, key):
+        self._count(False)
+        return None
+
+    def set(self, key, value):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def clear(self):
+        pass
+
+    def __len__(self):
+        return 0
+
+
+class MemoryCache(CountingCache):
+    """Per-process LRU cache with a time-to-live."""
+
+    def __init__(self, max_entries=1000, ttl=86400):
+        super().__init__()
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.time():
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+        self._count(entry is not None)
+        return entry[1] if entry is not None else None
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
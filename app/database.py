@@ -0,0 +1,182 @@
+"""Database engine configuration: pooling, SQLite tuning and read replicas.
+
+The app runs on SQLite (the default) or on PostgreSQL, chosen by
+``DATABASE_URL``. ``configure`` turns the ``DATABASE_*`` settings into engine
+options before Flask-SQLAlchemy builds its engines. SQLite gets connection
+pragmas. Server databases get pool sizing, pre-ping and a statement timeout.
+
+SQLite tuning
+-------------
+With SQLite's default rollback journal, a writer locks readers out while it
+commits, and every commit waits for an fsync. When graders and students use the
+app at the same time, requests queue up behind each other and some fail with
+"database is locked". Write-ahead logging lets readers continue while a writer
+commits. ``synchronous=NORMAL`` skips the per-commit fsync, which is still
+crash-safe in WAL mode. The busy timeout makes writers wait for the lock
+instead of failing at once.
+
+``SQLITE_PRAGMAS`` is applied to every new connection. Its defaults live in
+``Config``; ``configure`` fills them in for configs that leave the setting
+out. Pragmas are set in the order given, so ``busy_timeout`` comes first and the switch to WAL can wait
+out other connections. An empty mapping keeps SQLite's defaults. In-memory
+databases cannot use WAL or mmap, so those two pragmas are skipped for them.
+
+``maintain`` checkpoints the WAL file back into the database and runs
+``PRAGMA optimize``. ``flask db-maintenance`` calls it and is meant to run from
+cron.
+
+Read replicas
+-------------
+When ``DATABASE_REPLICA_URL`` is set, a second engine is created for it. Views
+decorated with ``read_only`` send their SELECTs to the replica. Flushes, DML
+and every other view keep using the primary. A replica can lag behind the
+primary, so only use ``read_only`` on pages that tolerate slightly stale
+data.
+"""
+from functools import partial, wraps
+
+import sqlalchemy as sa
+from flask import current_app, g, has_request_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+from sqlalchemy.engine import make_url
+
+from app.config import Config
+
+_REPLICA = "database_replica"
+
+_FILE_ONLY = {"journal_mode", "mmap_size"}
+
+
+def _db():
+    return current_app.extensions["sqlalchemy"]
+
+
+def normalize_url(url):
+    """Accept the ``postgres://`` scheme that hosting providers hand out."""
+    if url and url.startswith("postgres://"):
+        return "postgresql://" + url[len("postgres://"):]
+    return url
+
+
+def engine_options(config, url):
+    """Engine keyword arguments for ``url`` from the ``DATABASE_*`` settings."""
+    backend = make_url(url).get_backend_name()
+    if backend == "sqlite":
+        return {}
+    options = {
+        "pool_size": config.get("DATABASE_POOL_SIZE", 10),
+        "max_overflow": config.get("DATABASE_MAX_OVERFLOW", 20),
+        "pool_timeout": config.get("DATABASE_POOL_TIMEOUT", 30),
+        "pool_recycle": config.get("DATABASE_POOL_RECYCLE", 1800),
+        "pool_pre_ping": config.get("DATABASE_POOL_PRE_PING", True),
+    }
+    timeout = config.get("DATABASE_STATEMENT_TIMEOUT_MS", 0)
+    if timeout and backend == "postgresql":
+        options["connect_args"] = {"options": f"-c statement_timeout={int(timeout)}"}
+    return options
+
+
+def configure(app):
+    """Fill in engine options; call before ``db.init_app``."""
+    uri = normalize_url(app.config.get("SQLALCHEMY_DATABASE_URI"))
+    app.config["SQLALCHEMY_DATABASE_URI"] = uri
+    app.config.setdefault("SQLITE_PRAGMAS", dict(Config.SQLITE_PRAGMAS))
+    # explicit SQLALCHEMY_ENGINE_OPTIONS win over the DATABASE_* settings
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        **engine_options(app.config, uri),
+        **(app.config.get("SQLALCHEMY_ENGINE_OPTIONS") or {}),
+    }
+
+
+def _is_memory(engine):
+    database = engine.url.database
+    return not database or database == ":memory:" or database.startswith("file::memory:")
+
+
+def _set_pragmas(pragmas, dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+    finally:
+        cursor.close()
+
+
+def init_app(app):
+    with app.app_context():
+        engines = list(_db().engines.values())
+    replica_url = normalize_url(app.config.get("DATABASE_REPLICA_URL"))
+    if replica_url:
+        replica = sa.create_engine(replica_url, **engine_options(app.config, replica_url))
+        app.extensions[_REPLICA] = replica
+        engines.append(replica)
+
+    pragmas = app.config["SQLITE_PRAGMAS"]
+    if not pragmas:
+        return
+    for engine in engines:
+        if engine.dialect.name != "sqlite":
+            continue
+        applied = dict(pragmas)
+        if _is_memory(engine):
+            for name in _FILE_ONLY:
+                applied.pop(name, None)
+        event.listen(engine, "connect", partial(_set_pragmas, applied))
+
+
+def pragma_values(connection=None, names=None):
+    """Current values of the tuning pragmas on ``connection``."""
+    connection = connection or _db().session.connection()
+    names = names or current_app.config["SQLITE_PRAGMAS"] or Config.SQLITE_PRAGMAS
+    return {name: connection.execute(text(f"PRAGMA {name}")).scalar() for name in names}
+
+
+def maintain(engine=None):
+    """Checkpoint the WAL into the database file and refresh planner statistics.
+
+    Returns ``(busy, wal_pages, checkpointed_pages)`` from ``wal_checkpoint``;
+    the page counts are -1 when the database is not in WAL mode.
+    """
+    engine = engine or _db().engine
+    with engine.connect() as connection:
+        busy, log, checkpointed = connection.execute(text("PRAGMA wal_checkpoint(TRUNCATE)")).one()
+        connection.execute(text("PRAGMA optimize"))
+        connection.commit()
+    return busy, log, checkpointed
+
+
+def read_only(view):
+    """Serve a view's SELECTs from the read replica, when one is configured."""
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        g._read_replica = True
+        try:
+            return view(*args, **kwargs)
+        finally:
+            g._read_replica = False
+    return wrapped
+
+
+def replica_engine():
+    """The read replica engine, or ``None`` when no replica is configured."""
+    return current_app.extensions.get(_REPLICA)
+
+
+def _reading_from_replica():
+    return has_request_context() and g.get("_read_replica", False)
+
+
+class RoutingSession(Session):
+    """Session that sends SELECTs from ``read_only`` views to the replica bind."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        if bind is not None or self._flushing or not _reading_from_replica():
+            return engine
+        replica = replica_engine()
+        if replica is None or engine is not self._db.engines.get(None):
+            return engine
+        if not isinstance(clause, sa.Select):
+            return engine
+        return replica
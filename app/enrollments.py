@@ -0,0 +1,149 @@
+"""Course enrollment queries backed by the ``Enrollment`` table.
+
+Enrollment used to live in a per-user JSON list (``Classes.classes``) that had
+to be decoded in Python for every request. These helpers answer the same
+questions with indexed lookups. ``migrate_classes`` converts the legacy
+rows; migration 10 runs it, so ``flask db-upgrade`` fills ``Enrollment`` on an
+existing database. Free-form link cards in the legacy list are not courses, so they
+stay in ``Classes`` and ``link_cards`` reads them back for the dashboard.
+
+``Enrollment.role`` copies the user's role so course queries can filter on
+it with the ``ix_enrollment_course_role`` index; ``_sync_roles`` keeps the
+copy current when a user's role changes.
+"""
+from sqlalchemy import event, inspect, select, update
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models import Classes, Course, Enrollment, User
+
+
+def course_ids_for(user_id):
+    rows = db.session.query(Enrollment.course_id).filter(
+        Enrollment.user_id == user_id
+    ).order_by(Enrollment.id).all()
+    return [course_id for (course_id,) in rows]
+
+
+def course_ids_subquery(user_id):
+    """Selectable of a user's course ids, for use inside ``column.in_()``."""
+    return select(Enrollment.course_id).where(Enrollment.user_id == user_id)
+
+
+def member_ids(course_id, role="student"):
+    rows = db.session.query(Enrollment.user_id).filter(
+        Enrollment.course_id == course_id,
+        Enrollment.role == role,
+    ).all()
+    return [user_id for (user_id,) in rows]
+
+
+def enrolled_courses(user_id):
+    """Courses a user is enrolled in, in the order they enrolled."""
+    return Course.query.join(Enrollment, Enrollment.course_id == Course.id).filter(
+        Enrollment.user_id == user_id
+    ).order_by(Enrollment.id).all()
+
+
+def link_cards(user_id):
+    """Free-form ``{"title", "link", ...}`` cards from the user's legacy ``Classes`` row."""
+    record = Classes.query.filter_by(user=user_id).first()
+    if record is None:
+        return []
+    return [
+        {
+            "title": entry["title"],
+            "course_code": entry.get("course_code", ""),
+            "description": entry.get("description", ""),
+            "link": entry.get("link"),
+            "grade_info": None,
+        }
+        for entry in record.classes or []
+        if isinstance(entry, dict) and entry.get("title")
+    ]
+
+
+def set_courses(user, course_ids):
+    """Make ``user``'s enrollments match ``course_ids``. Does not commit."""
+    wanted = set(course_ids)
+    current = {
+        e.course_id: e for e in Enrollment.query.filter_by(user_id=user.id).all()
+    }
+    for course_id, enrollment in current.items():
+        if course_id not in wanted:
+            db.session.delete(enrollment)
+    for course_id in dict.fromkeys(course_ids):
+        if course_id not in current:
+            db.session.add(Enrollment(user_id=user.id, course_id=course_id, role=user.role))
+
+
+def _legacy_course_id(entry):
+    if isinstance(entry, int):
+        return entry
+    if isinstance(entry, str) and entry.isdigit():
+        return int(entry)
+    if isinstance(entry, dict):
+        if "course_id" in entry:
+            return entry["course_id"]
+        if not entry.get("title"):
+            return entry.get("id")
+    return None
+
+
+def migrate_classes(connection=None):
+    """Convert every legacy ``Classes`` row into ``Enrollment`` rows.
+
+    Used by migration 10 and ``flask migrate-enrollments``; ``connection``
+    defaults to the session's. Safe to run more than once: existing
+    enrollments are left alone. Returns
+    ``(records_read, enrollments_created, entries_skipped)``; skipped entries are
+    free-form link cards, which stay in ``Classes`` and are still shown (see
+    ``link_cards``), or ids of courses that no longer exist. Does not commit.
+    """
+    connection = connection or db.session.connection()
+    course_ids = set(connection.execute(select(Course.id)).scalars())
+    roles = dict(connection.execute(select(User.id, User.role)).all())
+    existing = set(connection.execute(select(Enrollment.user_id, Enrollment.course_id)).all())
+
+    records = skipped = 0
+    rows = []
+    for user_id, entries in connection.execute(select(Classes.user, Classes.classes).order_by(Classes.id)):
+        records += 1
+        for entry in entries or []:
+            course_id = _legacy_course_id(entry)
+            if course_id not in course_ids or user_id not in roles:
+                skipped += 1
+                continue
+            if (user_id, course_id) in existing:
+                continue
+            rows.append({"user_id": user_id, "course_id": course_id, "role": roles[user_id]})
+            existing.add((user_id, course_id))
+    if rows:
+        connection.execute(Enrollment.__table__.insert(), rows)
+    return records, len(rows), skipped
+
+
+@event.listens_for(Session, "after_flush")
+def _sync_roles(session, flush_context):
+    changed = {
+        obj.id: obj.role for obj in session.dirty
+        if isinstance(obj, User) and inspect(obj).attrs.role.history.has_changes()
+    }
+    if not changed:
+        return
+    connection = session.connection()
+    for user_id, role in changed.items():
+        connection.execute(
+            update(Enrollment.__table__).where(Enrollment.__table__.c.user_id == user_id).values(role=role)
+        )
+    session.info.setdefault("role_changes", set()).update(changed)
+
+
+@event.listens_for(Session, "after_flush_postexec")
+def _expire_stale_roles(session, flush_context):
+    changed = session.info.pop("role_changes", None)
+    if not changed:
+        return
+    for obj in list(session.identity_map.values()):
+        if isinstance(obj, Enrollment) and obj.user_id in changed:
+            session.expire(obj, ["role"])
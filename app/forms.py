@@ -1,4 +1,5 @@
 from flask_wtf import FlaskForm
+from flask_wtf.file import FileAllowed, FileField, FileRequired
 from wtforms import (
     StringField,
     PasswordField,
@@ -83,6 +84,16 @@ class CourseForm(FlaskForm):
     submit = SubmitField('Save Course')
 
 
+class RosterImportForm(FlaskForm):
+    roster = FileField('Roster CSV', validators=[FileRequired(), FileAllowed(['csv'], 'Upload a .csv file.')])
+    submit = SubmitField('Import Roster')
+
+
+class BulkGradeForm(FlaskForm):
+    grades = FileField('Grades CSV', validators=[FileRequired(), FileAllowed(['csv'], 'Upload a .csv file.')])
+    submit = SubmitField('Upload Grades')
+
+
 class ClassSelectionForm(FlaskForm):
     courses = SelectMultipleField('Select Classes', coerce=int)
     submit = SubmitField('Save Selection')
@@ -0,0 +1,262 @@
+"""Persisted gradebook rollup.
+
+``GradebookEntry`` keeps earned/possible points per student, course and
+category. Grading and assignment deletion adjust the affected rows
+incrementally, so pages can read a student's grades for every course in one
+query. The weighted final grade is derived from the stored categories when
+read, which keeps it correct if ``GRADE_WEIGHTS`` changes.
+
+A submission counts toward a grade only while it is ``Graded`` and has a
+score (``counts``, or ``graded()`` in SQL). A resubmission goes back to
+``Submitted`` and keeps its old score, and drops out until it is graded again.
+The rollup, the reference calculation, the export, analytics and the at-risk
+pipeline all use this rule.
+"""
+from flask import current_app
+from sqlalchemy import and_, delete, func, select
+
+from app import db
+from app.models import Assignment, Course, GradebookEntry, Submission
+
+DEFAULT_WEIGHTS = {
+    "homework": 30,
+    "exam": 50,
+    "project": 20,
+}
+
+
+def grade_weights():
+    return current_app.config.get("GRADE_WEIGHTS", DEFAULT_WEIGHTS)
+
+
+def category_for(category, weights=None):
+    """Map an assignment category onto a weighted bucket (unknown -> homework)."""
+    weights = weights if weights is not None else grade_weights()
+    return category if category in weights else "homework"
+
+
+def empty_grade_info():
+    return {'grade': None, 'category_grades': {}, 'has_grades': False}
+
+
+def grade_info(category_data, weights=None):
+    """Build the weighted grade dict from ``{category: {'earned', 'possible'}}``."""
+    weights = weights if weights is not None else grade_weights()
+
+    total_weighted = 0
+    total_weight_used = 0
+    category_grades = {}
+
+    for cat in weights.keys():
+        data = category_data.get(cat)
+        if not data or data['possible'] <= 0:
+            continue
+        percentage = (data['earned'] / data['possible']) * 100
+        category_grades[cat] = {
+            'earned': data['earned'],
+            'possible': data['possible'],
+            'percentage': round(percentage, 1),
+        }
+        total_weighted += percentage * weights[cat]
+        total_weight_used += weights[cat]
+
+    # normalize all the categories if not all the categories have grades in
+    if total_weight_used > 0:
+        final_grade = total_weighted / total_weight_used
+    else:
+        final_grade = None
+
+    return {
+        'grade': round(final_grade, 1) if final_grade is not None else None,
+        'category_grades': category_grades,
+        'has_grades': total_weight_used > 0,
+    }
+
+
+def grades_for_student(student_id, course_ids=None):
+    """Return ``{course_id: grade_info}`` for a student using a single query."""
+    query = GradebookEntry.query.filter(GradebookEntry.student_id == student_id)
+    if course_ids is not None:
+        course_ids = list(course_ids)
+        if not course_ids:
+            return {}
+        query = query.filter(GradebookEntry.course_id.in_(course_ids))
+
+    per_course = {}
+    for entry in query.all():
+        per_course.setdefault(entry.course_id, {})[entry.category] = {
+            'earned': entry.earned,
+            'possible': entry.possible,
+        }
+
+    weights = grade_weights()
+    return {cid: grade_info(data, weights) for cid, data in per_course.items()}
+
+
+def counts(status, score):
+    """Whether a submission in this state counts toward the student's grade."""
+    return status == "Graded" and score is not None
+
+
+def graded():
+    """``counts`` as a SQL condition on ``Submission``."""
+    return and_(Submission.status == "Graded", Submission.score.isnot(None))
+
+
+def _contribution(status, score, points):
+    if counts(status, score):
+        return score, points
+    return 0, 0
+
+
+def _apply_deltas(course_id, deltas):
+    """Add ``{(student_id, category): (earned, possible)}`` onto stored entries."""
+    deltas = {key: value for key, value in deltas.items() if value != (0, 0)}
+    if course_id is None or not deltas:
+        return
+
+    student_ids = {student_id for student_id, _ in deltas}
+    existing = {
+        (e.student_id, e.category): e
+        for e in GradebookEntry.query.filter(
+            GradebookEntry.course_id == course_id,
+            GradebookEntry.student_id.in_(student_ids),
+        ).all()
+    }
+
+    for (student_id, category), (earned, possible) in deltas.items():
+        entry = existing.get((student_id, category))
+        if entry is None:
+            entry = GradebookEntry(
+                student_id=student_id,
+                course_id=course_id,
+                category=category,
+                earned=0,
+                possible=0,
+            )
+            db.session.add(entry)
+        entry.earned = (entry.earned or 0) + earned
+        entry.possible = (entry.possible or 0) + possible
+        entry.percentage = (
+            round(entry.earned / entry.possible * 100, 1) if entry.possible > 0 else None
+        )
+
+
+def record_grade_change(submission, old_status, old_score):
+    """Apply the difference between a submission's previous and current grade.
+
+    Call after mutating ``submission`` and before committing.
+    """
+    assignment = submission.assignment
+    if assignment is None or assignment.course_id is None:
+        return
+
+    old_earned, old_possible = _contribution(old_status, old_score, assignment.points)
+    new_earned, new_possible = _contribution(submission.status, submission.score, assignment.points)
+    key = (submission.student_id, category_for(assignment.category))
+    _apply_deltas(assignment.course_id, {
+        key: (new_earned - old_earned, new_possible - old_possible),
+    })
+
+
+def record_grade_changes(assignment, changes):
+    """Apply many grade changes on one assignment with a single entry lookup.
+
+    ``changes`` holds ``(student_id, old_status, old_score, new_status,
+    new_score)`` tuples. Call before committing.
+    """
+    if assignment.course_id is None:
+        return
+    category = category_for(assignment.category)
+    deltas = {}
+    for student_id, old_status, old_score, new_status, new_score in changes:
+        old_earned, old_possible = _contribution(old_status, old_score, assignment.points)
+        new_earned, new_possible = _contribution(new_status, new_score, assignment.points)
+        earned, possible = deltas.get((student_id, category), (0, 0))
+        deltas[(student_id, category)] = (
+            earned + new_earned - old_earned,
+            possible + new_possible - old_possible,
+        )
+    _apply_deltas(assignment.course_id, deltas)
+
+
+def _graded_scores(assignment_id):
+    return db.session.query(Submission.student_id, Submission.score).filter(
+        Submission.assignment_id == assignment_id,
+        graded(),
+    ).all()
+
+
+def remove_assignment(assignment):
+    """Subtract every graded submission of ``assignment``; call before deleting it."""
+    if assignment.course_id is None:
+        return
+    category = category_for(assignment.category)
+    _apply_deltas(assignment.course_id, {
+        (student_id, category): (-score, -assignment.points)
+        for student_id, score in _graded_scores(assignment.id)
+    })
+
+
+def rebuild(course_id=None, connection=None):
+    """Recompute the gradebook from ``Submission`` and ``Assignment``.
+
+    Used by migration 11 and ``flask rebuild-gradebook``; ``connection``
+    defaults to the session's. Returns the number of entries written. Does not
+    commit.
+    """
+    session_connection = connection is None
+    connection = connection or db.session.connection()
+    entries = GradebookEntry.__table__
+    clear = delete(entries)
+    if course_id is not None:
+        clear = clear.where(entries.c.course_id == course_id)
+    connection.execute(clear)
+
+    query = (
+        select(
+            Submission.student_id,
+            Assignment.course_id,
+            Assignment.category,
+            func.sum(Submission.score),
+            func.sum(Assignment.points),
+        )
+        .join(Assignment, Submission.assignment_id == Assignment.id)
+        .where(Assignment.course_id.isnot(None), graded())
+        .group_by(Submission.student_id, Assignment.course_id, Assignment.category)
+    )
+    if course_id is not None:
+        query = query.where(Assignment.course_id == course_id)
+
+    weights = grade_weights()
+    totals = {}
+    for student_id, cid, category, earned, possible in connection.execute(query):
+        key = (student_id, cid, category_for(category, weights))
+        prev_earned, prev_possible = totals.get(key, (0, 0))
+        totals[key] = (prev_earned + (earned or 0), prev_possible + (possible or 0))
+
+    if totals:
+        connection.execute(entries.insert(), [
+            {
+                "student_id": student_id,
+                "course_id": cid,
+                "category": category,
+                "earned": earned,
+                "possible": possible,
+                "percentage": round(earned / possible * 100, 1) if possible > 0 else None,
+            }
+            for (student_id, cid, category), (earned, possible) in totals.items()
+        ])
+    if session_connection:
+        # loaded entries may have been deleted or rewritten underneath the session
+        for obj in list(db.session.identity_map.values()):
+            if isinstance(obj, GradebookEntry):
+                db.session.expire(obj)
+    return len(totals)
+
+
+def rebuild_for_course_code(course_code):
+    course = Course.query.filter_by(course_code=course_code).first()
+    if course is None:
+        return None
+    return rebuild(course.id)
@@ -0,0 +1,153 @@
+"""Course gradebook export as CSV (streamed) or Parquet.
+
+There is one row per enrolled student and one column per assignment, followed
+by a percentage for each weighted category and the final weighted grade. The
+totals follow the same rules as the grade pages: only graded, scored
+submissions count, and ``gradebook.grade_info`` does the weighting.
+
+All grades come from one query that left-joins enrolled students to their
+graded submissions, ordered by student. It is read with ``yield_per``, and each
+student's rows are folded into a CSV line before the next student is read.
+Memory use therefore depends on the number of assignments, not students.
+
+Parquet output needs ``pyarrow`` (``pip install pyarrow``). It is written in
+record batches of ``BATCH_SIZE`` students.
+"""
+import csv
+import io
+from itertools import groupby
+
+from sqlalchemy import and_, select
+
+from app import db, gradebook
+from app.models import Assignment, Enrollment, Submission, User
+
+BATCH_SIZE = 1000
+STUDENT_COLUMNS = ("student_id", "username", "email")
+
+
+class ParquetUnavailable(RuntimeError):
+    """``pyarrow`` is not installed."""
+
+
+def _assignments(course_id):
+    return db.session.execute(
+        select(Assignment.id, Assignment.title, Assignment.points, Assignment.category)
+        .where(Assignment.course_id == course_id)
+        .order_by(Assignment.due_date, Assignment.id)
+    ).all()
+
+
+def header(assignments, weights):
+    return (
+        list(STUDENT_COLUMNS)
+        + [f"{a.title} (#{a.id})" for a in assignments]
+        + [f"{category} %" for category in weights]
+        + ["final %"]
+    )
+
+
+def _grade_rows(course_id):
+    """One row per (student, graded submission), students without grades included once."""
+    graded = and_(
+        Submission.student_id == Enrollment.user_id,
+        gradebook.graded(),
+        Submission.assignment_id.in_(select(Assignment.id).where(Assignment.course_id == course_id)),
+    )
+    statement = (
+        select(User.id, User.username, User.email, Submission.assignment_id, Submission.score)
+        .select_from(Enrollment)
+        .join(User, User.id == Enrollment.user_id)
+        .outerjoin(Submission, graded)
+        .where(Enrollment.course_id == course_id, Enrollment.role == "student")
+        .order_by(User.username, User.id, Submission.id)
+        .execution_options(yield_per=BATCH_SIZE)
+    )
+    return db.session.execute(statement)
+
+
+def student_rows(course_id, assignments=None):
+    """Yield ``(student_values, scores, totals)`` for each enrolled student.
+
+    ``scores`` is ``{assignment_id: score}`` and ``totals`` is the
+    ``gradebook.grade_info`` dict for the student.
+    """
+    weights = gradebook.grade_weights()
+    if assignments is None:
+        assignments = _assignments(course_id)
+    assignments = {a.id: a for a in assignments}
+    for (student_id, username, email), rows in groupby(_grade_rows(course_id), key=lambda r: r[:3]):
+        # a later submission for the same assignment replaces an earlier one
+        scores = {r.assignment_id: r.score for r in rows if r.assignment_id is not None}
+        category_data = {}
+        for assignment_id, score in scores.items():
+            assignment = assignments[assignment_id]
+            data = category_data.setdefault(
+                gradebook.category_for(assignment.category, weights), {"earned": 0, "possible": 0}
+            )
+            data["earned"] += score
+            data["possible"] += assignment.points
+        yield (student_id, username, email), scores, gradebook.grade_info(category_data, weights)
+
+
+def _values(assignments, weights, student, scores, totals):
+    categories = totals["category_grades"]
+    return (
+        list(student)
+        + [scores.get(a.id) for a in assignments]
+        + [categories[c]["percentage"] if c in categories else None for c in weights]
+        + [totals["grade"]]
+    )
+
+
+def csv_lines(course_id):
+    """Yield the gradebook as CSV text, one line at a time."""
+    weights = list(gradebook.grade_weights())
+    assignments = _assignments(course_id)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def line(values):
+        writer.writerow(["" if v is None else v for v in values])
+        text = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return text
+
+    yield line(header(assignments, weights))
+    for student, scores, totals in student_rows(course_id, assignments):
+        yield line(_values(assignments, weights, student, scores, totals))
+
+
+def write_parquet(course_id, sink):
+    """Write the gradebook to ``sink`` (a path or binary file) as Parquet."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as exc:
+        raise ParquetUnavailable("Parquet export needs pyarrow: pip install pyarrow") from exc
+
+    weights = list(gradebook.grade_weights())
+    assignments = _assignments(course_id)
+    names = header(assignments, weights)
+    schema = pa.schema(
+        [pa.field("student_id", pa.int64()), pa.field("username", pa.string()), pa.field("email", pa.string())]
+        + [pa.field(name, pa.int64()) for name in names[len(STUDENT_COLUMNS):len(STUDENT_COLUMNS) + len(assignments)]]
+        + [pa.field(name, pa.float64()) for name in names[len(STUDENT_COLUMNS) + len(assignments):]]
+    )
+
+    def record_batch(rows):
+        columns = zip(*rows)
+        return pa.RecordBatch.from_arrays(
+            [pa.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema
+        )
+
+    with pq.ParquetWriter(sink, schema) as writer:
+        batch = []
+        for student, scores, totals in student_rows(course_id, assignments):
+            batch.append(_values(assignments, weights, student, scores, totals))
+            if len(batch) >= BATCH_SIZE:
+                writer.write_batch(record_batch(batch))
+                batch = []
+        if batch:
+            writer.write_batch(record_batch(batch))
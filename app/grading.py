@@ -0,0 +1,242 @@
+"""Bulk grading: many submissions of one assignment in one transaction.
+
+An entry names a submission by ``submission_id`` or by the student's
+``username``. It gives points for each rubric criterion, keyed by criterion
+id, ``criterion_<id>`` or criterion title. An assignment without a rubric
+takes one ``score`` instead. Entries come from JSON (``entries_from_json``) or
+from a CSV with one column per criterion (``entries_from_csv``).
+
+``grade`` validates everything in memory. It loads the rubric and the
+submissions with one query each, and rejects any points outside
+``0..max_points``. If any entry is bad, nothing is written, and the report
+lists every problem so the whole file can be fixed in one pass. Otherwise all
+submissions are updated with one executemany UPDATE, and their rubric points
+are replaced with one DELETE and one executemany INSERT. The gradebook is
+then adjusted once for the whole batch, and everything is committed together.
+"""
+import csv
+from datetime import datetime
+
+from sqlalchemy import or_, select, update
+
+from app import db, gradebook, rubrics
+from app.models import RubricCriterion, Submission, User
+
+KEY_COLUMNS = ("submission_id", "username")
+
+
+class GradingError(ValueError):
+    """The upload cannot be read at all (as opposed to a bad entry)."""
+
+
+class GradingReport:
+    """Number of graded submissions and per-entry ``(row, message)`` errors."""
+
+    def __init__(self):
+        self.graded = 0
+        self.errors = []
+
+    def error(self, row, message):
+        self.errors.append((row, message))
+
+    def summary(self):
+        if self.errors:
+            return f"No grades saved: {len(self.errors)} problem(s) found."
+        return f"{self.graded} submissions graded."
+
+    def to_dict(self):
+        return {
+            "graded": self.graded,
+            "errors": [{"row": row, "error": message} for row, message in self.errors],
+        }
+
+
+def entries_from_json(payload):
+    """Entries from ``{"grades": [...]}`` or a bare list; rows are numbered from 1."""
+    items = payload.get("grades") if isinstance(payload, dict) else payload
+    if not isinstance(items, list):
+        raise GradingError('Expected a list of grades or {"grades": [...]}.')
+    entries = []
+    for row, item in enumerate(items, start=1):
+        if not isinstance(item, dict):
+            item = {}
+        scores = item.get("scores")
+        entries.append({
+            "row": row,
+            "submission_id": item.get("submission_id"),
+            "username": item.get("username"),
+            "scores": scores if isinstance(scores, dict) else {},
+            "score": item.get("score"),
+            "strict": True,
+        })
+    return entries
+
+
+def entries_from_csv(stream):
+    """Entries from a CSV with a key column and a column per criterion.
+
+    Rows whose points are all blank are skipped, so a partly filled sheet can
+    be uploaded as it is. Columns that are neither a key nor points (names,
+    comments) are ignored; a misspelled criterion shows up as missing points.
+    """
+    reader = csv.DictReader(stream)
+    header = [(name or "").strip() for name in reader.fieldnames or []]
+    keys = [column for column in KEY_COLUMNS if column in header]
+    if not keys:
+        raise GradingError("CSV needs a submission_id or username column.")
+    reader.fieldnames = header
+
+    entries = []
+    for row in reader:
+        values = {k: (v or "").strip() for k, v in row.items() if k}
+        scores = {k: v for k, v in values.items() if k not in KEY_COLUMNS and k != "score" and v}
+        if not scores and not values.get("score"):
+            continue
+        entries.append({
+            "row": reader.line_num,
+            "submission_id": values.get("submission_id") or None,
+            "username": values.get("username") or None,
+            "scores": scores,
+            "score": values.get("score") or None,
+            "strict": False,
+        })
+    return entries
+
+
+def _points(value):
+    """``value`` as a whole number of points, or ``None``."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str):
+        try:
+            return int(value.strip())
+        except ValueError:
+            return None
+    return None
+
+
+def _rubric_points(entry, criteria):
+    """Return ``(total, {criterion_id: points}, None)`` or ``(None, None, message)``."""
+    if not criteria:
+        points = _points(entry["score"])
+        if points is None:
+            return None, None, "score is required"
+        return points, {}, None
+
+    lookup = {}
+    for criterion in criteria:
+        lookup[str(criterion.id)] = lookup[f"criterion_{criterion.id}"] = criterion
+        lookup[criterion.title.strip().lower()] = criterion
+
+    given = {}
+    for key, value in entry["scores"].items():
+        criterion = lookup.get(str(key).strip()) or lookup.get(str(key).strip().lower())
+        if criterion is None:
+            # extra CSV columns are notes; an unknown JSON key is a mistake
+            if entry["strict"]:
+                return None, None, f"unknown rubric criterion {key!r}"
+            continue
+        given[criterion.id] = value
+
+    scores = {}
+    for criterion in criteria:
+        if criterion.id not in given:
+            return None, None, f"missing points for {criterion.title!r}"
+        points = _points(given[criterion.id])
+        if points is None or not 0 <= points <= criterion.max_points:
+            return None, None, f"points for {criterion.title!r} must be 0-{criterion.max_points}"
+        scores[criterion.id] = points
+    return sum(scores.values()), scores, None
+
+
+def _submissions(assignment_id, entries):
+    """Load the submissions the entries refer to, keyed by id and by username."""
+    ids = {_points(e["submission_id"]) for e in entries if e["submission_id"] is not None}
+    usernames = {str(e["username"]) for e in entries if e["username"] is not None}
+    if not ids and not usernames:
+        return {}, {}
+    rows = db.session.execute(
+        select(
+            Submission.id, Submission.student_id, Submission.status, Submission.score,
+            Submission.submitted_at, User.username,
+        )
+        .join(User, User.id == Submission.student_id)
+        .where(
+            Submission.assignment_id == assignment_id,
+            or_(Submission.id.in_(ids - {None}), User.username.in_(usernames)),
+        )
+        .order_by(Submission.id)
+    ).all()
+    # a later submission for the same student wins, as in the gradebook
+    return {r.id: r for r in rows}, {r.username: r for r in rows}
+
+
+def grade(assignment, entries):
+    """Grade ``entries`` for ``assignment``; returns a ``GradingReport``.
+
+    Either every entry is applied and committed, or none is.
+    """
+    report = GradingReport()
+    criteria = db.session.execute(
+        select(RubricCriterion)
+        .where(RubricCriterion.assignment_id == assignment.id)
+        .order_by(RubricCriterion.id)
+    ).scalars().all()
+    by_id, by_username = _submissions(assignment.id, entries)
+
+    now = datetime.utcnow()
+    updates = []
+    points = {}
+    changes = []
+    seen = {}
+    for entry in entries:
+        row = entry["row"]
+        if entry["submission_id"] is not None:
+            current = by_id.get(_points(entry["submission_id"]))
+            if current is None:
+                report.error(row, f"no submission {entry['submission_id']!r} for this assignment")
+                continue
+        elif entry["username"] is not None:
+            current = by_username.get(str(entry["username"]))
+            if current is None:
+                report.error(row, f"{entry['username']!r} has no submission for this assignment")
+                continue
+        else:
+            report.error(row, "submission_id or username is required")
+            continue
+
+        first = seen.setdefault(current.id, row)
+        if first != row:
+            report.error(row, f"submission graded twice (first on row {first})")
+            continue
+
+        total, scores, problem = _rubric_points(entry, criteria)
+        if problem is None and not criteria and not 0 <= total <= assignment.points:
+            problem = f"score must be 0-{assignment.points}"
+        if problem:
+            report.error(row, problem)
+            continue
+
+        updates.append({
+            "id": current.id,
+            "score": total,
+            "status": "Graded",
+            "submitted_at": current.submitted_at or now,
+        })
+        points[current.id] = scores
+        changes.append((current.student_id, current.status, current.score, "Graded", total))
+
+    if report.errors:
+        report.errors.sort()
+        return report
+    if updates:
+        db.session.execute(update(Submission), updates)
+        rubrics.replace_points(points)
+        gradebook.record_grade_changes(assignment, changes)
+        db.session.commit()
+    report.graded = len(updates)
+    return report
@@ -0,0 +1,104 @@
+"""The grading queue: ungraded submissions in an instructor's or TA's courses.
+
+Instructors see submissions to the assignments they created. TAs see
+submissions to every assignment in the courses they are enrolled in.
+
+The queue is read a page at a time, oldest submission first. A keyset cursor
+on ``(submitted_at, id)`` means a page never reads and throws away the rows of
+the pages before it, as ``OFFSET`` would. The sort key is not indexed (a
+missing timestamp sorts as ``EPOCH``), so each page still sorts the waiting
+submissions in scope; that set is one grader's backlog, not the whole table.
+Each page is one query, with the assignment, its course and the student
+loaded eagerly, so rendering it issues no lazy loads. The per-assignment backlog is a single
+``GROUP BY`` query rather than a count of loaded rows.
+"""
+from datetime import datetime
+
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.orm import contains_eager, joinedload
+
+from app import db, enrollments
+from app.models import Assignment, Course, Submission
+
+# submissions without a timestamp (imported before it was recorded) sort as the oldest
+EPOCH = datetime(1970, 1, 1)
+
+
+def _submitted_key():
+    return func.coalesce(Submission.submitted_at, EPOCH)
+
+
+def scope(user):
+    """SQL condition on ``Assignment`` for the assignments whose submissions ``user`` grades."""
+    if user.role == "ta":
+        return Assignment.course_id.in_(enrollments.course_ids_subquery(user.id))
+    return Assignment.created_by == user.id
+
+
+def encode_cursor(submission):
+    return f"{(submission.submitted_at or EPOCH).isoformat()}_{submission.id}"
+
+
+def decode_cursor(value):
+    """Parse a cursor from ``encode_cursor``; returns ``None`` if malformed."""
+    try:
+        stamp, _, submission_id = value.rpartition("_")
+        return datetime.fromisoformat(stamp), int(submission_id)
+    except (AttributeError, ValueError):
+        return None
+
+
+def statement(condition, after=None, limit=25):
+    """The page query: ungraded submissions to assignments matching ``condition``.
+
+    It selects one row more than ``limit`` so the caller can tell whether
+    another page follows.
+    """
+    key = _submitted_key()
+    stmt = (
+        select(Submission)
+        .join(Submission.assignment)
+        .where(condition, Submission.status != "Graded")
+        .options(
+            contains_eager(Submission.assignment).joinedload(Assignment.course),
+            joinedload(Submission.student),
+        )
+    )
+    if after is not None:
+        stmt = stmt.where(tuple_(key, Submission.id) > tuple_(*after))
+    return stmt.order_by(key, Submission.id).limit(limit + 1)
+
+
+def page(user, after=None, limit=25):
+    """Return ``(submissions, next_cursor)`` for one page of ``user``'s grading queue.
+
+    ``submissions`` are the ``limit`` oldest ungraded submissions after the
+    ``after`` cursor. ``next_cursor`` is ``None`` on the last page.
+    """
+    rows = db.session.scalars(statement(scope(user), after, limit)).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1]) if has_more and rows else None
+
+
+def backlog(user):
+    """Ungraded submissions per assignment, assignments with the oldest waiting work first.
+
+    Rows have ``assignment_id``, ``title``, ``course_name`` (``None`` for
+    general assignments), ``waiting`` and ``oldest``.
+    """
+    oldest = func.min(_submitted_key())
+    return db.session.execute(
+        select(
+            Assignment.id.label("assignment_id"),
+            Assignment.title,
+            Course.course_name,
+            func.count(Submission.id).label("waiting"),
+            oldest.label("oldest"),
+        )
+        .join(Submission, Submission.assignment_id == Assignment.id)
+        .outerjoin(Course, Course.id == Assignment.course_id)
+        .where(scope(user), Submission.status != "Graded")
+        .group_by(Assignment.id, Assignment.title, Course.course_name)
+        .order_by(oldest, Assignment.id)
+    ).all()
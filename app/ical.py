@@ -0,0 +1,122 @@
+"""iCalendar (RFC 5545) output for assignment due dates.
+
+``calendar_lines`` yields a VCALENDAR one content line at a time, so feeds can
+be streamed without building the whole file in memory. Text values are escaped
+and long lines folded at 75 octets as the RFC requires. Every value comes from
+the assignment itself (``DTSTAMP`` is its ``updated_at``), so the same data
+always produces the same bytes.
+
+Subscription feeds are addressed by a signed per-user token rather than a login
+session, because calendar clients cannot log in. The token carries the user's
+``feed_token_version``, so bumping it (``reset_feed_token``) revokes every URL
+issued before without touching ``SECRET_KEY``.
+"""
+from itsdangerous import BadSignature, URLSafeSerializer
+
+from flask import current_app
+
+PRODID = "-//SpartanSync//Assignments//EN"
+_FEED_SALT = "calendar-feed"
+
+
+def escape_text(value):
+    """Escape a TEXT property value (RFC 5545 section 3.3.11)."""
+    return (
+        (value or "")
+        .replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\r\n", "\\n")
+        .replace("\n", "\\n")
+        .replace("\r", "\\n")
+    )
+
+
+def fold(line, limit=75):
+    """Fold a content line into CRLF-terminated chunks of at most ``limit`` octets.
+
+    Continuation lines start with a space. Multi-byte UTF-8 characters are never
+    split.
+    """
+    encoded = line.encode("utf-8")
+    if len(encoded) <= limit:
+        return line + "\r\n"
+    chunks = []
+    current = ""
+    size = 0
+    room = limit
+    for char in line:
+        width = len(char.encode("utf-8"))
+        if size + width > room:
+            chunks.append(current)
+            current = ""
+            size = 0
+            room = limit - 1  # leading space of the continuation
+        current += char
+        size += width
+    chunks.append(current)
+    return "\r\n ".join(chunks) + "\r\n"
+
+
+def format_datetime(value):
+    return value.strftime("%Y%m%dT%H%M%SZ")
+
+
+def event_lines(assignment):
+    stamp = assignment.updated_at
+    yield "BEGIN:VEVENT"
+    yield f"UID:assignment-{assignment.id}@spartansync.local"
+    yield f"DTSTAMP:{format_datetime(stamp)}"
+    yield f"LAST-MODIFIED:{format_datetime(stamp)}"
+    yield f"DTSTART:{format_datetime(assignment.due_date)}"
+    yield f"SUMMARY:{escape_text(assignment.title or 'Assignment')}"
+    yield f"DESCRIPTION:{escape_text(assignment.description)}"
+    if assignment.course is not None:
+        yield f"CATEGORIES:{escape_text(assignment.course.course_code)}"
+    yield "END:VEVENT"
+
+
+def calendar_lines(assignments, name=None):
+    """Yield the folded, CRLF-terminated lines of a VCALENDAR."""
+    yield fold("BEGIN:VCALENDAR")
+    yield fold("VERSION:2.0")
+    yield fold(f"PRODID:{PRODID}")
+    yield fold("CALSCALE:GREGORIAN")
+    if name:
+        yield fold(f"X-WR-CALNAME:{escape_text(name)}")
+    for assignment in assignments:
+        for line in event_lines(assignment):
+            yield fold(line)
+    yield fold("END:VCALENDAR")
+
+
+def _serializer():
+    return URLSafeSerializer(current_app.config["SECRET_KEY"], salt=_FEED_SALT)
+
+
+def feed_token(user):
+    return _serializer().dumps([user.id, user.feed_token_version or 0])
+
+
+def reset_feed_token(user):
+    """Revoke ``user``'s current feed URL; the caller commits."""
+    user.feed_token_version = (user.feed_token_version or 0) + 1
+
+
+def user_for_token(token):
+    """The user a feed token was issued to, or ``None`` if it is invalid or revoked."""
+    from app import db
+    from app.models import User
+
+    try:
+        payload = _serializer().loads(token)
+    except BadSignature:
+        return None
+    # tokens issued before versioning carry only the user id
+    user_id, version = (payload, 0) if isinstance(payload, int) else (payload + [None, None])[:2]
+    if not isinstance(user_id, int) or not isinstance(version, int):
+        return None
+    user = db.session.get(User, user_id)
+    if user is None or (user.feed_token_version or 0) != version:
+        return None
+    return user
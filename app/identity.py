@@ -0,0 +1,90 @@
+"""Per-process cache of logged-in users for Flask-Login's ``user_loader``.
+
+Flask-Login loads ``current_user`` on every authenticated request, which costs
+a ``SELECT`` on the user table even on pages that only check
+``current_user.role``. This cache keeps each user's column values for
+``IDENTITY_CACHE_TTL`` seconds. It stores plain values rather than the ORM
+object, because an ORM object belongs to a single session. On a hit the ``User``
+is rebuilt and merged into the session with ``load=False``, so no query runs.
+It still behaves like a loaded instance: relationships lazy-load as usual. The
+password hash is never cached; it loads on first access.
+
+Updating or deleting a ``User`` evicts that entry in this process once the
+transaction commits. Evicting at flush time would let a request that runs
+before the commit cache the old row again; a rollback evicts nothing. Other
+processes keep their copy until the TTL runs out, so keep the TTL short.
+Set it to 0 to turn the cache off. Bulk ``UPDATE`` statements bypass the ORM
+events, so code that uses them must call ``invalidate`` itself.
+"""
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached, object_session
+
+from app import db
+from app.cache import MemoryCache, NullCache
+from app.models import User
+
+_UNCACHED = {"password"}
+
+
+def init_app(app):
+    ttl = app.config.get("IDENTITY_CACHE_TTL", 60)
+    if ttl:
+        cache = MemoryCache(max_entries=app.config.get("IDENTITY_CACHE_MAX_ENTRIES", 10000), ttl=ttl)
+    else:
+        cache = NullCache()
+    app.extensions["identity_cache"] = cache
+
+
+def _cache():
+    if not has_app_context():
+        return None
+    return current_app.extensions.get("identity_cache")
+
+
+def _snapshot(user):
+    return {
+        attr.key: getattr(user, attr.key)
+        for attr in inspect(User).column_attrs
+        if attr.key not in _UNCACHED
+    }
+
+
+def load_user(user_id):
+    """Return the ``User`` for ``user_id``, from the cache when possible."""
+    cache = _cache()
+    values = cache.get(user_id) if cache is not None else None
+    if values is None:
+        user = db.session.get(User, user_id)
+        if user is not None and cache is not None:
+            cache.set(user_id, _snapshot(user))
+        return user
+
+    user = User(**values)
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
+
+
+def invalidate(user_id):
+    cache = _cache()
+    if cache is not None:
+        cache.delete(user_id)
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _mark_stale(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("stale_identities", set()).add(target.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _evict(session):
+    for user_id in session.info.pop("stale_identities", ()):
+        invalidate(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget(session):
+    session.info.pop("stale_identities", None)
@@ -0,0 +1,111 @@
+"""Per-request SQL statement counting and N+1 detection.
+
+A listener on SQLAlchemy's ``before_cursor_execute`` event counts every
+statement issued while a request is being handled and groups them by shape
+(the SQL with literals and ``IN`` lists collapsed). A shape that repeats
+``QUERY_REPEAT_THRESHOLD`` times in one request is almost always a query inside
+a loop. In debug mode the totals are returned as ``X-Query-Count`` and
+``X-Query-Repeats`` response headers and repeated shapes are logged.
+
+The ``request_queries`` signal is sent with the stats of every finished request;
+the test suite uses it to enforce ``@pytest.mark.max_queries`` budgets.
+"""
+import re
+from collections import Counter
+
+from blinker import Namespace
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+_signals = Namespace()
+request_queries = _signals.signal("request-queries")
+
+_WHITESPACE = re.compile(r"\s+")
+_IN_LIST = re.compile(r"\bIN \([^()]*\)", re.IGNORECASE)
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+_listening = False
+
+
+def statement_shape(statement):
+    """Normalize a SQL statement so the same query with other values compares equal."""
+    shape = _WHITESPACE.sub(" ", statement).strip()
+    shape = _IN_LIST.sub("IN (...)", shape)
+    return _LITERAL.sub("?", shape)
+
+
+class QueryStats:
+    """Statements executed while handling one request."""
+
+    def __init__(self, endpoint=None):
+        self.endpoint = endpoint
+        self.count = 0
+        self.shapes = Counter()
+
+    def record(self, statement):
+        self.count += 1
+        self.shapes[statement_shape(statement)] += 1
+
+    def repeated(self, threshold):
+        """Shapes executed at least ``threshold`` times, most frequent first."""
+        return [(shape, n) for shape, n in self.shapes.most_common() if n >= threshold]
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if not has_request_context():
+        return
+    stats = g.get("_query_stats")
+    if stats is not None:
+        stats.record(statement)
+
+
+def _enabled(app):
+    enabled = app.config.get("QUERY_INSTRUMENTATION")
+    if enabled is None:
+        return app.debug or app.testing
+    return enabled
+
+
+def _start_request():
+    if _enabled(current_app):
+        g._query_stats = QueryStats(request.endpoint)
+
+
+def _finish_request(response):
+    stats = g.get("_query_stats")
+    if stats is None:
+        return response
+
+    app = current_app._get_current_object()
+    repeated = stats.repeated(app.config.get("QUERY_REPEAT_THRESHOLD", 3))
+    if app.debug:
+        response.headers["X-Query-Count"] = str(stats.count)
+        response.headers["X-Query-Repeats"] = str(len(repeated))
+        for shape, n in repeated:
+            app.logger.warning("Possible N+1 in %s: %d x %s", stats.endpoint, n, shape)
+    request_queries.send(app, stats=stats)
+    return response
+
+
+def _discard_stats(exc=None):
+    g.pop("_query_stats", None)
+
+
+def init_app(app):
+    """Count queries when debugging or testing, or as ``QUERY_INSTRUMENTATION`` says.
+
+    Debug mode is checked per request because ``app.run(debug=True)`` turns it
+    on after the app has been created.
+    """
+    if app.config.get("QUERY_INSTRUMENTATION") is False:
+        return
+
+    global _listening
+    if not _listening:
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        _listening = True
+
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_discard_stats)
@@ -0,0 +1,141 @@
+"""Content-addressed cache for AI responses.
+
+Students in the same section tend to send the same prompt: the same assignment
+list and often no extra comments. Responses are cached under a SHA-256 of the
+model, system prompt and normalized user input, so repeated prompts are answered
+from the cache instead of waiting on the API.
+
+``LLM_CACHE_URL`` picks the backend:
+
+* ``memory://`` (default) keeps entries in this process.
+* ``sqlite:///path/to/cache.db`` stores them in a separate SQLite file, so hits
+  survive restarts and are shared by workers on the same host.
+* ``none://`` disables caching.
+
+Entries expire after ``LLM_CACHE_TTL`` seconds and the least recently used are
+evicted beyond ``LLM_CACHE_MAX_ENTRIES``. Each backend counts its hits and
+misses; see ``stats()`` and ``flask llm-cache``. The SQLite backend keeps the
+counts in its file, so they cover every worker; the memory backend's counts
+are for this process only.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from urllib.parse import urlparse
+
+from flask import current_app
+
+from app.cache import CountingCache, MemoryCache, NullCache
+
+
+def _normalize(text):
+    return " ".join((text or "").split()).casefold()
+
+
+def make_key(model, system_prompt, *parts):
+    payload = json.dumps([model, " ".join(system_prompt.split())] + [_normalize(p) for p in parts])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SqliteCache(CountingCache):
+    """LRU cache with a time-to-live, stored in its own SQLite file."""
+
+    def __init__(self, path, max_entries=1000, ttl=86400):
+        super().__init__()
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " expires_at REAL NOT NULL,"
+                " used_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_cache_used_at ON llm_cache (used_at)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache_stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+            )
+
+    def _connect(self):
+        # one short-lived connection per call keeps the cache safe to use from any thread
+        conn = sqlite3.connect(self.path, timeout=5)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def get(self, key):
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT value FROM llm_cache WHERE key = ? AND expires_at >= ?", (key, now)
+            ).fetchone()
+            if row is not None:
+                conn.execute("UPDATE llm_cache SET used_at = ? WHERE key = ?", (now, key))
+            conn.execute(
+                "INSERT INTO llm_cache_stats (name, value) VALUES (?, 1)"
+                " ON CONFLICT (name) DO UPDATE SET value = value + 1",
+                ("hits" if row is not None else "misses",),
+            )
+        self._count(row is not None)
+        return row[0] if row is not None else None
+
+    def set(self, key, value):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, expires_at, used_at) VALUES (?, ?, ?, ?)",
+                (key, value, now + self.ttl, now),
+            )
+            conn.execute("DELETE FROM llm_cache WHERE expires_at < ?", (now,))
+            conn.execute(
+                "DELETE FROM llm_cache WHERE key IN ("
+                " SELECT key FROM llm_cache ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def delete(self, key):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM llm_cache")
+
+    def __len__(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+
+    def stats(self):
+        """Counts from every process using this file, not just this one."""
+        with self._connect() as conn:
+            counts = dict(conn.execute("SELECT name, value FROM llm_cache_stats"))
+        return {"hits": counts.get("hits", 0), "misses": counts.get("misses", 0), "entries": len(self)}
+
+
+def create_cache(url, max_entries=1000, ttl=86400):
+    parsed = urlparse(url or "memory://")
+    if parsed.scheme == "memory":
+        return MemoryCache(max_entries=max_entries, ttl=ttl)
+    if parsed.scheme == "sqlite":
+        # sqlite:///relative.db and sqlite:////absolute.db, as in SQLAlchemy URLs
+        return SqliteCache(url.split(":///", 1)[1], max_entries=max_entries, ttl=ttl)
+    if parsed.scheme == "none":
+        return NullCache()
+    raise ValueError(f"Unsupported LLM_CACHE_URL scheme: {parsed.scheme!r}")
+
+
+def init_app(app):
+    app.extensions["llm_cache"] = create_cache(
+        app.config.get("LLM_CACHE_URL"),
+        max_entries=app.config.get("LLM_CACHE_MAX_ENTRIES", 1000),
+        ttl=app.config.get("LLM_CACHE_TTL", 86400),
+    )
+
+
+def get_cache():
+    return current_app.extensions["llm_cache"]
@@ -3,7 +3,20 @@ import os
 from dotenv import load_dotenv
 load_dotenv()
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+def make_client(base_url=None):
+    """OpenAI client; ``OPENAI_BASE_URL`` points it at a proxy or a local stand-in."""
+    return OpenAI(
+        api_key=os.getenv("OPENAI_API_KEY"),
+        base_url=base_url or os.getenv("OPENAI_BASE_URL") or None,
+        timeout=float(os.getenv("OPENAI_TIMEOUT", "60")),
+        max_retries=1,
+    )
+
+
+client = make_client()
+
+MODEL = "gpt-4.1-mini"
 
 SYSTEM_PROMPT = (
     "You are a friendly study assistant. "
@@ -17,7 +30,7 @@ def ask_chatgpt(comments: str, assignments: str) -> str:
     else:
         try:
             response = client.chat.completions.create(
-                model="gpt-4.1-mini",
+                model=MODEL,
                 messages=[
                     {"role": "system", "content": SYSTEM_PROMPT},
                     {"role": "user", "content": f"{comments}\n\nAssignments:\n{assignments}"}
@@ -26,3 +39,31 @@ def ask_chatgpt(comments: str, assignments: str) -> str:
             return response.choices[0].message.content
         except Exception as e:
             return f"Warning: ChatGPT request failed: {e}"
+
+
+def stream_chatgpt(comments: str, assignments: str):
+    """Yield the study plan in pieces as the model generates it.
+
+    If the stream cannot be opened the blocking ``ask_chatgpt`` answer is
+    yielded as a single piece instead. Errors after the first piece propagate,
+    since part of the answer has already been handed out.
+    """
+    if not os.getenv("OPENAI_API_KEY"):
+        yield ask_chatgpt(comments, assignments)
+        return
+    try:
+        stream = client.chat.completions.create(
+            model=MODEL,
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": f"{comments}\n\nAssignments:\n{assignments}"}
+            ],
+            stream=True,
+        )
+    except Exception:
+        yield ask_chatgpt(comments, assignments)
+        return
+    with stream:
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
@@ -1,12 +1,29 @@
 from datetime import datetime, date, timedelta
 import calendar
-from flask import render_template, redirect, flash, request, url_for, Response
+import csv
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+from flask import (
+    render_template, redirect, flash, request, url_for, Response, current_app, jsonify,
+    abort, send_file, stream_with_context,
+)
 from flask_login import login_required, current_user
+from sqlalchemy import func, select
+from sqlalchemy.orm import joinedload
 
 from . import bp
-from app import db
+from app import (
+    analytics, assignment_lists, at_risk, broker, database, db, enrollments, gradebook, gradebook_export, grading,
+    grading_queue, ical, messaging, passwords, roster,
+    rubrics, study_plans,
+)
 from app.models import (
-    Classes,
     Course,
     Assignment,
     Submission,
@@ -15,6 +32,7 @@ from app.models import (
     Conversation,
     ConversationParticipant,
     Message,
+    StudyPlanJob,
 )
 from app.forms import (
     AssignmentForm,
@@ -23,6 +41,8 @@ from app.forms import (
     RubricCriterionForm,
     CourseForm,
     ClassSelectionForm,
+    RosterImportForm,
+    BulkGradeForm,
 )
 from app.forms import MessageForm, NewConversationForm
 from app.models import User
@@ -38,79 +58,70 @@ def _course_choices(include_general=True):
 
 
 def _selected_course_ids(user_id):
-    classes_record = Classes.query.filter_by(user=user_id).first()
-    if not classes_record or not classes_record.classes:
-        return []
-    selected = []
-    for entry in classes_record.classes:
-        if isinstance(entry, int):
-            selected.append(entry)
-        elif isinstance(entry, str) and entry.isdigit():
-            selected.append(int(entry))
-        elif isinstance(entry, dict) and "course_id" in entry:
-            selected.append(entry["course_id"])
-    return selected
+    return enrollments.course_ids_for(user_id)
 
 
 def _build_class_cards(user_id, include_grades=False):
+    courses = enrollments.enrolled_courses(user_id)
+    links = enrollments.link_cards(user_id)
+    if not courses:
+        return links
 
-    classes_record = Classes.query.filter_by(user=user_id).first()
-    if not classes_record or not classes_record.classes:
-        return []
+    grades = {}
+    if include_grades:
+        grades = gradebook.grades_for_student(user_id, [c.id for c in courses])
 
     cards = []
-    for entry in classes_record.classes:
-        if isinstance(entry, dict) and entry.get("title"):
-            link = entry.get("link")
-            cards.append(
-                {
-                    "title": entry.get("title"),
-                    "course_code": entry.get("course_code", ""),
-                    "description": entry.get("description", ""),
-                    "link": link,
-                    "grade_info": None,
-                }
-            )
-        else:
-            course_id = None
-            if isinstance(entry, int):
-                course_id = entry
-            elif isinstance(entry, str) and entry.isdigit():
-                course_id = int(entry)
-            elif isinstance(entry, dict) and entry.get("id"):
-                course_id = entry["id"]
-
-            if course_id:
-                course = Course.query.get(course_id)
-                if course:
-                    grade_info = None
-                    if include_grades:
-                        grade_info = _calculate_weighted_grade(user_id, course_id)
-
-                    cards.append(
-                        {
-                            "title": course.course_name,
-                            "course_code": course.course_code,
-                            "description": course.description or "",
-                            "link": url_for("main.course_detail", course_id=course.id),
-                            "course_id": course.id,
-                            "grade_info": grade_info,
-                        }
-                    )
-    return cards
+    for course in courses:
+        grade_info = None
+        if include_grades:
+            grade_info = grades.get(course.id, gradebook.empty_grade_info())
+
+        cards.append(
+            {
+                "title": course.course_name,
+                "course_code": course.course_code,
+                "description": course.description or "",
+                "link": url_for("main.course_detail", course_id=course.id),
+                "course_id": course.id,
+                "grade_info": grade_info,
+            }
+        )
+    return cards + links
 
 
 def _assignment_badge(assignment, submission=None):
     now = datetime.utcnow()
     if not assignment.allow_submissions:
-        return {"label": "Closed", "class": "bg-gray-100 text-gray-700"}
+        return assignment_lists.badge("Closed")
     if submission and submission.status == "Graded":
-        return {"label": "Graded", "class": "bg-green-100 text-green-700"}
+        return assignment_lists.badge("Graded")
     if submission:
-        return {"label": "Submitted", "class": "bg-blue-100 text-blue-700"}
+        return assignment_lists.badge("Submitted")
     if assignment.due_date < now:
-        return {"label": "Overdue", "class": "bg-red-100 text-red-700"}
-    return {"label": "Pending", "class": "bg-yellow-100 text-yellow-700"}
+        return assignment_lists.badge("Overdue")
+    return assignment_lists.badge("Pending")
+
+
+def _assignment_page():
+    """Template context for one filtered page of the current user's assignments."""
+    filters = assignment_lists.AssignmentFilters(request.args)
+    page = request.args.get("page", 1, type=int)
+    per_page = current_app.config.get("ASSIGNMENTS_PAGE_SIZE", 25)
+    assignments, has_next = assignment_lists.page(current_user, filters, page=page, per_page=per_page)
+    if current_user.role == "student":
+        courses = enrollments.enrolled_courses(current_user.id)
+    else:
+        courses = Course.query.order_by(Course.course_name).all()
+    return {
+        "assignments": assignments,
+        "page": max(page, 1),
+        "has_next": has_next,
+        "filters": filters,
+        "filter_courses": [(0, "General")] + [(c.id, c.course_name) for c in courses],
+        "filter_statuses": assignment_lists.STATUSES,
+        "due_windows": assignment_lists.DUE_WINDOWS,
+    }
 
 
 def _has_role(user, *roles):
@@ -125,29 +136,27 @@ def _require_roles(*roles):
 
 
 def _calculate_weighted_grade(student_id, course_id):
+    """Compute a student's course grade straight from submissions.
 
-    from flask import current_app
-
-    weights = current_app.config.get('GRADE_WEIGHTS', {
-        "homework": 30,
-        "exam": 50,
-        "project": 20,
-    })
+    Pages read the persisted rollup via ``gradebook.grades_for_student``; this
+    is the reference calculation it must agree with.
+    """
+    weights = gradebook.grade_weights()
 
     assignments = Assignment.query.filter_by(course_id=course_id).all()
     if not assignments:
-        return {'grade': None, 'category_grades': {}, 'has_grades': False}
+        return gradebook.empty_grade_info()
 
     # get the submissions for these assignments
     assignment_ids = [a.id for a in assignments]
     submissions = Submission.query.filter(
         Submission.assignment_id.in_(assignment_ids),
         Submission.student_id == student_id,
-        Submission.status == "Graded"
+        gradebook.graded(),
     ).all()
 
     if not submissions:
-        return {'grade': None, 'category_grades': {}, 'has_grades': False}
+        return gradebook.empty_grade_info()
 
     # map of assignment_id -> submission
     sub_map = {s.assignment_id: s for s in submissions}
@@ -158,44 +167,19 @@ def _calculate_weighted_grade(student_id, course_id):
         category_data[cat] = {'earned': 0, 'possible': 0}
 
     for assignment in assignments:
-        cat = assignment.category if assignment.category in weights else 'homework'
+        cat = gradebook.category_for(assignment.category, weights)
         sub = sub_map.get(assignment.id)
-        if sub and sub.score is not None:
+        if sub and gradebook.counts(sub.status, sub.score):
             category_data[cat]['earned'] += sub.score
             category_data[cat]['possible'] += assignment.points
 
-    # calculate the weighted average
-    total_weighted = 0
-    total_weight_used = 0
-    category_grades = {}
-
-    for cat, data in category_data.items():
-        if data['possible'] > 0:
-            percentage = (data['earned'] / data['possible']) * 100
-            category_grades[cat] = {
-                'earned': data['earned'],
-                'possible': data['possible'],
-                'percentage': round(percentage, 1),
-            }
-            total_weighted += percentage * weights[cat]
-            total_weight_used += weights[cat]
-
-    # normalize all the categories if not all the categories have grades in
-    if total_weight_used > 0:
-        final_grade = total_weighted / total_weight_used
-    else:
-        final_grade = None
-
-    return {
-        'grade': round(final_grade, 1) if final_grade is not None else None,
-        'category_grades': category_grades,
-        'has_grades': total_weight_used > 0,
-    }
+    return gradebook.grade_info(category_data, weights)
 
 
 @bp.route("/")
 @bp.route("/home")
 @login_required
+@database.read_only
 def home():
     # get ALL courses
     all_courses = Course.query.order_by(Course.course_name.asc()).all()
@@ -203,13 +187,17 @@ def home():
     # get enrolled course IDs
     enrolled_ids = set(_selected_course_ids(current_user.id))
 
+    grades = {}
+    if current_user.role == "student":
+        grades = gradebook.grades_for_student(current_user.id, enrolled_ids)
+
     # build course cards with enrollment status
     courses_payload = []
     for course in all_courses:
         is_enrolled = course.id in enrolled_ids
         grade_info = None
         if is_enrolled and current_user.role == "student":
-            grade_info = _calculate_weighted_grade(current_user.id, course.id)
+            grade_info = grades.get(course.id, gradebook.empty_grade_info())
 
         courses_payload.append({
             "title": course.course_name,
@@ -252,6 +240,21 @@ def home():
     )
 
 
+def _grading_queue():
+    """Template context for the current user's grading queue, from the ``after`` cursor."""
+    after = grading_queue.decode_cursor(request.args.get("after", ""))
+    limit = current_app.config.get("GRADING_QUEUE_PAGE_SIZE", 25)
+    pending_submissions, next_cursor = grading_queue.page(current_user, after=after, limit=limit)
+    backlog = grading_queue.backlog(current_user)
+    return {
+        "pending_submissions": pending_submissions,
+        "queue_cursor": next_cursor,
+        "queue_started": after is not None,
+        "queue_backlog": backlog,
+        "queue_total": sum(row.waiting for row in backlog),
+    }
+
+
 @bp.route("/dashboard")
 @login_required
 def dashboard():
@@ -260,72 +263,73 @@ def dashboard():
             created_by=current_user.id
         ).order_by(Assignment.due_date).all()
 
-        pending_submissions = Submission.query.join(Assignment).filter(
-            Assignment.created_by == current_user.id,
-            Submission.status != "Graded",
-        ).all()
+        taught_course_ids = select(Assignment.course_id).where(
+            Assignment.created_by == current_user.id
+        ).union(enrollments.course_ids_subquery(current_user.id))
 
         return render_template(
             "dashboard.html",
             mode="instructor",
             assignments=assignments,
-            pending_submissions=pending_submissions,
+            at_risk=at_risk.ranked(taught_course_ids),
+            **_grading_queue(),
         )
 
     elif current_user.role == "ta":
-        ta_course_ids = _selected_course_ids(current_user.id)
+        ta_course_ids = enrollments.course_ids_subquery(current_user.id)
 
         assignments = Assignment.query.filter(
             Assignment.course_id.in_(ta_course_ids)
         ).order_by(Assignment.due_date).all()
 
-        pending_submissions = Submission.query.join(Assignment).filter(
-            Assignment.course_id.in_(ta_course_ids),
-            Submission.status != "Graded",
-        ).all()
-
         return render_template(
             "dashboard.html",
             mode="instructor",
             assignments=assignments,
-            pending_submissions=pending_submissions,
+            at_risk=at_risk.ranked(ta_course_ids),
+            **_grading_queue(),
         )
 
     else:
-        assignments = Assignment.query.order_by(Assignment.due_date.asc()).all()
-        submissions = Submission.query.filter_by(student_id=current_user.id).all()
-        submission_map = {s.assignment_id: s for s in submissions}
-        for assignment in assignments:
-            assignment.progress_badge = _assignment_badge(
-                assignment, submission_map.get(assignment.id)
-            )
-            assignment.submission = submission_map.get(assignment.id)
         return render_template(
             "dashboard.html",
             mode="student",
-            assignments=assignments,
+            class_cards=_build_class_cards(current_user.id, include_grades=True),
+            **_assignment_page(),
         )
 
 
 @bp.route("/assignments")
 @login_required
 def assignment_list():
-    assignments = Assignment.query.order_by(Assignment.due_date.asc()).all()
-    submission_map = {}
-    if current_user.role == "student":
-        submission_map = {
-            s.assignment_id: s
-            for s in Submission.query.filter_by(student_id=current_user.id).all()
-        }
-    for assignment in assignments:
-        assignment.progress_badge = _assignment_badge(
-            assignment, submission_map.get(assignment.id)
-        )
-    return render_template("assignments_list.html", assignments=assignments)
+    return render_template("assignments_list.html", **_assignment_page())
+
+
+def _visible_assignments(user, start, end=None):
+    """Query of assignments ``user`` can see that are due in ``[start, end)``.
+
+    The window and the enrollment filter are applied in SQL, using the
+    ``ix_assignment_course_due`` and ``ix_assignment_due_date`` indexes.
+    """
+    query = Assignment.query.filter(Assignment.due_date >= start)
+    if end is not None:
+        query = query.filter(Assignment.due_date < end)
+    return assignment_lists.visible_to(query, user)
+
+
+def _calendar_assignments(start, end):
+    """Assignments due in ``[start, end)`` that the current user can see, by due date."""
+    return (
+        _visible_assignments(current_user, start, end)
+        .options(joinedload(Assignment.course))
+        .order_by(Assignment.due_date.asc(), Assignment.id.asc())
+        .all()
+    )
 
 
 @bp.route("/calendar")
 @login_required
+@database.read_only
 def calendar_view():
     """Server-rendered month calendar view of assignments."""
     # allow year/month override via query params
@@ -335,15 +339,9 @@ def calendar_view():
     # calculate month range
     first_weekday, num_days = calendar.monthrange(year, month)
     start = datetime(year, month, 1)
-    end = datetime(year, month, num_days, 23, 59, 59)
+    end = start + timedelta(days=num_days)
 
-    # fetch assignments; filter by year/month to avoid timezone edge-cases
-    all_assignments = Assignment.query.order_by(Assignment.due_date.asc()).all()
-    if current_user.role == "student":
-        enrolled = set(_selected_course_ids(current_user.id))
-        assignments = [a for a in all_assignments if (a.course_id is None or a.course_id in enrolled) and a.due_date.year == year and a.due_date.month == month]
-    else:
-        assignments = [a for a in all_assignments if a.due_date.year == year and a.due_date.month == month]
+    assignments = _calendar_assignments(start, end)
 
     # group assignments by day (use date to avoid timezone/truncation issues)
     events = {}
@@ -399,6 +397,7 @@ def calendar_view():
         next_month=next_month,
         course_colors=course_colors,
         course_map=course_map,
+        feed_url=url_for("main.calendar_feed", token=ical.feed_token(current_user), _external=True),
     )
 
 
@@ -410,53 +409,87 @@ def calendar_export():
     month = request.args.get("month", type=int)
 
     # choose assignments: if year/month provided, limit to that month; otherwise upcoming 90 days
-    all_assignments = Assignment.query.order_by(Assignment.due_date.asc()).all()
     if year and month:
         first_weekday, num_days = calendar.monthrange(year, month)
         start = datetime(year, month, 1)
-        end = datetime(year, month, num_days, 23, 59, 59)
+        end = start + timedelta(days=num_days)
     else:
         start = datetime.utcnow()
         end = start + timedelta(days=90)
 
-    if current_user.role == "student":
-        enrolled = set(_selected_course_ids(current_user.id))
-        assignments = [a for a in all_assignments if (a.course_id is None or a.course_id in enrolled) and start <= a.due_date <= end]
-    else:
-        assignments = [a for a in all_assignments if start <= a.due_date <= end]
+    assignments = _calendar_assignments(start, end)
 
-    # build simple ICS
-    lines = [
-        "BEGIN:VCALENDAR",
-        "VERSION:2.0",
-        "PRODID:-//SpartanSync//Assignments//EN",
-    ]
+    filename = f"assignments_{year or 'upcoming'}_{month or ''}.ics"
+    return Response(
+        ical.calendar_lines(assignments),
+        mimetype="text/calendar",
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
 
-    for a in assignments:
-        uid = f"assignment-{a.id}@spartansync.local"
-        dtstamp = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
-        dtstart = a.due_date.strftime("%Y%m%dT%H%M%SZ")
-        summary = (a.title or "Assignment").replace('\n', ' ').replace(';', ',')
-        description = (a.description or '').replace('\n', '\\n').replace(';', ',')
-        lines.extend([
-            "BEGIN:VEVENT",
-            f"UID:{uid}",
-            f"DTSTAMP:{dtstamp}",
-            f"DTSTART:{dtstart}",
-            f"SUMMARY:{summary}",
-            f"DESCRIPTION:{description}",
-            "END:VEVENT",
-        ])
-
-    lines.append("END:VCALENDAR")
-    ics_content = "\r\n".join(lines)
 
-    filename = f"assignments_{year or 'upcoming'}_{month or ''}.ics"
-    return Response(ics_content, mimetype="text/calendar", headers={"Content-Disposition": f"attachment; filename={filename}"})
+@bp.route("/calendar/feed/reset", methods=["POST"])
+@login_required
+def calendar_feed_reset():
+    """Issue a new subscription URL; the old one stops working."""
+    ical.reset_feed_token(current_user)
+    db.session.commit()
+    flash("Your calendar feed URL was reset. Update it in your calendar app.", "success")
+    return redirect(url_for("main.calendar_view"))
+
+
+@bp.route("/calendar/feed/<token>.ics")
+def calendar_feed(token):
+    """Per-user iCalendar subscription feed, authenticated by a signed token.
+
+    Calendar clients poll this URL, so a strong ETag is computed first from one
+    aggregate query; an unchanged feed is answered with 304 without loading any
+    assignments. Otherwise events are streamed as they are read.
+    """
+    user = ical.user_for_token(token)
+    if user is None:
+        abort(404)
+
+    today = datetime.utcnow().date()
+    start = datetime(today.year, today.month, today.day) - timedelta(
+        days=current_app.config.get("CALENDAR_FEED_PAST_DAYS", 30)
+    )
+    query = _visible_assignments(user, start)
+    # course codes are emitted as CATEGORIES, so renaming one must change the ETag too
+    feed_courses = (
+        select(Course.course_code)
+        .where(Course.id.in_(query.with_entities(Assignment.course_id)))
+        .order_by(Course.id)
+        .subquery()
+    )
+    course_codes = select(func.aggregate_strings(feed_courses.c.course_code, ",")).scalar_subquery()
+    count, last_modified, id_sum, codes = query.with_entities(
+        func.count(Assignment.id), func.max(Assignment.updated_at), func.sum(Assignment.id), course_codes
+    ).one()
+    # deletions lower the count or the id sum even when nothing was modified
+    etag = hashlib.sha256(
+        f"{user.id}:{user.role}:{start.date()}:{count}:{last_modified}:{id_sum}:{codes}".encode()
+    ).hexdigest()[:32]
+
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        rows = (
+            query.options(joinedload(Assignment.course))
+            .order_by(Assignment.due_date.asc(), Assignment.id.asc())
+            .yield_per(200)
+        )
+        response = Response(
+            stream_with_context(ical.calendar_lines(rows, name="SpartanSync assignments")),
+            mimetype="text/calendar",
+        )
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
 
 
 @bp.route("/courses")
 @login_required
+@database.read_only
 def courses():
     all_courses = Course.query.order_by(Course.course_name.asc()).all()
     selected_ids = set(_selected_course_ids(current_user.id))
@@ -521,6 +554,74 @@ def course_create():
     return render_template("course_form.html", form=form)
 
 
+@bp.route("/courses/<int:course_id>/roster", methods=["GET", "POST"])
+@login_required
+def course_roster_import(course_id):
+    """Instructor upload of a roster CSV that creates accounts and enrollments."""
+    course = Course.query.get_or_404(course_id)
+    if not _require_roles("instructor"):
+        return redirect(url_for("main.course_detail", course_id=course.id))
+
+    form = RosterImportForm()
+    report = None
+    if form.validate_on_submit():
+        stream = io.TextIOWrapper(form.roster.data.stream, encoding="utf-8-sig", newline="")
+        workers = current_app.config.get("ROSTER_IMPORT_WORKERS", os.cpu_count() or 1)
+        try:
+            # hash in parallel processes, as `flask import-roster` does, rather than row by row on this thread
+            with passwords.process_pool(workers) as pool:
+                report = roster.import_roster(stream, course=course, executor=pool)
+        except (roster.RosterError, UnicodeDecodeError, csv.Error) as exc:
+            flash(f"Could not import roster: {exc}", "error")
+        else:
+            flash(report.summary(), "error" if report.errors else "success")
+
+    return render_template("roster_import.html", form=form, course=course, report=report)
+
+
+@bp.route("/courses/<int:course_id>/analytics")
+@login_required
+@database.read_only
+def course_analytics(course_id):
+    """Grade distributions for a whole course, computed in one pass over its graded submissions."""
+    course = Course.query.get_or_404(course_id)
+    if not _require_roles("instructor"):
+        return redirect(url_for("main.course_detail", course_id=course.id))
+    return render_template(
+        "course_analytics.html",
+        course=course,
+        report=analytics.course_analytics(course.id),
+        weights=gradebook.grade_weights(),
+        percentiles=analytics.PERCENTILES,
+    )
+
+
+@bp.route("/courses/<int:course_id>/gradebook.<any(csv, parquet):fmt>")
+@login_required
+def course_gradebook_export(course_id, fmt):
+    """Download a course gradebook: CSV is streamed, Parquet needs pyarrow."""
+    course = Course.query.get_or_404(course_id)
+    if not _require_roles("instructor"):
+        return redirect(url_for("main.course_detail", course_id=course.id))
+
+    filename = f"{course.course_code}_gradebook.{fmt}"
+    if fmt == "csv":
+        return Response(
+            stream_with_context(gradebook_export.csv_lines(course.id)),
+            mimetype="text/csv",
+            headers={"Content-Disposition": f"attachment; filename={filename}"},
+        )
+
+    buffer = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+    try:
+        gradebook_export.write_parquet(course.id, buffer)
+    except gradebook_export.ParquetUnavailable as exc:
+        buffer.close()
+        abort(501, description=str(exc))
+    buffer.seek(0)
+    return send_file(buffer, mimetype="application/vnd.apache.parquet", as_attachment=True, download_name=filename)
+
+
 @bp.route("/classes/manage", methods=["GET", "POST"])
 @login_required
 def manage_classes():
@@ -537,14 +638,12 @@ def manage_classes():
 
     if request.method == "POST":
         # get selected course IDs from checkboxes
-        selected_course_ids = request.form.getlist("courses", type=int)
+        course_ids = {course.id for course in courses}
+        selected_course_ids = [
+            cid for cid in request.form.getlist("courses", type=int) if cid in course_ids
+        ]
 
-        record = Classes.query.filter_by(user=current_user.id).first()
-        if not record:
-            record = Classes(user=current_user.id, classes=selected_course_ids)
-            db.session.add(record)
-        else:
-            record.classes = selected_course_ids
+        enrollments.set_courses(current_user, selected_course_ids)
         db.session.commit()
         flash("Enrollment updated successfully.", "success")
         return redirect(url_for("main.home"))
@@ -605,19 +704,17 @@ def assignment_detail(assignment_id):
         submission = Submission.query.filter_by(
             assignment_id=assignment.id, student_id=current_user.id
         ).first()
-        if submission and submission.rubric_scores:
-            submission.rubric_scores = {
-                int(k): v for k, v in submission.rubric_scores.items()
-            }
 
     if submission_form.validate_on_submit() and current_user.role == "student":
         if not assignment.allow_submissions:
             flash("Submissions are closed for this assignment.", "error")
         else:
             if submission:
+                old_status, old_score = submission.status, submission.score
                 submission.content = submission_form.content.data
                 submission.submitted_at = datetime.utcnow()
                 submission.status = "Submitted"
+                gradebook.record_grade_change(submission, old_status, old_score)
             else:
                 submission = Submission(
                     assignment_id=assignment.id,
@@ -646,19 +743,24 @@ def assignment_detail(assignment_id):
         submission_form.content.data = submission.content
 
     submissions = []
+    rubric_stats = []
     if current_user.role in ["instructor", "ta"]:
         submissions = Submission.query.filter_by(assignment_id=assignment.id).all()
-        for sub in submissions:
-            if sub.rubric_scores:
-                sub.rubric_scores = {int(k): v for k, v in sub.rubric_scores.items()}
+        rubric_stats = rubrics.criterion_stats(assignment.rubric_criteria)
+    rubric_points = rubrics.points_by_submission(
+        [sub.id for sub in submissions] + ([submission.id] if submission else [])
+    )
 
     return render_template(
         "assignment_detail.html",
         assignment=assignment,
         submission_form=submission_form,
         rubric_form=rubric_form,
+        bulk_form=BulkGradeForm(),
         submission=submission,
         submissions=submissions,
+        rubric_points=rubric_points,
+        rubric_stats=rubric_stats,
     )
 
 
@@ -673,7 +775,7 @@ def grade_submission(assignment_id):
         id=submission_id, assignment_id=assignment_id
     ).first_or_404()
 
-    rubric_scores = {}
+    points = {}
     total = 0
     for criterion in submission.assignment.rubric_criteria:
         field_name = f"criterion_{criterion.id}"
@@ -681,17 +783,62 @@ def grade_submission(assignment_id):
         if score_val is None or score_val < 0 or score_val > criterion.max_points:
             flash(f"Invalid points for {criterion.title}.", "error")
             return redirect(url_for("main.assignment_detail", assignment_id=assignment_id))
-        rubric_scores[str(criterion.id)] = score_val
+        points[criterion.id] = score_val
         total += score_val
 
+    old_status, old_score = submission.status, submission.score
     submission.score = total
-    submission.rubric_scores = rubric_scores
+    rubrics.replace_points({submission.id: points})
     submission.status = "Graded"
     submission.submitted_at = submission.submitted_at or datetime.utcnow()
+    gradebook.record_grade_change(submission, old_status, old_score)
     db.session.commit()
     flash("Submission graded successfully.", "success")
     return redirect(url_for("main.assignment_detail", assignment_id=assignment_id))
 
+
+@bp.route("/assignments/<int:assignment_id>/grade/bulk", methods=["POST"])
+@login_required
+def grade_submissions_bulk(assignment_id):
+    """Grade many submissions at once from JSON, a ``text/csv`` body or the CSV form.
+
+    JSON and CSV bodies get the report as JSON, with status 422 when nothing
+    was saved. The upload form on the assignment page flashes it instead.
+    """
+    assignment = Assignment.query.get_or_404(assignment_id)
+    from_page = request.mimetype == "multipart/form-data"
+    back = redirect(url_for("main.assignment_detail", assignment_id=assignment.id))
+    if not from_page and not _has_role(current_user, "instructor", "ta"):
+        return jsonify({"error": "forbidden"}), 403
+    if from_page and not _require_roles("instructor", "ta"):
+        return back
+
+    try:
+        if from_page:
+            form = BulkGradeForm()
+            if not form.validate_on_submit():
+                flash(next(iter(form.errors.values()))[0], "error")
+                return back
+            stream = io.TextIOWrapper(form.grades.data.stream, encoding="utf-8-sig", newline="")
+            entries = grading.entries_from_csv(stream)
+        elif request.mimetype == "text/csv":
+            entries = grading.entries_from_csv(io.StringIO(request.get_data(as_text=True), newline=""))
+        else:
+            entries = grading.entries_from_json(request.get_json(silent=True))
+    except (grading.GradingError, UnicodeDecodeError, csv.Error) as exc:
+        if from_page:
+            flash(f"Could not read grades: {exc}", "error")
+            return back
+        return jsonify({"error": str(exc)}), 400
+
+    report = grading.grade(assignment, entries)
+    if from_page:
+        flash(report.summary(), "error" if report.errors else "success")
+        for row, message in report.errors[:10]:
+            flash(f"Row {row}: {message}", "error")
+        return back
+    return jsonify(report.to_dict()), 422 if report.errors else 200
+
 @bp.route("/assignments/<int:assignment_id>/delete", methods=["POST"])
 @login_required
 def assignment_delete(assignment_id):
@@ -699,6 +846,8 @@ def assignment_delete(assignment_id):
         return redirect(url_for("main.assignment_detail", assignment_id=assignment_id))
 
     assignment = Assignment.query.get_or_404(assignment_id)
+    gradebook.remove_assignment(assignment)
+    rubrics.delete_for_assignment(assignment.id)
     Submission.query.filter_by(assignment_id=assignment.id).delete()
     RubricCriterion.query.filter_by(assignment_id=assignment.id).delete()
     db.session.delete(assignment)
@@ -709,6 +858,7 @@ def assignment_delete(assignment_id):
 
 @bp.route("/announcements", methods=["GET"])
 @login_required
+@database.read_only
 def announcements():
     notes = Announcement.query.order_by(Announcement.created_at.desc()).all()
     return render_template("announcements.html", announcements=notes)
@@ -763,51 +913,84 @@ def announcement_delete(announcement_id):
 def study_plan():
     if not _require_roles("student"):
         return redirect(url_for("main.home"))
-    try:
-        from app.main.gpt_client import ask_chatgpt
-    except Exception:
-        # If the OpenAI client isn't available provide  fallback
-        def ask_chatgpt(question, prompt):
-            return "AI service currently unavailable."
 
-    advice = None
     if request.method == "POST":
-        assignments = Assignment.query.order_by(Assignment.due_date.asc()).all()
-        assignmentPrompt = ""
-        for assignment in assignments:
-            submitted = Submission.query.filter_by(
-                assignment_id=assignment.id,
-                student_id=current_user.id
-            ).first()
-            if not submitted:
-                assignmentPrompt += f"- {assignment.title}, due {assignment.due_date.strftime('%Y-%m-%d')}({assignment.points} points)\n"
         question = request.form.get("topics", "").strip()
-        
-        advice = ask_chatgpt(question, assignmentPrompt)
-        return render_template("study_plan.html", advice=advice, prefill=question)
-       
-    return render_template("study_plan.html", advice=advice, prefill="")
+        try:
+            job = study_plans.create_job(current_user.id, question)
+        except study_plans.QueueFull:
+            db.session.rollback()
+            flash("Lots of students are generating study plans right now. Please try again in a minute.", "warning")
+            return render_template("study_plan.html", advice=None, job=None, prefill=question), 503
+        db.session.commit()
+        if job.status == "pending":
+            study_plans.enqueue(job)
+        if request.accept_mimetypes.best == "application/json":
+            return jsonify(study_plans.to_dict(job)), 202
+        return redirect(url_for("main.study_plan", job=job.id))
+
+    job = None
+    job_id = request.args.get("job", type=int)
+    if job_id is not None:
+        job = StudyPlanJob.query.filter_by(id=job_id, student_id=current_user.id).first_or_404()
+        if study_plans.expire_stale(job):
+            db.session.commit()
+    advice = job.result if job is not None and job.status == "done" else None
+    return render_template("study_plan.html", advice=advice, job=job, prefill=job.comments if job else "")
+
+
+@bp.route("/study-plan/jobs/<int:job_id>")
+@login_required
+def study_plan_job(job_id):
+    """Status of a study plan job, polled by the study plan page."""
+    job = StudyPlanJob.query.filter_by(id=job_id, student_id=current_user.id).first()
+    if job is None:
+        return jsonify({"error": "not found"}), 404
+    if study_plans.expire_stale(job):
+        db.session.commit()
+    return jsonify(study_plans.to_dict(job))
+
+
+@bp.route("/study-plan/jobs/<int:job_id>/stream")
+@login_required
+def study_plan_stream(job_id):
+    """Server-Sent Events feed of a study plan as it is generated."""
+    job = StudyPlanJob.query.filter_by(id=job_id, student_id=current_user.id).first()
+    if job is None:
+        return jsonify({"error": "not found"}), 404
+
+    def snapshot():
+        # re-read after subscribing so a job finishing in between is not missed
+        db.session.refresh(job)
+        if study_plans.expire_stale(job):
+            db.session.commit()
+        return [dict(study_plans.to_dict(job), type="done")] if job.finished else []
+
+    return _event_stream(study_plans.channel(job.id), snapshot=snapshot, until=("done",))
 
 
 @bp.route("/messages")
 @login_required
 def messages_inbox():
-    """List conversations for current user."""
-    parts = ConversationParticipant.query.filter_by(user_id=current_user.id).all()
-    conversations = [p.conversation for p in parts]
-    # sort by last message time
-    conversations.sort(key=lambda c: c.last_message().created_at if c.last_message() else c.created_at, reverse=True)
-    # build summary
-    summary = []
-    for c in conversations:
-        last = c.last_message()
-        summary.append({
-            "conversation": c,
-            "last_message": last,
-            "unread": c.unread_count_for(current_user.id),
-        })
+    """List conversations for current user, most recently active first."""
+    page = request.args.get("page", 1, type=int)
+    per_page = current_app.config.get("INBOX_PAGE_SIZE", 20)
+    parts, has_next = messaging.inbox_page(current_user.id, page=page, per_page=per_page)
+    summary = [
+        {
+            "conversation": p.conversation,
+            "last_message": p.conversation.latest_message,
+            "unread": p.unread_count,
+        }
+        for p in parts
+    ]
 
-    return render_template("messages/inbox.html", conversations=summary)
+    return render_template(
+        "messages/inbox.html",
+        conversations=summary,
+        page=max(page, 1),
+        has_next=has_next,
+    )
 
 
 @bp.route("/messages/new", methods=["GET", "POST"])
@@ -833,6 +1016,7 @@ def messages_new():
         msg = Message(conversation_id=conv.id, sender_id=current_user.id, body=form.body.data)
         db.session.add(msg)
         db.session.commit()
+        messaging.publish_message(msg)
         return redirect(url_for("main.messages_view", conv_id=conv.id))
 
     # optionally accept ?recipient_id=.. query param
@@ -860,12 +1044,158 @@ def messages_view(conv_id):
         msg = Message(conversation_id=conv.id, sender_id=current_user.id, body=form.body.data)
         db.session.add(msg)
         db.session.commit()
+        messaging.publish_message(msg)
         return redirect(url_for("main.messages_view", conv_id=conv.id))
 
-    # mark read
-    from datetime import datetime
-    part.last_read_at = datetime.utcnow()
+    messaging.mark_read(part)
     db.session.commit()
 
-    messages = conv.messages
-    return render_template("messages/view.html", conversation=conv, messages=messages, form=form)
+    messages, older_cursor = messaging.history_page(
+        conv.id, limit=current_app.config.get("MESSAGES_PAGE_SIZE", 50)
+    )
+    return render_template(
+        "messages/view.html",
+        conversation=conv,
+        messages=messages,
+        older_cursor=older_cursor,
+        form=form,
+    )
+
+
+@bp.route("/messages/<int:conv_id>/older")
+@login_required
+def messages_older(conv_id):
+    """Return the page of messages before the ``before`` cursor as an HTML fragment."""
+    part = ConversationParticipant.query.filter_by(conversation_id=conv_id, user_id=current_user.id).first()
+    if not part:
+        return jsonify({"error": "not a participant"}), 403
+
+    before = messaging.decode_cursor(request.args.get("before", ""))
+    if before is None:
+        return jsonify({"error": "invalid cursor"}), 400
+
+    messages, older_cursor = messaging.history_page(
+        conv_id, before=before, limit=current_app.config.get("MESSAGES_PAGE_SIZE", 50)
+    )
+    return jsonify({
+        "html": render_template("messages/_messages.html", messages=messages),
+        "older_cursor": older_cursor,
+    })
+
+
+_stream_lock = threading.Lock()
+
+
+def _open_stream_slot(user_id):
+    """Count a new stream for ``user_id``; returns a release callback, or ``None`` at the cap."""
+    app = current_app._get_current_object()
+    limit = app.config.get("SSE_MAX_STREAMS_PER_USER", 4)
+    with _stream_lock:
+        open_streams = app.extensions.setdefault("sse_streams", Counter())
+        if limit and open_streams[user_id] >= limit:
+            return None
+        open_streams[user_id] += 1
+
+    def release():
+        with _stream_lock:
+            open_streams[user_id] -= 1
+            if open_streams[user_id] <= 0:
+                del open_streams[user_id]
+
+    return release
+
+
+def _sse(event):
+    # message events carry an id, so a reconnecting EventSource reports what it last saw
+    event_id = f"id: {event['message_id']}\n" if "message_id" in event else ""
+    return f"event: {event['type']}\n{event_id}data: {json.dumps(event)}\n\n"
+
+
+def _event_stream(*channels, snapshot=None, until=()):
+    """Relay broker events on ``channels`` to the client as Server-Sent Events.
+
+    The subscription is opened before the response is returned so no event
+    published after this call is missed. ``snapshot``, if given, is called once
+    subscribed and returns events to send first. The stream ends after an event
+    whose type is in ``until``. The generator runs outside the request context,
+    so the stream holds no database connection.
+
+    With sync workers every open stream occupies a thread, so a stream also
+    ends after ``SSE_MAX_STREAM_SECONDS`` and the browser's EventSource
+    reconnects. A user may hold at most ``SSE_MAX_STREAMS_PER_USER`` streams
+    per process; beyond that the request gets 429.
+    """
+    heartbeat = current_app.config.get("SSE_HEARTBEAT_SECONDS", 15)
+    lifetime = current_app.config.get("SSE_MAX_STREAM_SECONDS", 300)
+    release = _open_stream_slot(current_user.id)
+    if release is None:
+        return Response("Too many open streams.\n", status=429, headers={"Retry-After": "30"})
+    subscription = broker.get_broker().subscribe(*channels)
+    try:
+        initial = list(snapshot()) if snapshot is not None else []
+    except Exception:
+        subscription.close()
+        release()
+        raise
+
+    def generate():
+        deadline = time.monotonic() + lifetime if lifetime else None
+        try:
+            yield "retry: 3000\n\n"
+            for event in initial:
+                yield _sse(event)
+                if event["type"] in until:
+                    return
+            while True:
+                timeout = heartbeat
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return
+                    timeout = min(heartbeat, remaining)
+                event = subscription.get(timeout=timeout)
+                if event is None:
+                    if deadline is not None and time.monotonic() >= deadline:
+                        return
+                    yield ": keep-alive\n\n"
+                    continue
+                yield _sse(event)
+                if event["type"] in until:
+                    return
+        finally:
+            subscription.close()
+
+    response = Response(
+        generate(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    # runs even if the client disconnects before the generator starts
+    response.call_on_close(subscription.close)
+    response.call_on_close(release)
+    return response
+
+
+@bp.route("/messages/<int:conv_id>/stream")
+@login_required
+def messages_stream(conv_id):
+    """Server-Sent Events feed of new messages in one conversation."""
+    part = ConversationParticipant.query.filter_by(conversation_id=conv_id, user_id=current_user.id).first()
+    if not part:
+        return jsonify({"error": "not a participant"}), 403
+    last_seen = request.headers.get("Last-Event-ID", type=int)
+
+    def snapshot():
+        # a reconnecting client gets the messages posted while it was away
+        if last_seen is None:
+            return []
+        return [messaging.message_event(msg) for msg in messaging.messages_after(conv_id, last_seen)]
+
+    return _event_stream(messaging.conversation_channel(conv_id), snapshot=snapshot)
+
+
+@bp.route("/messages/stream")
+@login_required
+def messages_inbox_stream():
+    """Server-Sent Events feed of unread-count changes for the current user."""
+    return _event_stream(messaging.user_channel(current_user.id))
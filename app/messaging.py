@@ -0,0 +1,223 @@
+"""Conversation summaries and message history paging.
+
+Each ``Conversation`` stores the id and time of its latest message and each
+``ConversationParticipant`` an ``unread_count``. Both are updated whenever a
+``Message`` is flushed, so the inbox is one indexed query ordered by
+``last_message_at`` instead of loading every thread's full history.
+
+Threads are read a page at a time with a keyset cursor on
+``(created_at, id)``, backed by the ``ix_message_conversation_created`` index,
+so opening a thread costs the same however long it is.
+
+New messages are also pushed to ``conversation:<id>`` and ``user:<id>`` broker
+channels, which the Server-Sent Events endpoints relay to open browsers.
+"""
+from datetime import datetime
+
+from sqlalchemy import and_, event, func, or_, select, tuple_, update
+from sqlalchemy.orm import Session, contains_eager, joinedload
+
+from flask import render_template
+
+from app import broker, db
+from app.models import Conversation, ConversationParticipant, Message
+
+@event.listens_for(Session, "after_flush")
+def _summarize_new_messages(session, flush_context):
+    new_messages = [obj for obj in session.new if isinstance(obj, Message)]
+    if not new_messages:
+        return
+
+    conversations = Conversation.__table__
+    participants = ConversationParticipant.__table__
+    connection = session.connection()
+    for msg in sorted(new_messages, key=lambda m: (m.created_at, m.id)):
+        connection.execute(
+            update(conversations)
+            .where(
+                conversations.c.id == msg.conversation_id,
+                or_(
+                    conversations.c.last_message_id.is_(None),
+                    conversations.c.last_message_at < msg.created_at,
+                    and_(
+                        conversations.c.last_message_at == msg.created_at,
+                        conversations.c.last_message_id < msg.id,
+                    ),
+                ),
+            )
+            .values(last_message_id=msg.id, last_message_at=msg.created_at)
+        )
+        connection.execute(
+            update(participants)
+            .where(
+                participants.c.conversation_id == msg.conversation_id,
+                participants.c.user_id != msg.sender_id,
+            )
+            .values(unread_count=participants.c.unread_count + 1)
+        )
+    session.info.setdefault("touched_conversations", set()).update(
+        m.conversation_id for m in new_messages
+    )
+
+
+@event.listens_for(Session, "after_flush_postexec")
+def _expire_stale_summaries(session, flush_context):
+    touched = session.info.pop("touched_conversations", None)
+    if not touched:
+        return
+    for obj in list(session.identity_map.values()):
+        if isinstance(obj, Conversation) and obj.id in touched:
+            session.expire(obj, ["last_message_id", "last_message_at", "latest_message"])
+        elif isinstance(obj, ConversationParticipant) and obj.conversation_id in touched:
+            session.expire(obj, ["unread_count"])
+
+
+def mark_read(participant):
+    participant.last_read_at = datetime.utcnow()
+    participant.unread_count = 0
+
+
+def inbox_page(user_id, page=1, per_page=20):
+    """Return ``(participants, has_next)`` for one page of a user's inbox.
+
+    Each participant has its conversation, latest message and sender eagerly
+    loaded, so rendering the page issues no further queries.
+    """
+    page = max(page, 1)
+    rows = (
+        ConversationParticipant.query
+        .join(ConversationParticipant.conversation)
+        .filter(ConversationParticipant.user_id == user_id)
+        .options(
+            contains_eager(ConversationParticipant.conversation)
+            .joinedload(Conversation.latest_message)
+            .joinedload(Message.sender)
+        )
+        .order_by(Conversation.last_message_at.desc(), Conversation.id.desc())
+        .offset((page - 1) * per_page)
+        .limit(per_page + 1)
+        .all()
+    )
+    return rows[:per_page], len(rows) > per_page
+
+
+def encode_cursor(message):
+    return f"{message.created_at.isoformat()}_{message.id}"
+
+
+def decode_cursor(value):
+    """Parse a cursor from ``encode_cursor``; returns ``None`` if malformed."""
+    try:
+        stamp, _, message_id = value.rpartition("_")
+        return datetime.fromisoformat(stamp), int(message_id)
+    except (AttributeError, ValueError):
+        return None
+
+
+def history_page(conversation_id, before=None, limit=50):
+    """Return ``(messages, older_cursor)`` for one page of a thread.
+
+    ``messages`` are the ``limit`` newest messages older than the ``before``
+    cursor (or the newest overall), oldest first. ``older_cursor`` is ``None``
+    once the start of the thread has been reached.
+    """
+    query = Message.query.filter(Message.conversation_id == conversation_id).options(
+        joinedload(Message.sender)
+    )
+    if before is not None:
+        query = query.filter(tuple_(Message.created_at, Message.id) < tuple_(*before))
+    rows = query.order_by(Message.created_at.desc(), Message.id.desc()).limit(limit + 1).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    rows.reverse()
+    return rows, encode_cursor(rows[0]) if has_more and rows else None
+
+
+def conversation_channel(conversation_id):
+    return f"conversation:{conversation_id}"
+
+
+def user_channel(user_id):
+    return f"user:{user_id}"
+
+
+def message_event(msg):
+    """The Server-Sent Event announcing ``msg`` in its thread."""
+    return {
+        "type": "message",
+        "conversation_id": msg.conversation_id,
+        "message_id": msg.id,
+        "sender_id": msg.sender_id,
+        "html": render_template("messages/_messages.html", messages=[msg]),
+    }
+
+
+def messages_after(conversation_id, message_id, limit=200):
+    """Up to ``limit`` messages of a thread with ids above ``message_id``, oldest first."""
+    return (
+        Message.query.filter(Message.conversation_id == conversation_id, Message.id > message_id)
+        .options(joinedload(Message.sender))
+        .order_by(Message.id)
+        .limit(limit)
+        .all()
+    )
+
+
+def publish_message(msg):
+    """Announce a committed message to the thread and to each participant's inbox."""
+    broker.publish(conversation_channel(msg.conversation_id), message_event(msg))
+    counts = db.session.query(
+        ConversationParticipant.user_id, ConversationParticipant.unread_count
+    ).filter(ConversationParticipant.conversation_id == msg.conversation_id).all()
+    for user_id, unread in counts:
+        broker.publish(user_channel(user_id), {
+            "type": "unread",
+            "conversation_id": msg.conversation_id,
+            "unread": unread,
+        })
+
+
+def summary_updates():
+    """UPDATE statements that recompute every summary column from ``Message``."""
+    latest = (
+        select(Message.id)
+        .where(Message.conversation_id == Conversation.id)
+        .order_by(Message.created_at.desc(), Message.id.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    latest_at = (
+        select(func.max(Message.created_at))
+        .where(Message.conversation_id == Conversation.id)
+        .scalar_subquery()
+    )
+    unread = (
+        select(func.count(Message.id))
+        .where(
+            Message.conversation_id == ConversationParticipant.conversation_id,
+            Message.sender_id != ConversationParticipant.user_id,
+            or_(
+                ConversationParticipant.last_read_at.is_(None),
+                Message.created_at > ConversationParticipant.last_read_at,
+            ),
+        )
+        .scalar_subquery()
+    )
+    return [
+        update(Conversation).values(
+            last_message_id=latest,
+            last_message_at=func.coalesce(latest_at, Conversation.created_at),
+        ),
+        update(ConversationParticipant).values(unread_count=unread),
+    ]
+
+
+def rebuild_summaries():
+    """Recompute every conversation summary and unread count from ``Message``.
+
+    Does not commit. Databases that predate the summary columns need
+    ``flask db-upgrade`` first, which also runs this backfill.
+    """
+    for statement in summary_updates():
+        db.session.execute(statement.execution_options(synchronize_session=False))
@@ -0,0 +1,267 @@
+"""Versioned schema migrations and query plan checks.
+
+``db.create_all()`` only creates missing tables; it cannot add a column or an
+index to a table that already exists. Each migration below is a numbered step
+that does, and the ``schema_version`` table records which steps a database has
+applied. ``flask db-upgrade`` runs the pending ones in order, each in its own
+transaction.
+
+Steps are written to be safe on databases that already have the change (a
+new database gets every table, column and index from the baseline), so
+upgrading is always just "run what is pending".
+
+``flask explain-queries`` runs ``EXPLAIN QUERY PLAN`` over the hot queries in
+the routes and fails if any of them scans a whole table.
+"""
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, case, func, inspect, select, text
+from sqlalchemy.schema import CreateColumn
+
+from app import db
+
+_version_metadata = MetaData()
+schema_version = Table(
+    "schema_version",
+    _version_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("name", String(100), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+def _table(name):
+    return db.metadata.tables[name]
+
+
+def add_column(connection, table_name, column_name):
+    """Add a model column to an existing table; returns ``False`` if it is there already."""
+    existing = {c["name"] for c in inspect(connection).get_columns(table_name)}
+    if column_name in existing:
+        return False
+    column = _table(table_name).c[column_name]
+    ddl = CreateColumn(column).compile(dialect=connection.dialect)
+    table = connection.dialect.identifier_preparer.quote(table_name)
+    connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {ddl}"))
+    return True
+
+
+def create_indexes(connection, *names):
+    """Create the named model indexes that do not exist yet."""
+    wanted = set(names)
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            if index.name in wanted:
+                index.create(connection, checkfirst=True)
+                wanted.discard(index.name)
+    if wanted:
+        raise KeyError(f"No model declares index(es): {', '.join(sorted(wanted))}")
+
+
+def _baseline(connection):
+    db.metadata.create_all(connection)
+
+
+def _conversation_summaries(connection):
+    added = [
+        add_column(connection, "conversation", "last_message_id"),
+        add_column(connection, "conversation", "last_message_at"),
+        add_column(connection, "conversation_participant", "unread_count"),
+    ]
+    create_indexes(
+        connection,
+        "ix_conversation_last_message_at",
+        "ix_participant_user_conversation",
+        "ix_message_conversation_created",
+    )
+    if any(added):
+        from app import messaging
+        for statement in messaging.summary_updates():
+            connection.execute(statement)
+
+
+def _assignment_updated_at(connection):
+    add_column(connection, "assignment", "updated_at")
+    # there is no creation time to copy: use the due date, or now for assignments not yet due
+    assignment = _table("assignment")
+    now = datetime.utcnow()
+    connection.execute(
+        assignment.update()
+        .where(assignment.c.updated_at.is_(None))
+        .values(updated_at=case((assignment.c.due_date < now, assignment.c.due_date), else_=now))
+    )
+    create_indexes(connection, "ix_assignment_course_due", "ix_assignment_due_date")
+
+
+def _secondary_indexes(connection):
+    create_indexes(
+        connection,
+        "ix_assignment_creator_due",
+        "ix_submission_assignment_student",
+        "ix_submission_student_status",
+        "ix_rubric_criterion_assignment",
+        "ix_announcement_course_created",
+        "ix_announcement_created_at",
+        "ix_participant_conversation_user",
+        "ix_gradebook_entry_course",
+    )
+
+
+def _widen_password_hash(connection):
+    # scrypt hashes are longer than 128 characters; SQLite does not enforce VARCHAR lengths
+    if connection.dialect.name == "postgresql":
+        table = connection.dialect.identifier_preparer.quote("user")
+        connection.execute(text(f"ALTER TABLE {table} ALTER COLUMN password TYPE VARCHAR(255)"))
+
+
+def _rubric_scores(connection):
+    _table("rubric_score").create(connection, checkfirst=True)
+    create_indexes(connection, "ix_rubric_score_criterion_points")
+    from app import rubrics
+    rubrics.copy_legacy_scores(connection)
+
+
+def _at_risk_pipeline(connection):
+    if add_column(connection, "submission", "updated_at"):
+        submission = _table("submission")
+        connection.execute(
+            submission.update()
+            .where(submission.c.updated_at.is_(None))
+            .values(updated_at=func.coalesce(submission.c.submitted_at, datetime.utcnow()))
+        )
+    create_indexes(connection, "ix_submission_updated_at")
+    _table("student_risk").create(connection, checkfirst=True)
+    _table("pipeline_watermark").create(connection, checkfirst=True)
+
+
+def _feed_token_version(connection):
+    add_column(connection, "user", "feed_token_version")
+
+
+def _course_rescores(connection):
+    _table("course_rescore").create(connection, checkfirst=True)
+    create_indexes(connection, "ix_course_rescore_marked_at")
+
+
+def _legacy_enrollments(connection):
+    from app import enrollments
+    enrollments.migrate_classes(connection)
+
+
+def _gradebook_rollup(connection):
+    from app import gradebook
+    gradebook.rebuild(connection=connection)
+
+
+MIGRATIONS = [
+    (1, "baseline", _baseline),
+    (2, "conversation summaries", _conversation_summaries),
+    (3, "assignment updated_at", _assignment_updated_at),
+    (4, "secondary indexes", _secondary_indexes),
+    (5, "wider password hashes", _widen_password_hash),
+    (6, "normalized rubric scores", _rubric_scores),
+    (7, "at-risk pipeline", _at_risk_pipeline),
+    (8, "calendar feed token version", _feed_token_version),
+    (9, "at-risk course rescores", _course_rescores),
+    (10, "enrollments from legacy classes", _legacy_enrollments),
+    (11, "gradebook rollup from submissions", _gradebook_rollup),
+]
+
+HEAD = MIGRATIONS[-1][0]
+
+
+def current_version(engine=None):
+    engine = engine or db.engine
+    with engine.connect() as connection:
+        if not inspect(connection).has_table("schema_version"):
+            return 0
+        return connection.execute(select(schema_version.c.version).order_by(schema_version.c.version.desc())).scalar() or 0
+
+
+def upgrade(engine=None):
+    """Apply every pending migration; returns the ``(version, name)`` pairs applied."""
+    engine = engine or db.engine
+    with engine.begin() as connection:
+        _version_metadata.create_all(connection)
+    version = current_version(engine)
+
+    applied = []
+    for number, name, step in MIGRATIONS:
+        if number <= version:
+            continue
+        with engine.begin() as connection:
+            step(connection)
+            connection.execute(
+                schema_version.insert().values(version=number, name=name, applied_at=datetime.utcnow())
+            )
+        applied.append((number, name))
+    return applied
+
+
+def _hot_queries():
+    """Representative statements from the routes, with placeholder ids."""
+    from app import assignment_lists, enrollments, grading_queue
+    from app.models import (
+        Announcement, Assignment, Conversation, ConversationParticipant, Enrollment,
+        GradebookEntry, Message, RubricCriterion, RubricScore, Submission,
+    )
+
+    now = datetime(2030, 1, 1)
+    return [
+        ("student submissions", select(Submission).where(Submission.student_id == 1)),
+        ("assignment submissions", select(Submission).where(Submission.assignment_id == 1)),
+        ("submission lookup", select(Submission).where(
+            Submission.assignment_id == 1, Submission.student_id == 1)),
+        ("instructor grading queue", grading_queue.statement(Assignment.created_by == 1, after=(now, 1))),
+        ("ta grading backlog", select(Assignment.id, func.count()).join(Submission).where(
+            Assignment.course_id.in_(enrollments.course_ids_subquery(1)), Submission.status != "Graded",
+        ).group_by(Assignment.id)),
+        ("instructor assignments", select(Assignment).where(
+            Assignment.created_by == 1).order_by(Assignment.due_date)),
+        ("course assignments", select(Assignment).where(
+            Assignment.course_id == 1).order_by(Assignment.due_date)),
+        ("upcoming assignments", select(Assignment).order_by(Assignment.due_date).limit(8)),
+        ("student calendar month", select(Assignment).where(
+            Assignment.due_date >= now, Assignment.due_date < datetime(2030, 2, 1),
+            Assignment.course_id.is_(None) | Assignment.course_id.in_(enrollments.course_ids_subquery(1)),
+        ).order_by(Assignment.due_date)),
+        ("student assignments page", select(Assignment, assignment_lists.status_column(now)).outerjoin(
+            Submission, assignment_lists.latest_submission(1),
+        ).where(
+            Assignment.course_id.is_(None) | Assignment.course_id.in_(enrollments.course_ids_subquery(1)),
+        ).order_by(Assignment.due_date, Assignment.id).limit(26)),
+        ("rubric criteria", select(RubricCriterion).where(RubricCriterion.assignment_id == 1)),
+        ("submission rubric scores", select(RubricScore).where(RubricScore.submission_id.in_([1, 2]))),
+        ("rubric criterion stats", select(RubricScore.criterion_id, RubricScore.points, func.count()).where(
+            RubricScore.criterion_id.in_([1, 2])).group_by(RubricScore.criterion_id, RubricScore.points)),
+        ("course announcements", select(Announcement).where(
+            Announcement.course_id == 1).order_by(Announcement.created_at.desc())),
+        ("recent announcements", select(Announcement).order_by(Announcement.created_at.desc()).limit(5)),
+        ("enrolled courses", select(Enrollment.course_id).where(Enrollment.user_id == 1)),
+        ("course members", select(Enrollment.user_id).where(
+            Enrollment.course_id == 1, Enrollment.role == "student")),
+        ("student gradebook", select(GradebookEntry).where(GradebookEntry.student_id == 1)),
+        ("inbox page", select(ConversationParticipant).join(Conversation).where(
+            ConversationParticipant.user_id == 1,
+        ).order_by(Conversation.last_message_at.desc(), Conversation.id.desc()).limit(21)),
+        ("conversation participants", select(ConversationParticipant).where(
+            ConversationParticipant.conversation_id == 1)),
+        ("thread history", select(Message).where(Message.conversation_id == 1).order_by(
+            Message.created_at.desc(), Message.id.desc()).limit(51)),
+    ]
+
+
+def _full_scans(plan):
+    # "SCAN t" reads the whole table; "SCAN t USING INDEX" walks an index in order
+    return [detail for detail in plan if detail.startswith("SCAN ") and " USING " not in detail]
+
+
+def explain_hot_queries(connection=None):
+    """Return ``(name, plan, full_scans)`` for each hot query (SQLite only)."""
+    connection = connection or db.session.connection()
+    results = []
+    for name, statement in _hot_queries():
+        sql = statement.compile(dialect=connection.dialect, compile_kwargs={"literal_binds": True})
+        plan = [row[3] for row in connection.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+        results.append((name, plan, _full_scans(plan)))
+    return results
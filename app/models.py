@@ -1,25 +1,32 @@
 from app import db
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
 
+from app import passwords
+
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(32), nullable=False, unique=True)
-    password = db.Column(db.String(128), nullable=False)
+    password = db.Column(db.String(255), nullable=False)
     email = db.Column(db.String(100), nullable=False, unique=True)
     role = db.Column(db.String(20), nullable=False, default="student")  # student, instructor, ta
+    # bumped to revoke every calendar feed URL issued so far
+    feed_token_version = db.Column(db.Integer, nullable=False, default=0, server_default="0")
 
     def set_password(self, password):
-        self.password = generate_password_hash(password, method='pbkdf2:sha256')
+        self.password = passwords.hash_password(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password, password)
+        return passwords.verify(self.password, password)
 
     def __repr__(self):
         return f'<user {self.id}: {self.username}>'
 
 class Classes(db.Model):
+    """Legacy JSON course list per user, superseded by ``Enrollment``.
+
+    Kept so existing rows can be converted with ``flask migrate-enrollments``.
+    """
     id = db.Column(db.Integer, primary_key=True)
     user = db.Column(db.ForeignKey('user.id'), nullable=False)
     classes = db.Column(db.JSON, nullable=False)
@@ -31,7 +38,29 @@ class Course(db.Model):
     description = db.Column(db.Text, nullable=True)
 
 
+class Enrollment(db.Model):
+    __table_args__ = (
+        db.UniqueConstraint("user_id", "course_id", name="uq_enrollment_user_course"),
+        db.Index("ix_enrollment_course_role", "course_id", "role", "user_id"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    course_id = db.Column(db.Integer, db.ForeignKey("course.id"), nullable=False)
+    role = db.Column(db.String(20), nullable=False, default="student")  # student, ta, instructor
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    user = db.relationship("User")
+    course = db.relationship("Course")
+
+
 class Assignment(db.Model):
+    __table_args__ = (
+        db.Index("ix_assignment_course_due", "course_id", "due_date"),
+        db.Index("ix_assignment_due_date", "due_date"),
+        db.Index("ix_assignment_creator_due", "created_by", "due_date"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(150), nullable=False)
     description = db.Column(db.Text, nullable=False)
@@ -42,12 +71,17 @@ class Assignment(db.Model):
     allow_submissions = db.Column(db.Boolean, nullable=False, default=True)
     course_id = db.Column(db.Integer, db.ForeignKey("course.id"), nullable=True)
     created_by = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     course = db.relationship("Course")
     creator = db.relationship("User", foreign_keys=[created_by])
 
 
 class RubricCriterion(db.Model):
+    __table_args__ = (
+        db.Index("ix_rubric_criterion_assignment", "assignment_id"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     assignment_id = db.Column(db.Integer, db.ForeignKey("assignment.id"), nullable=False)
     title = db.Column(db.String(120), nullable=False)
@@ -58,6 +92,12 @@ class RubricCriterion(db.Model):
 
 
 class Submission(db.Model):
+    __table_args__ = (
+        db.Index("ix_submission_assignment_student", "assignment_id", "student_id"),
+        db.Index("ix_submission_student_status", "student_id", "status"),
+        db.Index("ix_submission_updated_at", "updated_at"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     assignment_id = db.Column(db.Integer, db.ForeignKey("assignment.id"), nullable=False)
     student_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
@@ -65,13 +105,57 @@ class Submission(db.Model):
     content = db.Column(db.Text, nullable=True)
     status = db.Column(db.String(20), nullable=False, default="Submitted")
     score = db.Column(db.Integer, nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # legacy {criterion_id: points} blob, copied into RubricScore by migration 6
     rubric_scores = db.Column(db.JSON, nullable=True)
 
     assignment = db.relationship("Assignment", backref="submissions", lazy=True)
     student = db.relationship("User", foreign_keys=[student_id])
 
 
+class RubricScore(db.Model):
+    """Points a submission earned on one rubric criterion."""
+
+    __table_args__ = (
+        db.UniqueConstraint("submission_id", "criterion_id", name="uq_rubric_score_submission_criterion"),
+        db.Index("ix_rubric_score_criterion_points", "criterion_id", "points"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    submission_id = db.Column(db.Integer, db.ForeignKey("submission.id"), nullable=False)
+    criterion_id = db.Column(db.Integer, db.ForeignKey("rubric_criterion.id"), nullable=False)
+    points = db.Column(db.Integer, nullable=False)
+
+    submission = db.relationship(
+        "Submission", backref=db.backref("rubric_points", cascade="all, delete-orphan", lazy=True)
+    )
+    criterion = db.relationship("RubricCriterion")
+
+
+class GradebookEntry(db.Model):
+    """Running earned/possible totals for one student, course and category."""
+
+    __table_args__ = (
+        db.UniqueConstraint("student_id", "course_id", "category", name="uq_gradebook_entry"),
+        db.Index("ix_gradebook_entry_course", "course_id"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    student_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    course_id = db.Column(db.Integer, db.ForeignKey("course.id"), nullable=False)
+    category = db.Column(db.String(20), nullable=False)
+    earned = db.Column(db.Integer, nullable=False, default=0)
+    possible = db.Column(db.Integer, nullable=False, default=0)
+    percentage = db.Column(db.Float, nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
 class Announcement(db.Model):
+    __table_args__ = (
+        db.Index("ix_announcement_course_created", "course_id", "created_at"),
+        db.Index("ix_announcement_created_at", "created_at"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(150), nullable=False)
     body = db.Column(db.Text, nullable=False)
@@ -84,10 +168,17 @@ class Announcement(db.Model):
 
 
 class Conversation(db.Model):
+    __table_args__ = (
+        db.Index("ix_conversation_last_message_at", "last_message_at"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(150), nullable=True)
     is_group = db.Column(db.Boolean, default=False, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # denormalized summary, maintained by app.messaging whenever a message is flushed
+    last_message_id = db.Column(db.Integer, nullable=True)
+    last_message_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     participants = db.relationship(
         "ConversationParticipant",
@@ -104,32 +195,37 @@ class Conversation(db.Model):
         lazy=True,
     )
 
-    def last_message(self):
-        if not self.messages:
-            return None
-        return self.messages[-1]
+    latest_message = db.relationship(
+        "Message",
+        primaryjoin="foreign(Conversation.last_message_id) == Message.id",
+        viewonly=True,
+        uselist=False,
+    )
 
-    def unread_count_for(self, user_id):
-        part = ConversationParticipant.query.filter_by(conversation_id=self.id, user_id=user_id).first()
-        if not part:
-            return 0
-        last_read = part.last_read_at
-        if not last_read:
-            # all messages are unread
-            return len(self.messages)
-        return sum(1 for m in self.messages if m.created_at > last_read)
+    def last_message(self):
+        return self.latest_message
 
 
 class ConversationParticipant(db.Model):
+    __table_args__ = (
+        db.Index("ix_participant_user_conversation", "user_id", "conversation_id"),
+        db.Index("ix_participant_conversation_user", "conversation_id", "user_id"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     conversation_id = db.Column(db.Integer, db.ForeignKey("conversation.id"), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
     last_read_at = db.Column(db.DateTime, nullable=True)
+    unread_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
 
     user = db.relationship("User")
 
 
 class Message(db.Model):
+    __table_args__ = (
+        db.Index("ix_message_conversation_created", "conversation_id", "created_at", "id"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     conversation_id = db.Column(db.Integer, db.ForeignKey("conversation.id"), nullable=False)
     sender_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
@@ -139,3 +235,73 @@ class Message(db.Model):
     deleted = db.Column(db.Boolean, default=False, nullable=False)
 
     sender = db.relationship("User", foreign_keys=[sender_id])
+
+
+class StudyPlanJob(db.Model):
+    """A study plan requested by a student, generated in the background."""
+
+    __table_args__ = (
+        db.Index("ix_study_plan_job_status_created", "status", "created_at"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    student_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False, index=True)
+    status = db.Column(db.String(20), nullable=False, default="pending")  # pending, running, done, failed
+    comments = db.Column(db.Text, nullable=False, default="")
+    assignments = db.Column(db.Text, nullable=False, default="")
+    result = db.Column(db.Text, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    student = db.relationship("User")
+
+    @property
+    def finished(self):
+        return self.status in ("done", "failed")
+
+
+class StudentRisk(db.Model):
+    """At-risk signals for one student in one course, written by ``flask at-risk``."""
+
+    __table_args__ = (
+        db.UniqueConstraint("course_id", "student_id", name="uq_student_risk_course_student"),
+        db.Index("ix_student_risk_course_score", "course_id", "risk"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    course_id = db.Column(db.Integer, db.ForeignKey("course.id"), nullable=False)
+    student_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    past_due = db.Column(db.Integer, nullable=False, default=0)
+    missed = db.Column(db.Integer, nullable=False, default=0)
+    submitted = db.Column(db.Integer, nullable=False, default=0)
+    late = db.Column(db.Integer, nullable=False, default=0)
+    late_ratio = db.Column(db.Float, nullable=True)
+    trend = db.Column(db.Float, nullable=True)  # percentage points per assignment
+    risk = db.Column(db.Float, nullable=False, default=0)
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    course = db.relationship("Course")
+    student = db.relationship("User")
+
+
+class PipelineWatermark(db.Model):
+    """How far a batch job has processed, so the next run can start from there."""
+
+    name = db.Column(db.String(50), primary_key=True)
+    high_water = db.Column(db.DateTime, nullable=False)
+
+
+class CourseRescore(db.Model):
+    """A course the next at-risk run must rescore because an assignment left it.
+
+    A deleted (or moved) assignment leaves no row with a newer ``updated_at``
+    behind in its old course, so the change is recorded here instead.
+    """
+
+    __table_args__ = (db.Index("ix_course_rescore_marked_at", "marked_at"),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    course_id = db.Column(db.Integer, db.ForeignKey("course.id"), nullable=False)
+    marked_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
@@ -0,0 +1,97 @@
+"""Password hashing policy.
+
+``WERKZEUG_PASSWORD_HASH_METHOD`` sets the algorithm and cost of new hashes in
+Werkzeug's notation: ``pbkdf2:sha256:<iterations>`` or ``scrypt:<n>:<r>:<p>``.
+Every stored hash records its own parameters, so changing the policy never
+locks anyone out. ``verify`` checks a password against whatever its hash
+specifies. After a successful check, ``needs_rehash`` tells the login view
+whether to store a fresh hash under the current policy.
+
+Hashing is deliberately slow, and a burst of logins at the start of class can
+occupy every worker. With ``PASSWORD_HASH_WORKERS`` above zero, hashing runs
+in a process pool of that size, so at most that many cores hash at once. Extra
+logins wait for the pool instead of competing with page rendering for CPU.
+The pool uses the ``spawn`` start method, because forking a threaded server
+is unsafe.
+"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from flask import current_app, has_app_context
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+DEFAULT_METHOD = f"pbkdf2:sha256:{DEFAULT_PBKDF2_ITERATIONS}"
+
+# Werkzeug's defaults for parameters left out of a method string
+_DEFAULT_PARAMS = {
+    "pbkdf2": ["sha256", str(DEFAULT_PBKDF2_ITERATIONS)],
+    "scrypt": ["32768", "8", "1"],
+}
+
+
+def _config(key, default):
+    if not has_app_context():
+        return default
+    return current_app.config.get(key, default)
+
+
+def normalize(method):
+    """Spell out the defaults, as Werkzeug does in the hashes it stores."""
+    name, *params = method.split(":")
+    defaults = _DEFAULT_PARAMS.get(name)
+    if defaults is None:
+        return method
+    return ":".join([name] + params + defaults[len(params):])
+
+
+def policy():
+    return normalize(_config("WERKZEUG_PASSWORD_HASH_METHOD", DEFAULT_METHOD))
+
+
+def needs_rehash(stored):
+    """``True`` if ``stored`` was made with other parameters than the current policy."""
+    return stored.split("$", 1)[0] != policy()
+
+
+def _pool(app, workers):
+    pool = app.extensions.get("password_pool")
+    if pool is None:
+        pool = process_pool(workers)
+        app.extensions["password_pool"] = pool
+    return pool
+
+
+def _run(func, *args):
+    workers = _config("PASSWORD_HASH_WORKERS", 0)
+    if not workers:
+        return func(*args)
+    return _pool(current_app._get_current_object(), workers).submit(func, *args).result()
+
+
+def hash_password(password):
+    return _run(generate_password_hash, password, policy())
+
+
+def verify(stored, password):
+    return _run(check_password_hash, stored, password)
+
+
+def hash_many(values, executor=None):
+    """Hash ``values`` under the current policy, in parallel when a pool is available.
+
+    Uses ``executor`` if given, else the ``PASSWORD_HASH_WORKERS`` pool, else
+    hashes inline.
+    """
+    method = policy()
+    if executor is None:
+        workers = _config("PASSWORD_HASH_WORKERS", 0)
+        if workers:
+            executor = _pool(current_app._get_current_object(), workers)
+    if executor is None or len(values) < 2:
+        return [generate_password_hash(value, method) for value in values]
+    return list(executor.map(generate_password_hash, values, [method] * len(values)))
+
+
+def process_pool(workers):
+    """A standalone hashing pool, e.g. for a one-off bulk import."""
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
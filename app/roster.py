@@ -0,0 +1,221 @@
+"""Bulk roster import: CSV rows to user accounts and course enrollments.
+
+A roster CSV needs a header row with ``username`` and ``email`` columns. It
+may also have ``password``, ``role`` (student, ta or instructor; default
+student) and ``course_code``. A password is required only for accounts that
+do not exist yet. The course comes from the caller, or else from each row's
+``course_code``; a row with neither only gets an account.
+
+``import_roster`` reads the file as a stream, ``ROSTER_IMPORT_BATCH_SIZE``
+rows at a time. For each batch it:
+
+* validates the rows and records a ``(line, message)`` error for each bad one;
+* looks up the courses and the existing accounts with one query each;
+* hashes the new accounts' passwords in parallel (``passwords.hash_many``);
+* inserts the new users, then the missing enrollments, with one executemany each;
+* commits, so a failure only loses the current batch.
+
+Re-running an import is safe. A row whose username and email match an
+existing account reuses that account, and enrollments that already exist are
+skipped. The import never changes an existing account's password or role.
+"""
+import csv
+import re
+import time
+
+from flask import current_app
+from sqlalchemy import insert, or_, select
+from sqlalchemy.exc import IntegrityError
+
+from app import db, passwords
+from app.models import Course, Enrollment, User
+
+ROLES = ("student", "ta", "instructor")
+REQUIRED_COLUMNS = ("username", "email")
+_EMAIL = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+
+class RosterError(ValueError):
+    """The file cannot be imported at all (as opposed to a bad row)."""
+
+
+class ImportReport:
+    """Counts and per-row errors from one roster import."""
+
+    def __init__(self):
+        self.rows = 0
+        self.users_created = 0
+        self.users_existing = 0
+        self.enrollments_created = 0
+        self.errors = []
+        self.seconds = 0.0
+
+    def error(self, line, message):
+        self.errors.append((line, message))
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def summary(self):
+        return (
+            f"{self.rows} rows in {self.seconds:.1f}s ({self.rows_per_second:.0f} rows/s): "
+            f"{self.users_created} accounts created, {self.users_existing} already existed, "
+            f"{self.enrollments_created} enrollments added, {len(self.errors)} rows rejected."
+        )
+
+
+def _validate(row):
+    """Return ``(entry, None)`` for a usable row or ``(None, message)``."""
+    username = row.get("username", "")
+    email = row.get("email", "")
+    role = row.get("role", "").lower() or "student"
+    if not username:
+        return None, "username is required"
+    if len(username) > User.username.type.length:
+        return None, f"username is longer than {User.username.type.length} characters"
+    if not _EMAIL.match(email) or len(email) > User.email.type.length:
+        return None, f"invalid email address {email!r}"
+    if role not in ROLES:
+        return None, f"unknown role {role!r} (expected one of: {', '.join(ROLES)})"
+    return {
+        "username": username,
+        "email": email,
+        "password": row.get("password", ""),
+        "role": role,
+        "course_code": row.get("course_code", ""),
+    }, None
+
+
+def _import_batch(entries, course, report, executor):
+    """Insert one batch of validated entries and commit it."""
+    codes = {e["course_code"] for e in entries if e["course_code"]} if course is None else set()
+    course_ids = dict(db.session.execute(
+        select(Course.course_code, Course.id).where(Course.course_code.in_(codes))
+    ).all()) if codes else {}
+
+    existing = db.session.execute(
+        select(User.id, User.username, User.email, User.role).where(or_(
+            User.username.in_([e["username"] for e in entries]),
+            User.email.in_([e["email"] for e in entries]),
+        ))
+    ).all()
+    by_username = {u.username: u for u in existing}
+    by_email = {u.email: u for u in existing}
+
+    accepted = []
+    new_entries = []
+    for entry in entries:
+        if course is not None:
+            entry["course_id"] = course.id
+        elif entry["course_code"]:
+            entry["course_id"] = course_ids.get(entry["course_code"])
+            if entry["course_id"] is None:
+                report.error(entry["line"], f"unknown course code {entry['course_code']!r}")
+                continue
+        else:
+            entry["course_id"] = None
+
+        user = by_username.get(entry["username"])
+        if user is not None:
+            if user.email != entry["email"]:
+                report.error(entry["line"], f"username {entry['username']!r} belongs to another email address")
+                continue
+            entry["user_id"], entry["role"] = user.id, user.role
+        elif entry["email"] in by_email:
+            report.error(entry["line"], f"email {entry['email']!r} belongs to user {by_email[entry['email']].username!r}")
+            continue
+        elif not entry["password"]:
+            report.error(entry["line"], "password is required for new accounts")
+            continue
+        else:
+            new_entries.append(entry)
+        accepted.append(entry)
+
+    hashes = passwords.hash_many([e["password"] for e in new_entries], executor=executor)
+    try:
+        if new_entries:
+            created = db.session.execute(
+                insert(User).returning(User.id, User.username),
+                [
+                    {"username": e["username"], "email": e["email"], "role": e["role"], "password": stored}
+                    for e, stored in zip(new_entries, hashes)
+                ],
+            ).all()
+            ids = {username: user_id for user_id, username in created}
+            for entry in new_entries:
+                entry["user_id"] = ids[entry["username"]]
+
+        wanted = {(e["user_id"], e["course_id"]): e["role"] for e in accepted if e["course_id"]}
+        enrolled = set()
+        if wanted:
+            enrolled = set(db.session.execute(
+                select(Enrollment.user_id, Enrollment.course_id).where(
+                    Enrollment.user_id.in_({user_id for user_id, _ in wanted}),
+                    Enrollment.course_id.in_({course_id for _, course_id in wanted}),
+                )
+            ).all())
+        missing = [
+            {"user_id": user_id, "course_id": course_id, "role": role}
+            for (user_id, course_id), role in wanted.items()
+            if (user_id, course_id) not in enrolled
+        ]
+        if missing:
+            db.session.execute(insert(Enrollment), missing)
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        for entry in accepted:
+            report.error(entry["line"], "conflicts with a change made during the import; re-run it")
+        return
+
+    report.users_created += len(new_entries)
+    report.users_existing += len(accepted) - len(new_entries)
+    report.enrollments_created += len(missing)
+
+
+def import_roster(stream, course=None, batch_size=None, executor=None):
+    """Import a roster CSV from a text ``stream``; returns an ``ImportReport``.
+
+    ``course`` enrolls every row in that course instead of using ``course_code``.
+    ``executor`` is an optional process pool for password hashing.
+    """
+    batch_size = batch_size or current_app.config.get("ROSTER_IMPORT_BATCH_SIZE", 500)
+    report = ImportReport()
+    began = time.perf_counter()
+
+    reader = csv.DictReader(stream)
+    header = [(name or "").strip().lower() for name in reader.fieldnames or []]
+    missing = [column for column in REQUIRED_COLUMNS if column not in header]
+    if missing:
+        raise RosterError(f"Roster is missing column(s): {', '.join(missing)}")
+    reader.fieldnames = header
+
+    seen = {}
+    batch = []
+    for row in reader:
+        line = reader.line_num
+        report.rows += 1
+        entry, problem = _validate({k: (v or "").strip() for k, v in row.items() if k})
+        if entry is None:
+            report.error(line, problem)
+            continue
+        for key in ("username", "email"):
+            first = seen.setdefault((key, entry[key]), line)
+            if first != line:
+                problem = f"duplicate {key} (first seen on line {first})"
+                break
+        if problem:
+            report.error(line, problem)
+            continue
+        entry["line"] = line
+        batch.append(entry)
+        if len(batch) >= batch_size:
+            _import_batch(batch, course, report, executor)
+            batch = []
+    if batch:
+        _import_batch(batch, course, report, executor)
+
+    report.errors.sort()
+    report.seconds = time.perf_counter() - began
+    return report
@@ -0,0 +1,130 @@
+"""Rubric scores stored one row per submission and criterion.
+
+``RubricScore`` replaces the ``Submission.rubric_scores`` JSON blob. Pages
+read a whole assignment's points with one query (``points_by_submission``).
+Per-criterion statistics come from one ``GROUP BY criterion_id, points`` over
+the ``(criterion_id, points)`` index. Its result has at most one row per
+distinct score per criterion, so averages and distributions are cheap to
+derive from it however many submissions there are.
+"""
+from sqlalchemy import delete, func, insert, select
+
+from app import db
+from app.models import RubricCriterion, RubricScore, Submission
+
+
+class CriterionStats:
+    """Count, average, range and ``{points: submissions}`` for one criterion."""
+
+    def __init__(self, criterion, distribution):
+        self.criterion = criterion
+        self.distribution = dict(sorted(distribution.items()))
+        self.count = sum(self.distribution.values())
+        total = sum(points * n for points, n in self.distribution.items())
+        self.average = round(total / self.count, 1) if self.count else None
+        self.minimum = min(self.distribution) if self.count else None
+        self.maximum = max(self.distribution) if self.count else None
+
+    @property
+    def average_percentage(self):
+        if self.average is None or not self.criterion.max_points:
+            return None
+        return round(self.average / self.criterion.max_points * 100, 1)
+
+
+def points_by_submission(submission_ids):
+    """Return ``{submission_id: {criterion_id: points}}`` using one query."""
+    submission_ids = list(submission_ids)
+    if not submission_ids:
+        return {}
+    result = {}
+    rows = db.session.execute(
+        select(RubricScore.submission_id, RubricScore.criterion_id, RubricScore.points)
+        .where(RubricScore.submission_id.in_(submission_ids))
+    )
+    for submission_id, criterion_id, points in rows:
+        result.setdefault(submission_id, {})[criterion_id] = points
+    return result
+
+
+def replace_points(points):
+    """Store ``{submission_id: {criterion_id: points}}``, replacing earlier scores.
+
+    One DELETE and one executemany INSERT for the whole batch. Does not commit.
+    """
+    if not points:
+        return
+    db.session.execute(delete(RubricScore).where(RubricScore.submission_id.in_(list(points))))
+    rows = [
+        {"submission_id": submission_id, "criterion_id": criterion_id, "points": value}
+        for submission_id, scores in points.items()
+        for criterion_id, value in scores.items()
+    ]
+    if rows:
+        db.session.execute(insert(RubricScore), rows)
+
+
+def delete_for_assignment(assignment_id):
+    """Remove every score on ``assignment_id``; call before deleting its submissions."""
+    db.session.execute(
+        delete(RubricScore)
+        .where(RubricScore.submission_id.in_(select(Submission.id).where(Submission.assignment_id == assignment_id)))
+        .execution_options(synchronize_session=False)
+    )
+
+
+def criterion_stats(criteria):
+    """Return a ``CriterionStats`` for each of ``criteria``, from one GROUP BY."""
+    criteria = list(criteria)
+    if not criteria:
+        return []
+    distributions = {criterion.id: {} for criterion in criteria}
+    rows = db.session.execute(
+        select(RubricScore.criterion_id, RubricScore.points, func.count())
+        .where(RubricScore.criterion_id.in_(list(distributions)))
+        .group_by(RubricScore.criterion_id, RubricScore.points)
+    )
+    for criterion_id, points, count in rows:
+        distributions[criterion_id][points] = count
+    return [CriterionStats(criterion, distributions[criterion.id]) for criterion in criteria]
+
+
+def copy_legacy_scores(connection, batch_size=1000):
+    """Copy ``Submission.rubric_scores`` JSON into ``rubric_score`` rows.
+
+    Used by migration 6. Skips submissions that already have rows and keys
+    that are not a criterion of the submission's assignment. Returns the
+    number of rows written.
+    """
+    submission = Submission.__table__
+    criterion = RubricCriterion.__table__
+    score = RubricScore.__table__
+    valid = set(connection.execute(select(criterion.c.id, criterion.c.assignment_id)).all())
+    done = select(score.c.submission_id)
+
+    written = 0
+    last_id = 0
+    while True:
+        batch = connection.execute(
+            select(submission.c.id, submission.c.assignment_id, submission.c.rubric_scores)
+            .where(submission.c.id > last_id, submission.c.rubric_scores.isnot(None), submission.c.id.notin_(done))
+            .order_by(submission.c.id)
+            .limit(batch_size)
+        ).all()
+        if not batch:
+            return written
+        rows = []
+        for submission_id, assignment_id, blob in batch:
+            if not isinstance(blob, dict):
+                continue
+            for key, value in blob.items():
+                try:
+                    criterion_id, points = int(key), int(value)
+                except (TypeError, ValueError):
+                    continue
+                if (criterion_id, assignment_id) in valid:
+                    rows.append({"submission_id": submission_id, "criterion_id": criterion_id, "points": points})
+        if rows:
+            connection.execute(score.insert(), rows)
+            written += len(rows)
+        last_id = batch[-1].id
@@ -0,0 +1,273 @@
+"""Background generation of AI study plans.
+
+A POST to the study plan page only records a ``StudyPlanJob`` and hands its id
+to a small thread pool, so a slow OpenAI response no longer holds a web worker.
+The page then polls ``/study-plan/jobs/<id>`` until the job is ``done`` or
+``failed``.
+
+The pool size is ``STUDY_PLAN_WORKERS`` and at most ``STUDY_PLAN_MAX_PENDING``
+jobs may be waiting or running at once; beyond that new requests are refused
+instead of queueing without bound. With ``STUDY_PLAN_JOBS_EAGER`` set, jobs run
+inline in the request, which is what the test suite uses.
+
+Answers are looked up in ``app.llm_cache`` first: a request whose prompt was
+answered recently is finished as soon as it is created, without a worker.
+
+With ``STUDY_PLAN_STREAMING`` on, workers request a streamed completion and
+publish each piece to the job's broker channel as it arrives, so the page can
+show the plan while it is being written:
+
+* ``{"type": "delta", "offset": n, "text": ...}`` appends ``text`` to the first
+  ``n`` characters already sent;
+* ``{"type": "reset", "text": ...}`` replaces everything sent so far, after a
+  broken stream was retried without streaming;
+* ``{"type": "done", ...}`` carries the finished job, as from ``to_dict``.
+"""
+import importlib
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import func, select
+
+from app import broker, db, enrollments, llm_cache
+from app.models import Assignment, StudyPlanJob, Submission
+
+UNFINISHED = ("pending", "running")
+
+
+class QueueFull(Exception):
+    """Too many study plans are already waiting to be generated."""
+
+
+def _gpt_client():
+    try:
+        return importlib.import_module("app.main.gpt_client")
+    except Exception:
+        # the OpenAI client isn't available, e.g. no API key
+        return None
+
+
+def _unavailable(question, prompt):
+    return "AI service currently unavailable."
+
+
+def _cache_key(client, comments, assignments):
+    return llm_cache.make_key(client.MODEL, client.SYSTEM_PROMPT, comments, assignments)
+
+
+def _cached_answer(comments, assignments):
+    client = _gpt_client()
+    if client is None:
+        return None
+    return llm_cache.get_cache().get(_cache_key(client, comments, assignments))
+
+
+def channel(job_id):
+    return f"study-plan:{job_id}"
+
+
+def _stream_answer(client, comments, assignments, publish):
+    pieces = []
+    offset = 0
+    try:
+        for piece in client.stream_chatgpt(comments, assignments):
+            publish({"type": "delta", "offset": offset, "text": piece})
+            pieces.append(piece)
+            offset += len(piece)
+    except Exception:
+        current_app.logger.warning("Study plan stream broke off; retrying without streaming", exc_info=True)
+        answer = client.ask_chatgpt(comments, assignments)
+        publish({"type": "reset", "text": answer})
+        return answer
+    return "".join(pieces)
+
+
+def _generate(comments, assignments, publish=None):
+    """Ask the API and cache the answer; warnings and fallbacks are not cached.
+
+    With ``publish``, the answer is streamed and every piece is passed to it.
+    """
+    client = _gpt_client()
+    if client is None:
+        return _unavailable(comments, assignments)
+    if publish is not None:
+        answer = _stream_answer(client, comments, assignments, publish)
+    else:
+        answer = client.ask_chatgpt(comments, assignments)
+    if answer and not answer.startswith("Warning:"):
+        llm_cache.get_cache().set(_cache_key(client, comments, assignments), answer)
+    return answer
+
+
+def _estimate_tokens(text):
+    # roughly four characters per token for English text
+    return (len(text) + 3) // 4
+
+
+def _pending_assignments(student_id):
+    """Upcoming assignments in the student's courses, or general ones, that they have not submitted."""
+    submitted = (
+        select(Submission.id)
+        .where(Submission.assignment_id == Assignment.id, Submission.student_id == student_id)
+        .exists()
+    )
+    return Assignment.query.filter(
+        Assignment.course_id.is_(None) | Assignment.course_id.in_(enrollments.course_ids_subquery(student_id)),
+        Assignment.due_date >= datetime.utcnow(),
+        ~submitted,
+    )
+
+
+def assignment_prompt(student_id, token_budget=None):
+    """Bullet list of the student's upcoming unsubmitted assignments, soonest first.
+
+    The list stops at ``token_budget`` (default ``STUDY_PLAN_PROMPT_TOKENS``)
+    and the rest is summarized in one line, so a large catalog cannot produce
+    an oversized prompt. At most two queries are issued.
+    """
+    if token_budget is None:
+        token_budget = current_app.config.get("STUDY_PLAN_PROMPT_TOKENS", 600)
+    # a line is never shorter than ~8 tokens, so more rows than this can't fit
+    limit = max(token_budget // 8, 1)
+    rows = (
+        _pending_assignments(student_id)
+        .with_entities(Assignment.title, Assignment.due_date, Assignment.points)
+        .order_by(Assignment.due_date.asc(), Assignment.id.asc())
+        .limit(limit + 1)
+        .all()
+    )
+
+    lines = []
+    used = 0
+    for title, due_date, points in rows[:limit]:
+        line = f"- {title}, due {due_date.strftime('%Y-%m-%d')}({points} points)\n"
+        cost = _estimate_tokens(line)
+        if used + cost > token_budget:
+            break
+        lines.append(line)
+        used += cost
+
+    if len(lines) < len(rows):
+        total, last_due = (
+            _pending_assignments(student_id)
+            .with_entities(func.count(Assignment.id), func.max(Assignment.due_date))
+            .one()
+        )
+        lines.append(f"- ...and {total - len(lines)} more assignments due by {last_due.strftime('%Y-%m-%d')}\n")
+    return "".join(lines)
+
+
+def create_job(student_id, comments):
+    """Record a new job, or return the student's unfinished one. Does not commit.
+
+    Raises ``QueueFull`` when ``STUDY_PLAN_MAX_PENDING`` jobs are unfinished.
+    """
+    existing = (
+        StudyPlanJob.query
+        .filter(StudyPlanJob.student_id == student_id, StudyPlanJob.status.in_(UNFINISHED))
+        .order_by(StudyPlanJob.id.desc())
+        .first()
+    )
+    if existing is not None and not expire_stale(existing):
+        return existing
+
+    limit = current_app.config.get("STUDY_PLAN_MAX_PENDING", 20)
+    if StudyPlanJob.query.filter(StudyPlanJob.status.in_(UNFINISHED)).count() >= limit:
+        raise QueueFull()
+
+    job = StudyPlanJob(
+        student_id=student_id,
+        comments=comments,
+        assignments=assignment_prompt(student_id),
+    )
+    cached = _cached_answer(job.comments, job.assignments)
+    if cached is not None:
+        job.status = "done"
+        job.result = cached
+        job.finished_at = datetime.utcnow()
+    db.session.add(job)
+    db.session.flush()
+    return job
+
+
+def run_job(job_id):
+    """Generate the plan for one job and store the outcome. Commits."""
+    job = db.session.get(StudyPlanJob, job_id)
+    if job is None or job.status != "pending":
+        return
+    job.status = "running"
+    job.started_at = datetime.utcnow()
+    db.session.commit()
+
+    publish = None
+    if current_app.config.get("STUDY_PLAN_STREAMING", True):
+        def publish(event):
+            broker.publish(channel(job_id), event)
+
+    try:
+        job.result = _generate(job.comments, job.assignments, publish)
+        job.status = "done"
+    except Exception as exc:
+        current_app.logger.exception("Study plan job %s failed", job_id)
+        job.error = str(exc) or exc.__class__.__name__
+        job.status = "failed"
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+    broker.publish(channel(job_id), dict(to_dict(job), type="done"))
+
+
+def _run_in_app(app, job_id):
+    with app.app_context():
+        try:
+            run_job(job_id)
+        finally:
+            db.session.remove()
+
+
+def _executor(app):
+    executor = app.extensions.get("study_plan_executor")
+    if executor is None:
+        executor = ThreadPoolExecutor(
+            max_workers=app.config.get("STUDY_PLAN_WORKERS", 2),
+            thread_name_prefix="study-plan",
+        )
+        app.extensions["study_plan_executor"] = executor
+    return executor
+
+
+def enqueue(job):
+    """Start a committed job; returns a ``Future`` that resolves when it finishes."""
+    app = current_app._get_current_object()
+    if app.config.get("STUDY_PLAN_JOBS_EAGER"):
+        future = Future()
+        run_job(job.id)
+        future.set_result(None)
+        return future
+    return _executor(app).submit(_run_in_app, app, job.id)
+
+
+def expire_stale(job):
+    """Fail an unfinished job older than ``STUDY_PLAN_JOB_TIMEOUT`` seconds.
+
+    Jobs are held in memory by the pool, so a restart would otherwise leave
+    them pending forever. Returns ``True`` if the job was expired.
+    """
+    timeout = current_app.config.get("STUDY_PLAN_JOB_TIMEOUT", 300)
+    if job.finished or job.created_at > datetime.utcnow() - timedelta(seconds=timeout):
+        return False
+    job.status = "failed"
+    job.error = "Timed out waiting for the study plan."
+    job.finished_at = datetime.utcnow()
+    return True
+
+
+def to_dict(job):
+    return {
+        "id": job.id,
+        "status": job.status,
+        "result": job.result,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
@@ -1,8 +1,8 @@
-from app import create_app, db
+from app import create_app, db, migrations
 
 app = create_app()
 
 with app.app_context():
-    db.create_all()
-    print("Database tables created successfully!")
+    applied = migrations.upgrade()
+    print(f"Database tables created successfully! ({len(applied)} migrations applied)")
     print(f"Database location: {app.config['SQLALCHEMY_DATABASE_URI']}")
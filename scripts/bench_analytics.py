@@ -0,0 +1,119 @@
+"""Time course analytics against the per-student grade calculation.
+
+Usage:
+  source venv/bin/activate && python scripts/bench_analytics.py [--students 5000] [--assignments 60] [--sample 200]
+
+Seeds a SQLite database with one course, the given numbers of enrolled
+students and assignments, and a graded submission for 90% of the
+(student, assignment) pairs. It then times:
+
+* ``analytics.course_analytics``: three queries plus NumPy for the whole course;
+* ``_calculate_weighted_grade`` for ``--sample`` students, extrapolated to the
+  course. This is what a distribution would cost one student at a time.
+
+Both paths must agree on the sampled students' final grades.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Ensure project root is on path when running this script directly
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from sqlalchemy import insert
+
+from app import analytics, create_app, db
+from app.main.routes import _calculate_weighted_grade
+from app.models import Assignment, Course, Enrollment, Submission, User
+
+CATEGORIES = ["homework", "exam", "project"]
+
+
+def make_config(path):
+    class BenchConfig:
+        SQLALCHEMY_DATABASE_URI = "sqlite:///" + path
+        SQLALCHEMY_TRACK_MODIFICATIONS = False
+        SECRET_KEY = "bench"
+        QUERY_INSTRUMENTATION = False
+    return BenchConfig
+
+
+def seed(students, assignments):
+    rng = random.Random(0)
+    course = Course(course_name="Benchmark", course_code="BENCH1")
+    db.session.add(course)
+    db.session.flush()
+    db.session.execute(insert(User), [
+        {"id": i + 1, "username": f"student{i}", "email": f"s{i}@bench.local", "role": "student", "password": "x"}
+        for i in range(students + 1)
+    ])
+    instructor_id = students + 1
+    db.session.execute(insert(Enrollment), [
+        {"user_id": i + 1, "course_id": course.id, "role": "student"} for i in range(students)
+    ])
+    due = datetime(2030, 1, 1)
+    db.session.execute(insert(Assignment), [
+        {"id": a + 1, "title": f"A{a}", "description": "d", "due_date": due + timedelta(days=a), "points": 100,
+         "category": CATEGORIES[a % len(CATEGORIES)], "course_id": course.id, "created_by": instructor_id}
+        for a in range(assignments)
+    ])
+    batch = []
+    for student in range(students):
+        for assignment in range(assignments):
+            if rng.random() < 0.9:
+                batch.append({"assignment_id": assignment + 1, "student_id": student + 1, "status": "Graded",
+                              "score": rng.randint(40, 100), "submitted_at": due})
+        if len(batch) >= 50000:
+            db.session.execute(insert(Submission), batch)
+            batch = []
+    if batch:
+        db.session.execute(insert(Submission), batch)
+    db.session.commit()
+    return course.id
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--students", type=int, default=5000)
+    parser.add_argument("--assignments", type=int, default=60)
+    parser.add_argument("--sample", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app(make_config(os.path.join(tmp, "bench.db")))
+        with app.app_context():
+            began = time.perf_counter()
+            course_id = seed(args.students, args.assignments)
+            print(f"seeded {args.students} students x {args.assignments} assignments "
+                  f"in {time.perf_counter() - began:.1f}s")
+
+            timings = []
+            for _ in range(args.repeat):
+                db.session.expire_all()
+                began = time.perf_counter()
+                report = analytics.course_analytics(course_id)
+                timings.append(time.perf_counter() - began)
+            vectorized = min(timings)
+
+            sample = random.Random(1).sample(range(1, args.students + 1), min(args.sample, args.students))
+            began = time.perf_counter()
+            for student_id in sample:
+                expected = _calculate_weighted_grade(student_id, course_id)["grade"]
+                assert report.final_for(student_id) == expected, (student_id, expected)
+            per_student = (time.perf_counter() - began) / len(sample)
+
+            print(f"{'course_analytics':>28}: {vectorized:8.3f}s for the course "
+                  f"(final mean {report.final.mean}, median {report.final.median})")
+            print(f"{'_calculate_weighted_grade':>28}: {per_student * 1000:8.2f}ms per student, "
+                  f"~{per_student * args.students:.1f}s for the course")
+            print(f"{'speedup':>28}: {per_student * args.students / vectorized:8.1f}x")
+            db.session.remove()
+            db.engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Measure calendar page latency as the total number of assignments grows.
+
+Usage:
+  source venv/bin/activate && python scripts/bench_calendar.py [--sizes 1000 10000 50000] [--repeat 20]
+
+Each size gets a fresh SQLite database in a temporary directory with assignments
+spread over 50 courses and five years. The student's five courses always hold
+the same 500 assignments; every other assignment belongs to other courses.
+The student requests one month of /calendar and the 90-day /calendar/export,
+and the median and worst times are printed. Because the window and the
+enrollment filter are applied in SQL, the times should stay roughly flat as
+the catalog grows.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Ensure project root is on path when running this script directly
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from sqlalchemy import insert
+from werkzeug.security import generate_password_hash
+
+from app import create_app, db
+from app.models import Assignment, Course, Enrollment, User
+
+COURSES = 50
+ENROLLED = 5
+ENROLLED_ASSIGNMENTS = 500
+
+
+def make_config(path):
+    class BenchConfig:
+        SQLALCHEMY_DATABASE_URI = "sqlite:///" + path
+        SQLALCHEMY_TRACK_MODIFICATIONS = False
+        SECRET_KEY = "bench"
+        WTF_CSRF_ENABLED = False
+        QUERY_INSTRUMENTATION = False
+    return BenchConfig
+
+
+def seed(total):
+    rng = random.Random(total)
+    instructor = User(username="bench-instructor", email="i@bench.local", role="instructor",
+                      password=generate_password_hash("password", method="pbkdf2:sha256"))
+    student = User(username="bench-student", email="s@bench.local", role="student",
+                   password=generate_password_hash("password", method="pbkdf2:sha256"))
+    courses = [Course(course_name=f"Course {i}", course_code=f"BENCH{i:03d}") for i in range(COURSES)]
+    db.session.add_all([instructor, student] + courses)
+    db.session.flush()
+    db.session.add_all(Enrollment(user_id=student.id, course_id=c.id) for c in courses[:ENROLLED])
+
+    start = datetime.utcnow() - timedelta(days=4 * 365)
+    rows = [
+        {
+            "title": f"Assignment {i}",
+            "description": "Benchmark assignment",
+            "due_date": start + timedelta(minutes=rng.randrange(5 * 365 * 24 * 60)),
+            "points": 100,
+            "category": "homework",
+            "status": "Published",
+            "allow_submissions": True,
+            "course_id": (
+                courses[i % ENROLLED] if i < ENROLLED_ASSIGNMENTS
+                else courses[ENROLLED + i % (COURSES - ENROLLED)]
+            ).id,
+            "created_by": instructor.id,
+        }
+        for i in range(total)
+    ]
+    db.session.execute(insert(Assignment), rows)
+    db.session.commit()
+
+
+def timed(client, url, repeat):
+    client.get(url)  # warm up
+    samples = []
+    for _ in range(repeat):
+        began = time.perf_counter()
+        response = client.get(url)
+        samples.append((time.perf_counter() - began) * 1000)
+        assert response.status_code == 200, response.status_code
+    return statistics.median(samples), max(samples)
+
+
+def run(size, repeat):
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app(make_config(os.path.join(tmp, "bench.db")))
+        with app.app_context():
+            db.create_all()
+            seed(size)
+        client = app.test_client()
+        client.post("/login", data={"username": "bench-student", "password": "password"})
+        today = datetime.utcnow()
+        month = timed(client, f"/calendar?year={today.year}&month={today.month}", repeat)
+        export = timed(client, "/calendar/export", repeat)
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+    return month, export
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'assignments':>12} {'calendar median':>16} {'max':>8} {'export median':>14} {'max':>8}")
+    for size in args.sizes:
+        (month_median, month_max), (export_median, export_max) = run(size, args.repeat)
+        print(f"{size:>12} {month_median:>13.1f} ms {month_max:>5.1f} ms "
+              f"{export_median:>11.1f} ms {export_max:>5.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
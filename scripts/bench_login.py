@@ -0,0 +1,109 @@
+"""Measure login throughput per core for different password hashing policies.
+
+Usage:
+  source venv/bin/activate && python scripts/bench_login.py [--threads 8] [--seconds 5] [--workers 0 2]
+
+Each policy gets a fresh SQLite database with 200 students whose passwords are
+hashed under that policy. Every client thread posts to /login as a random
+student for the given number of seconds. The script prints logins per second
+in total and per core (logins/s divided by the core count). ``--workers`` sets
+PASSWORD_HASH_WORKERS: 0 hashes on the request threads, N uses a process pool
+of N workers.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+# Ensure project root is on path when running this script directly
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from sqlalchemy import insert
+from werkzeug.security import generate_password_hash
+
+from app import create_app, db
+from app.models import User
+
+STUDENTS = 200
+POLICIES = ["pbkdf2:sha256:1000000", "pbkdf2:sha256:600000", "scrypt:32768:8:1"]
+
+
+def make_config(path, method, workers):
+    class BenchConfig:
+        SQLALCHEMY_DATABASE_URI = "sqlite:///" + path
+        SQLALCHEMY_TRACK_MODIFICATIONS = False
+        SECRET_KEY = "bench"
+        WTF_CSRF_ENABLED = False
+        QUERY_INSTRUMENTATION = False
+        WERKZEUG_PASSWORD_HASH_METHOD = method
+        PASSWORD_HASH_WORKERS = workers
+    return BenchConfig
+
+
+def seed(method):
+    # every student shares one hash so seeding does not dominate the run
+    stored = generate_password_hash("password", method=method)
+    db.session.execute(insert(User), [
+        {"username": f"student{i}", "email": f"s{i}@bench.local", "role": "student", "password": stored}
+        for i in range(STUDENTS)
+    ])
+    db.session.commit()
+
+
+def client_loop(app, deadline, counts, index):
+    rng = random.Random(index)
+    client = app.test_client()
+    while time.perf_counter() < deadline:
+        response = client.post("/login", data={
+            "username": f"student{rng.randrange(STUDENTS)}", "password": "password",
+        })
+        assert response.status_code == 302, response.status_code
+        client.post("/logout")
+        counts[index] += 1
+
+
+def run(method, workers, threads, seconds):
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app(make_config(os.path.join(tmp, "bench.db"), method, workers))
+        with app.app_context():
+            seed(method)
+            if workers:
+                # start the pool's processes before the clock starts
+                from app import passwords
+                passwords.verify(generate_password_hash("x", method="pbkdf2:sha256:1"), "x")
+        counts = [0] * threads
+        deadline = time.perf_counter() + seconds
+        pool = [threading.Thread(target=client_loop, args=(app, deadline, counts, i)) for i in range(threads)]
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+        if "password_pool" in app.extensions:
+            app.extensions["password_pool"].shutdown()
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+    return sum(counts) / seconds
+
+
+def main():
+    cores = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=2 * cores)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, cores])
+    parser.add_argument("--policies", nargs="+", default=POLICIES)
+    args = parser.parse_args()
+
+    print(f"{cores} cores, {args.threads} client threads")
+    print(f"{'policy':>24} {'workers':>8} {'logins/s':>9} {'per core':>9}")
+    for method in args.policies:
+        for workers in args.workers:
+            rate = run(method, workers, args.threads, args.seconds)
+            print(f"{method:>24} {workers:>8} {rate:>9.1f} {rate / cores:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,24 +3,25 @@
 Usage:
   source venv/bin/activate && python scripts/create_messaging_tables.py
 
-This will call SQLAlchemy `create_all()` to ensure new models' tables exist.
+This applies the pending schema migrations (see `flask db-upgrade`), which
+creates new models' tables and adds new columns and indexes to existing ones.
 """
 import os
 import sys
 
 # Ensure project root is on path when running this script directly
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from app import create_app, db
+from app import create_app, db, migrations
 
 if __name__ == "__main__":
     app = create_app()
     with app.app_context():
-        print("Creating/updating database tables with db.create_all()...")
-        db.create_all()
+        print("Creating/updating database tables with migrations.upgrade()...")
+        for version, name in migrations.upgrade():
+            print(f"Applied migration {version}: {name}")
         # print list of tables
-        from sqlalchemy import text
-        res = db.session.execute(text("SELECT name FROM sqlite_master WHERE type='table';")).fetchall()
-        tables = [r[0] for r in res]
+        from sqlalchemy import inspect
+        tables = inspect(db.engine).get_table_names()
         print("Tables now in DB:")
         for t in sorted(tables):
             print(" - ", t)
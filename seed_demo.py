@@ -21,10 +21,11 @@ import argparse
 import random
 from datetime import datetime, timedelta
 
-from app import create_app, db
+from app import create_app, db, gradebook, messaging
 from app.models import (
     User, Course, Assignment, Submission, Announcement,
-    RubricCriterion, Classes, Conversation, ConversationParticipant, Message
+    RubricCriterion, RubricScore, Enrollment, Conversation, ConversationParticipant, Message,
+    GradebookEntry, StudentRisk, StudyPlanJob
 )
 
 
@@ -40,7 +41,12 @@ def clear_demo_data():
         return
 
     # Delete related data
-    # Submissions by demo students
+    # Gradebook rollups and submissions by demo students
+    GradebookEntry.query.filter(GradebookEntry.student_id.in_(demo_user_ids)).delete(synchronize_session=False)
+    StudentRisk.query.filter(StudentRisk.student_id.in_(demo_user_ids)).delete(synchronize_session=False)
+    RubricScore.query.filter(RubricScore.submission_id.in_(
+        db.session.query(Submission.id).filter(Submission.student_id.in_(demo_user_ids))
+    )).delete(synchronize_session=False)
     Submission.query.filter(Submission.student_id.in_(demo_user_ids)).delete(synchronize_session=False)
 
     # Assignments created by demo instructors
@@ -56,8 +62,11 @@ def clear_demo_data():
     # Announcements created by demo users
     Announcement.query.filter(Announcement.created_by.in_(demo_user_ids)).delete(synchronize_session=False)
 
+    # Study plan jobs requested by demo students
+    StudyPlanJob.query.filter(StudyPlanJob.student_id.in_(demo_user_ids)).delete(synchronize_session=False)
+
     # Enrollments for demo users
-    Classes.query.filter(Classes.user.in_(demo_user_ids)).delete(synchronize_session=False)
+    Enrollment.query.filter(Enrollment.user_id.in_(demo_user_ids)).delete(synchronize_session=False)
 
     # Messages and conversations involving demo users
     demo_conversations = Conversation.query.join(ConversationParticipant).filter(
@@ -501,13 +510,12 @@ def seed_enrollments(students, tas, courses):
         student = students[student_key]
         course_ids = [courses[ck].id for ck in course_keys]
 
-        existing = Classes.query.filter_by(user=student.id).first()
+        existing = Enrollment.query.filter_by(user_id=student.id).first()
         if not existing:
-            enrollment = Classes(
-                user=student.id,
-                classes=course_ids
+            db.session.add_all(
+                Enrollment(user_id=student.id, course_id=course_id, role=student.role)
+                for course_id in course_ids
             )
-            db.session.add(enrollment)
             enrollment_count += 1
             print(f"   ✓ Enrolled {student.username} in {len(course_ids)} courses")
         else:
@@ -518,13 +526,12 @@ def seed_enrollments(students, tas, courses):
         ta = tas[ta_key]
         course_ids = [courses[ck].id for ck in course_keys]
 
-        existing = Classes.query.filter_by(user=ta.id).first()
+        existing = Enrollment.query.filter_by(user_id=ta.id).first()
         if not existing:
-            enrollment = Classes(
-                user=ta.id,
-                classes=course_ids
+            db.session.add_all(
+                Enrollment(user_id=ta.id, course_id=course_id, role=ta.role)
+                for course_id in course_ids
             )
-            db.session.add(enrollment)
             enrollment_count += 1
             print(f"   ✓ Enrolled {ta.username} in {len(course_ids)} course(s)")
         else:
@@ -598,13 +605,13 @@ def seed_submissions(assignments, students, courses):
             if is_graded:
                 # Get rubric criteria for scoring
                 rubrics = RubricCriterion.query.filter_by(assignment_id=assignment.id).all()
-                rubric_scores = {}
+                rubric_points = []
                 total_score = 0
 
                 # Generate scores (70-100% of max for each criterion)
                 for rubric in rubrics:
                     score = int(rubric.max_points * random.uniform(0.7, 1.0))
-                    rubric_scores[str(rubric.id)] = score
+                    rubric_points.append(RubricScore(criterion_id=rubric.id, points=score))
                     total_score += score
 
                 submission = Submission(
@@ -614,7 +621,7 @@ def seed_submissions(assignments, students, courses):
                     content=content,
                     status='Graded',
                     score=total_score,
-                    rubric_scores=rubric_scores
+                    rubric_points=rubric_points
                 )
                 graded_count += 1
             else:
@@ -629,6 +636,8 @@ def seed_submissions(assignments, students, courses):
             db.session.add(submission)
             submission_count += 1
 
+    # Submissions were inserted directly, so build the gradebook rollup from them
+    gradebook.rebuild()
     db.session.commit()
     print(f"Created {submission_count} submissions ({graded_count} graded)")
 
@@ -875,6 +884,9 @@ def seed_messages(students, instructors, tas):
 
         conversation_count += 1
 
+    # last_read_at was backdated above, so recount unread messages from scratch
+    db.session.flush()
+    messaging.rebuild_summaries()
     db.session.commit()
     print(f"Created {conversation_count} conversations with {message_count} messages")
 
@@ -11,5 +11,7 @@ class TestConfig:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     WTF_CSRF_ENABLED = False
     SECRET_KEY = "test-secret-key-for-testing-only"
+    QUERY_INSTRUMENTATION = True
     SESSION_PROTECTION = None
     WERKZEUG_PASSWORD_HASH_METHOD = 'pbkdf2:sha256'
+    STUDY_PLAN_JOBS_EAGER = True
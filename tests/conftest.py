@@ -2,8 +2,14 @@
 Pytest configuration and fixtures for the LMS application.
 """
 
+import json
 import pytest
 import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from sqlalchemy import event
 from werkzeug.security import generate_password_hash
 from app import create_app, db
 from app.models import User, Course, Assignment, Announcement, Submission, RubricCriterion
@@ -34,6 +40,78 @@ def runner(app):
     return app.test_cli_runner()
 
 
+class QueryRecorder:
+    """Collects per-request query stats sent by ``app.instrumentation``."""
+
+    def __init__(self):
+        self.requests = []
+
+    def __call__(self, sender, stats, **extra):
+        self.requests.append(stats)
+
+    def worst(self, endpoint=None):
+        candidates = [s for s in self.requests if endpoint is None or s.endpoint == endpoint]
+        return max(candidates, key=lambda stats: stats.count, default=None)
+
+    def assert_max(self, limit, endpoint=None, threshold=3):
+        worst = self.worst(endpoint)
+        if worst is None or worst.count <= limit:
+            return
+        repeats = "".join(f"\n  {n} x {shape}" for shape, n in worst.repeated(threshold))
+        pytest.fail(
+            f"{worst.endpoint} ran {worst.count} queries (budget {limit})."
+            + (f" Repeated statements:{repeats}" if repeats else "")
+        )
+
+
+@pytest.fixture
+def query_counter(app):
+    """Record the queries issued by every request made during the test."""
+    from app.instrumentation import request_queries
+
+    recorder = QueryRecorder()
+    with request_queries.connected_to(recorder, app):
+        yield recorder
+
+
+@pytest.fixture
+def statement_log(app):
+    """Context manager recording the SQL run inside it, for code called directly.
+
+    ``with statement_log() as statements:`` collects each statement's SQL.
+    Requests are covered by ``query_counter`` and ``max_queries`` instead.
+    """
+    @contextmanager
+    def record():
+        statements = []
+
+        def listener(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, "before_cursor_execute", listener)
+        try:
+            yield statements
+        finally:
+            event.remove(db.engine, "before_cursor_execute", listener)
+
+    return record
+
+
+@pytest.fixture(autouse=True)
+def _query_budget(request):
+    """Enforce ``@pytest.mark.max_queries(n, endpoint=None)``.
+
+    No single request (or only requests to ``endpoint``) may exceed ``n`` queries.
+    """
+    marker = request.node.get_closest_marker("max_queries")
+    if marker is None:
+        yield
+        return
+    recorder = request.getfixturevalue("query_counter")
+    yield
+    recorder.assert_max(*marker.args, **marker.kwargs)
+
+
 @pytest.fixture
 def app_context(app):
     """Provide application context for database operations."""
@@ -201,3 +279,118 @@ def rubric_criterion(app_context, assignment):
     db.session.add(criterion)
     db.session.commit()
     return criterion
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    """Local stand-in for the OpenAI chat completions API.
+
+    Replies with ``reply`` (after ``delay`` seconds, or with HTTP ``status``)
+    and keeps the decoded request bodies in ``requests``. Streaming requests get
+    the reply word by word; ``stream_failure`` set to ``"open"`` refuses them
+    and ``"midway"`` sends an error event after the first two words.
+    """
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FakeOpenAIHandler)
+        self.reply = "Fake study plan"
+        self.delay = 0
+        self.status = 200
+        self.stream_failure = None
+        self.requests = []
+
+    @property
+    def base_url(self):
+        host, port = self.server_address
+        return f"http://{host}:{port}/v1"
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get("Content-Length", 0))
+        request_body = json.loads(self.rfile.read(length) or b"{}")
+        server.requests.append(request_body)
+        if server.delay:
+            time.sleep(server.delay)
+        if not self.path.endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+        if server.status != 200 or (request_body.get("stream") and server.stream_failure == "open"):
+            self._send_json(server.status if server.status != 200 else 500,
+                            {"error": {"message": "fake failure", "type": "server_error"}})
+            return
+        if request_body.get("stream"):
+            self._send_stream(request_body)
+            return
+        self._send_json(200, {
+            "id": "chatcmpl-test",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request_body.get("model", "test"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": server.reply},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+        })
+
+    def _stream_chunk(self, request_body, delta, finish_reason=None):
+        payload = {
+            "id": "chatcmpl-test",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": request_body.get("model", "test"),
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+        self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode())
+        self.wfile.flush()
+
+    def _send_stream(self, request_body):
+        server = self.server
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        words = server.reply.split(" ")
+        self._stream_chunk(request_body, {"role": "assistant", "content": ""})
+        for i, word in enumerate(words):
+            if server.stream_failure == "midway" and i == 2:
+                self.wfile.write(b'data: {"error": {"message": "stream interrupted"}}\n\n')
+                self.wfile.flush()
+                self.close_connection = True
+                return
+            self._stream_chunk(request_body, {"content": word if i == 0 else " " + word})
+        self._stream_chunk(request_body, {}, finish_reason="stop")
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        self.close_connection = True
+
+
+@pytest.fixture
+def fake_openai(monkeypatch):
+    """Point ``gpt_client`` at a local fake OpenAI server for the test."""
+    server = FakeOpenAIServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setenv('OPENAI_API_KEY', 'test')
+    monkeypatch.setenv('OPENAI_BASE_URL', server.base_url)
+    import importlib
+    gpt_client = importlib.import_module('app.main.gpt_client')
+    monkeypatch.setattr(gpt_client, 'client', gpt_client.make_client(base_url=server.base_url))
+    yield server
+    server.shutdown()
+    server.server_close()
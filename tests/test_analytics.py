@@ -0,0 +1,102 @@
+"""
+Tests for the course analytics engine.
+"""
+
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+from app import analytics, db
+from app.main.routes import _calculate_weighted_grade
+from app.models import Assignment, Enrollment, Submission, User
+
+
+@pytest.fixture
+def graded_course(app, course, instructor_user):
+    due = datetime.utcnow() + timedelta(days=7)
+    assignments = [
+        Assignment(title='HW1', description='d', due_date=due, points=10, category='homework',
+                   course_id=course.id, created_by=instructor_user.id),
+        Assignment(title='Lab', description='d', due_date=due + timedelta(days=1), points=20, category='lab',
+                   course_id=course.id, created_by=instructor_user.id),
+        Assignment(title='Midterm', description='d', due_date=due + timedelta(days=2), points=50,
+                   category='exam', course_id=course.id, created_by=instructor_user.id),
+        Assignment(title='Project', description='d', due_date=due + timedelta(days=3), points=40,
+                   category='project', course_id=course.id, created_by=instructor_user.id),
+    ]
+    students = [User(username=name, email=f'{name}@test.com', role='student', password='x')
+                for name in ('amy', 'ben', 'cal', 'dee', 'outsider')]
+    db.session.add_all(assignments + students)
+    db.session.flush()
+    hw, lab, exam, project = assignments
+    amy, ben, cal, dee, outsider = students
+    db.session.add_all([Enrollment(user_id=s.id, course_id=course.id) for s in (amy, ben, cal, dee)])
+    db.session.add_all([
+        Submission(assignment_id=hw.id, student_id=amy.id, status='Graded', score=4),
+        Submission(assignment_id=hw.id, student_id=amy.id, status='Graded', score=9),  # replaces the 4
+        Submission(assignment_id=lab.id, student_id=amy.id, status='Graded', score=15),
+        Submission(assignment_id=exam.id, student_id=amy.id, status='Graded', score=40),
+        Submission(assignment_id=project.id, student_id=amy.id, status='Graded', score=30),
+        Submission(assignment_id=hw.id, student_id=ben.id, status='Graded', score=6),
+        Submission(assignment_id=exam.id, student_id=ben.id, status='Submitted'),
+        Submission(assignment_id=exam.id, student_id=cal.id, status='Graded', score=25),
+        Submission(assignment_id=project.id, student_id=cal.id, status='Graded', score=40),
+        Submission(assignment_id=hw.id, student_id=outsider.id, status='Graded', score=1),
+    ])
+    db.session.commit()
+    return course.id, [s.id for s in (amy, ben, cal, dee)], [a.id for a in assignments]
+
+
+def test_finals_match_reference_in_three_queries(app, graded_course, statement_log):
+    course_id, student_ids, assignment_ids = graded_course
+    with statement_log() as statements:
+        report = analytics.course_analytics(course_id)
+
+    assert len(statements) == 3
+    assert report.students == 4 and report.graded_students == 3
+    for student_id in student_ids:
+        assert report.final_for(student_id) == _calculate_weighted_grade(student_id, course_id)['grade']
+
+    amy, ben, cal, dee = student_ids
+    assert report.scores[0, 0] == 9
+    assert np.isnan(report.scores[1, 2])
+    assert report.final_for(dee) is None
+    homework = report.category_distributions['homework']
+    # the lab counts as homework, like an unknown category in the gradebook
+    assert (homework.count, homework.mean, homework.median) == (2, 70.0, 70.0)
+    hw1 = dict((a.title, d) for a, d in report.assignment_distributions)['HW1']
+    assert (hw1.count, hw1.minimum, hw1.maximum) == (2, 60.0, 90.0)
+
+
+def test_distribution_statistics():
+    dist = analytics.Distribution([0, 50, 55, 100, 105, np.nan])
+    assert dist.count == 5
+    assert (dist.mean, dist.median, dist.minimum, dist.maximum) == (62.0, 55.0, 0.0, 105.0)
+    assert dist.percentiles[50] == 55.0
+    counts = [n for _, _, n in dist.histogram]
+    assert counts[0] == 1 and counts[5] == 2 and counts[-1] == 2  # 100 and 105 land in the top bin
+    assert dist.largest_bin == 2
+
+    empty = analytics.Distribution([])
+    assert empty.count == 0 and empty.mean is None and empty.largest_bin == 0
+
+
+def test_score_matrix_keeps_last_submission():
+    rows = [(7, 30, 1.0), (3, 10, 2.0), (7, 30, 5.0), (3, 20, 4.0)]
+    scores = analytics.score_matrix([3, 7], [30, 10, 20], rows)
+    assert scores[1, 0] == 5.0
+    assert scores[0, 1] == 2.0 and scores[0, 2] == 4.0
+    assert np.isnan(scores[0, 0]) and np.isnan(scores[1, 1])
+
+
+def test_course_analytics_page(app, client, graded_course, instructor_user, student_user):
+    course_id = graded_course[0]
+    client.post('/login', data={'username': 'teststudent', 'password': 'password123'})
+    assert client.get(f'/courses/{course_id}/analytics').status_code == 302
+
+    client.post('/logout')
+    client.post('/login', data={'username': 'testinstructor', 'password': 'password123'})
+    response = client.get(f'/courses/{course_id}/analytics')
+    html = response.get_data(as_text=True)
+    assert response.status_code == 200
+    assert '3 of 4 enrolled students' in html
+    assert 'Midterm' in html
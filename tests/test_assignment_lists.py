@@ -0,0 +1,113 @@
+"""
+Tests for the paginated, enrollment-scoped assignment lists.
+"""
+
+from datetime import datetime, timedelta
+import pytest
+from app import db
+from app.models import Assignment, Course, Enrollment, Submission
+
+DAY = timedelta(days=1)
+
+
+def login(client, username):
+    client.post('/logout')
+    client.post('/login', data={'username': username, 'password': 'password123'})
+
+
+@pytest.fixture
+def catalog(app, course, student_user, instructor_user):
+    """One assignment of each status in the student's course, plus a course they are not in."""
+    now = datetime.utcnow()
+    other = Course(course_name='Not Enrolled', course_code='OTHER1')
+    db.session.add(other)
+    db.session.flush()
+    db.session.add(Enrollment(user_id=student_user.id, course_id=course.id))
+
+    def assignment(title, due, course_id=course.id, **kwargs):
+        return Assignment(title=title, description='d', due_date=now + due, points=100, course_id=course_id,
+                          created_by=instructor_user.id, **kwargs)
+
+    rows = {
+        'closed': assignment('Closed One', -3 * DAY, allow_submissions=False),
+        'graded': assignment('Graded One', -2 * DAY),
+        'submitted': assignment('Submitted One', 2 * DAY),
+        'overdue': assignment('Overdue One', -DAY),
+        'pending': assignment('Pending One', 20 * DAY),
+        'general': assignment('General One', 3 * DAY, course_id=None),
+        'hidden': assignment('Other Course One', DAY, course_id=other.id),
+    }
+    db.session.add_all(rows.values())
+    db.session.flush()
+    db.session.add_all([
+        Submission(assignment_id=rows['graded'].id, student_id=student_user.id, status='Graded', score=88),
+        Submission(assignment_id=rows['submitted'].id, student_id=student_user.id, status='Submitted'),
+    ])
+    db.session.commit()
+    return rows
+
+
+def _titles(html):
+    return [t for t in ('Closed One', 'Graded One', 'Overdue One', 'Submitted One', 'General One', 'Pending One',
+                        'Other Course One') if t in html]
+
+
+@pytest.mark.max_queries(3, endpoint='main.assignment_list')
+def test_student_list_is_scoped_and_badged_in_sql(app, client, catalog):
+    login(client, 'teststudent')
+    html = client.get('/assignments').get_data(as_text=True)
+    assert _titles(html) == ['Closed One', 'Graded One', 'Overdue One', 'Submitted One', 'General One', 'Pending One']
+    positions = [html.index(t) for t in _titles(html)]
+    assert positions == sorted(positions)
+    for label in ('Closed', 'Graded', 'Overdue', 'Submitted', 'Pending'):
+        assert f'{label}\n' in html
+
+    html = client.get('/assignments?status=overdue').get_data(as_text=True)
+    assert _titles(html) == ['Overdue One']
+    html = client.get('/assignments?status=graded').get_data(as_text=True)
+    assert _titles(html) == ['Graded One']
+    html = client.get('/assignments?course=0').get_data(as_text=True)
+    assert _titles(html) == ['General One']
+    html = client.get('/assignments?due=week').get_data(as_text=True)
+    assert _titles(html) == ['Submitted One', 'General One']
+    html = client.get('/assignments?due=past&status=bogus').get_data(as_text=True)
+    assert _titles(html) == ['Closed One', 'Graded One', 'Overdue One']
+    # filtering on a course the student is not in shows nothing
+    other = Course.query.filter_by(course_code='OTHER1').first()
+    assert _titles(client.get(f'/assignments?course={other.id}').get_data(as_text=True)) == []
+
+
+def test_pages_keep_filters(app, client, catalog):
+    app.config['ASSIGNMENTS_PAGE_SIZE'] = 2
+    login(client, 'teststudent')
+    html = client.get('/dashboard?due=past').get_data(as_text=True)
+    assert _titles(html) == ['Closed One', 'Graded One']
+    assert '88/100' in html
+    assert 'page=2' in html and 'due=past' in html
+    html = client.get('/dashboard?due=past&page=2').get_data(as_text=True)
+    assert _titles(html) == ['Overdue One']
+    assert 'page=3' not in html
+
+    html = client.get('/assignments?page=3').get_data(as_text=True)
+    assert _titles(html) == ['General One', 'Pending One']
+
+
+def test_only_latest_submission_sets_the_badge(app, client, catalog, student_user):
+    # a resubmission after grading: one row per assignment, badged by the newer submission
+    db.session.add(Submission(assignment_id=catalog['graded'].id, student_id=student_user.id, status='Submitted'))
+    db.session.commit()
+    app.config['ASSIGNMENTS_PAGE_SIZE'] = 3
+    login(client, 'teststudent')
+    html = client.get('/dashboard').get_data(as_text=True)
+    assert _titles(html) == ['Closed One', 'Graded One', 'Overdue One']
+    assert html.count('Graded One') == 1
+    assert 'Submitted</span>' in html and 'Graded</span>' not in html
+    assert '88/100' not in html
+
+
+def test_instructor_list_shows_every_course(app, client, catalog):
+    login(client, 'testinstructor')
+    html = client.get('/assignments?status=pending').get_data(as_text=True)
+    # instructors have no submission of their own, so submitted work still reads as pending
+    assert _titles(html) == ['Submitted One', 'General One', 'Pending One', 'Other Course One']
+    assert html.index('Other Course One') < html.index('Submitted One') < html.index('Pending One')
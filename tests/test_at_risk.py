@@ -0,0 +1,144 @@
+"""
+Tests for the at-risk student pipeline.
+"""
+
+from datetime import datetime, timedelta
+import pytest
+from app import at_risk, db, grading
+from app.models import Assignment, Enrollment, StudentRisk, Submission, User
+
+DAY = timedelta(days=1)
+
+
+@pytest.fixture
+def term(app, course, instructor_user):
+    """amy is on track, ben slips and misses work, cal has submitted nothing."""
+    now = datetime.utcnow()
+
+    def assignment(title, due, **kwargs):
+        return Assignment(title=title, description='d', due_date=due, points=100, course_id=course.id,
+                          created_by=instructor_user.id, **kwargs)
+
+    closed = assignment('Closed', now - 20 * DAY, allow_submissions=False)
+    a1, a2, a3 = assignment('A1', now - 10 * DAY), assignment('A2', now - 5 * DAY), assignment('A3', now - DAY)
+    upcoming = assignment('A4', now + 5 * DAY)
+    students = [User(username=name, email=f'{name}@test.com', role='student', password='x')
+                for name in ('amy', 'ben', 'cal', 'outsider')]
+    db.session.add_all([closed, a1, a2, a3, upcoming] + students)
+    db.session.flush()
+    amy, ben, cal, outsider = students
+    db.session.add_all([Enrollment(user_id=s.id, course_id=course.id) for s in (amy, ben, cal)])
+
+    def submit(a, student, days_late=-1, score=None):
+        return Submission(assignment_id=a.id, student_id=student.id, submitted_at=a.due_date + days_late * DAY,
+                          status='Graded' if score is not None else 'Submitted', score=score)
+
+    db.session.add_all([
+        submit(a1, amy, score=90), submit(a2, amy, score=90), submit(a3, amy, score=90),
+        submit(a1, ben, score=90), submit(a2, ben, days_late=2, score=60),
+        submit(a1, outsider, score=10),
+    ])
+    db.session.commit()
+    return {
+        'now': now, 'course': course.id, 'a3': a3.id, 'upcoming': upcoming.due_date,
+        'amy': amy.id, 'ben': ben.id, 'cal': cal.id,
+    }
+
+
+def _rows(course_id):
+    return {r.student_id: r for r in StudentRisk.query.filter_by(course_id=course_id).all()}
+
+
+def test_full_refresh_scores_signals(app, term):
+    report = at_risk.refresh(now=term['now'])
+    assert report.since is None and report.students == 3
+
+    rows = _rows(term['course'])
+    assert set(rows) == {term['amy'], term['ben'], term['cal']}
+    amy, ben, cal = rows[term['amy']], rows[term['ben']], rows[term['cal']]
+    assert (amy.missed, amy.late_ratio, amy.trend, amy.risk) == (0, 0.0, 0.0, 0.0)
+    # missed 1 of 3 (16.7) + half late (12.5) + 30 points down per assignment (25)
+    assert (ben.past_due, ben.missed, ben.submitted, ben.late) == (3, 1, 2, 1)
+    assert ben.trend == -30.0 and ben.risk == 54.2
+    assert (cal.missed, cal.late_ratio, cal.trend, cal.risk) == (3, None, None, 50.0)
+
+    ranked = at_risk.ranked([term['course']])
+    assert [(r.student_id, rank) for r, rank in ranked] == [(term['ben'], 1), (term['cal'], 2)]
+
+
+def test_incremental_refresh_only_touches_changes(app, term):
+    first = term['now'] + timedelta(minutes=10)
+    at_risk.refresh(now=first)
+    amy_row = _rows(term['course'])[term['amy']]
+    amy_row.risk = 99.0  # marker: survives as long as amy is not recomputed
+    db.session.commit()
+
+    later = first + timedelta(minutes=30)
+    db.session.add(Submission(assignment_id=term['a3'], student_id=term['cal'], status='Submitted',
+                              submitted_at=later, updated_at=later))
+    db.session.commit()
+    report = at_risk.refresh(now=later + timedelta(minutes=1))
+    assert report.since == first - at_risk.OVERLAP
+    assert report.students == 1
+    rows = _rows(term['course'])
+    assert rows[term['cal']].missed == 2 and rows[term['cal']].late == 1
+    assert rows[term['amy']].risk == 99.0
+
+    # an assignment falling due changes everyone's missed count, so the whole course is rescored
+    report = at_risk.refresh(now=term['upcoming'] + timedelta(hours=1))
+    assert report.students == 3
+    rows = _rows(term['course'])
+    assert rows[term['amy']].risk == 12.5 and rows[term['amy']].missed == 1
+
+    Enrollment.query.filter_by(user_id=term['cal']).delete()
+    db.session.commit()
+    report = at_risk.refresh(now=term['upcoming'] + timedelta(hours=2))
+    assert report.removed == 1
+    assert term['cal'] not in _rows(term['course'])
+
+
+def test_grading_marks_submission_changed(app, term):
+    submission = Submission.query.filter_by(student_id=term['cal']).first()
+    assert submission is None
+    submission = Submission.query.filter_by(student_id=term['amy']).first()
+    submission_id, before = submission.id, submission.updated_at
+    grading.grade(submission.assignment, grading.entries_from_json([{'submission_id': submission_id, 'score': 50}]))
+    assert db.session.get(Submission, submission_id).updated_at > before
+
+
+def test_at_risk_cli_and_dashboard(app, client, runner, term, instructor_user):
+    result = runner.invoke(args=['at-risk', '--show', 'CS101'])
+    assert result.exit_code == 0, result.output
+    assert 'full term' in result.output
+    assert '1. ben' in result.output
+
+    result = runner.invoke(args=['at-risk'])
+    assert 'changes since' in result.output
+    assert runner.invoke(args=['at-risk', '--show', 'NOPE']).exit_code != 0
+
+    client.post('/login', data={'username': 'testinstructor', 'password': 'password123'})
+    html = client.get('/dashboard').get_data(as_text=True)
+    assert 'Students at Risk' in html
+    assert 'ben' in html and 'missed 1 of 3' in html
+
+
+def test_deleted_assignment_rescores_its_course(app, client, term):
+    # real clock times: the deletion is marked with the current time
+    first = datetime.utcnow()
+    at_risk.refresh(now=first)
+    assert _rows(term['course'])[term['cal']].past_due == 3
+
+    client.post('/login', data={'username': 'testinstructor', 'password': 'password123'})
+    assert client.post(f"/assignments/{term['a3']}/delete").status_code == 302
+    assert db.session.get(Assignment, term['a3']) is None
+
+    later = first + at_risk.OVERLAP + timedelta(minutes=1)
+    report = at_risk.refresh(now=later)
+    assert report.students == 3
+    rows = _rows(term['course'])
+    assert rows[term['cal']].past_due == 2 and rows[term['cal']].missed == 2
+    assert rows[term['amy']].past_due == 2 and rows[term['amy']].missed == 0
+
+    # the marker is consumed, so the next run has nothing to redo
+    report = at_risk.refresh(now=later + timedelta(minutes=1))
+    assert report.students == 0
@@ -0,0 +1,230 @@
+"""
+Tests for the pub/sub brokers and the Server-Sent Events endpoints.
+"""
+
+import json
+import socketserver
+import threading
+
+import pytest
+from app.broker import MemoryBroker, RedisBroker, _parse, create_broker, encode_command
+
+
+def login(client, username, password="password123"):
+    return client.post('/login', data={'username': username, 'password': password}, follow_redirects=True)
+
+
+class FakeRedisServer(socketserver.ThreadingTCPServer):
+    """Local stand-in implementing just enough of Redis: PING, PUBLISH, SUBSCRIBE."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FakeRedisHandler)
+        self.lock = threading.Lock()
+        self.channels = {}
+
+
+class FakeRedisHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        buffer = b""
+        server = self.server
+        try:
+            while True:
+                chunk = self.request.recv(65536)
+                if not chunk:
+                    return
+                buffer += chunk
+                while buffer:
+                    try:
+                        command, pos = _parse(buffer)
+                    except Exception:
+                        break
+                    buffer = buffer[pos:]
+                    self.dispatch(server, [part.decode() for part in command])
+        finally:
+            with server.lock:
+                for subscribers in server.channels.values():
+                    subscribers.discard(self.request)
+
+    def dispatch(self, server, command):
+        name = command[0].upper()
+        if name == "PING":
+            self.request.sendall(b"+PONG\r\n")
+        elif name == "SUBSCRIBE":
+            for count, channel in enumerate(command[1:], start=1):
+                with server.lock:
+                    server.channels.setdefault(channel, set()).add(self.request)
+                # a subscribe confirmation is [b"subscribe", channel, count]
+                reply = b"*3\r\n" + encode_command("subscribe", channel)[4:] + b":%d\r\n" % count
+                self.request.sendall(reply)
+        elif name == "PUBLISH":
+            channel, payload = command[1], command[2]
+            with server.lock:
+                subscribers = list(server.channels.get(channel, ()))
+            for sock in subscribers:
+                sock.sendall(encode_command("message", channel, payload))
+            self.request.sendall(b":%d\r\n" % len(subscribers))
+        else:
+            self.request.sendall(b"-ERR unknown command\r\n")
+
+
+@pytest.fixture
+def fake_redis():
+    server = FakeRedisServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_resp_round_trip():
+    buffer = encode_command("PUBLISH", "chan", "data") + b"+OK\r\n"
+    value, pos = _parse(buffer)
+    assert value == [b"PUBLISH", b"chan", b"data"]
+    assert _parse(buffer, pos) == ("OK", len(buffer))
+
+
+def test_memory_broker_fan_out_and_unsubscribe():
+    broker = MemoryBroker()
+    first = broker.subscribe("a")
+    second = broker.subscribe("a", "b")
+
+    assert broker.publish("a", {"n": 1}) == 2
+    assert broker.publish("b", {"n": 2}) == 1
+    assert first.get(timeout=0.1) == {"n": 1}
+    assert second.get(timeout=0.1) == {"n": 1}
+    assert second.get(timeout=0.1) == {"n": 2}
+    assert first.get(timeout=0.01) is None
+
+    first.close()
+    second.close()
+    assert broker.publish("a", {"n": 3}) == 0
+
+
+def test_redis_broker_against_local_server(fake_redis):
+    host, port = fake_redis.server_address
+    broker = create_broker(f"redis://{host}:{port}")
+    assert isinstance(broker, RedisBroker)
+
+    subscription = broker.subscribe("conversation:1")
+    assert broker.publish("conversation:1", {"type": "message", "id": 7}) == 1
+    assert broker.publish("conversation:2", {"type": "message", "id": 8}) == 0
+    assert subscription.get(timeout=2) == {"type": "message", "id": 7}
+    assert subscription.get(timeout=0.05) is None
+    subscription.close()
+
+
+def test_create_broker_rejects_unknown_scheme():
+    with pytest.raises(ValueError):
+        create_broker("kafka://localhost")
+
+
+def _read_event(chunks):
+    for chunk in chunks:
+        text = chunk.decode() if isinstance(chunk, bytes) else chunk
+        if text.startswith("event:"):
+            lines = dict(line.split(": ", 1) for line in text.strip().split("\n"))
+            return lines["event"], json.loads(lines["data"])
+    return None
+
+
+def test_conversation_stream_receives_posted_messages(app, client, student_user, instructor_user):
+    from app import db
+    from app.models import Conversation, ConversationParticipant
+    conv = Conversation(title='Live')
+    db.session.add(conv)
+    db.session.flush()
+    db.session.add_all([
+        ConversationParticipant(conversation_id=conv.id, user_id=student_user.id),
+        ConversationParticipant(conversation_id=conv.id, user_id=instructor_user.id),
+    ])
+    db.session.commit()
+
+    login(client, 'teststudent')
+    stream = client.get(f'/messages/{conv.id}/stream')
+    inbox_stream = client.get('/messages/stream')
+    assert stream.mimetype == 'text/event-stream'
+
+    client.post(f'/messages/{conv.id}', data={'body': 'Live hello'})
+
+    chunks = iter(stream.response)
+    event, data = _read_event(chunks)
+    assert event == 'message'
+    assert data['conversation_id'] == conv.id
+    assert 'Live hello' in data['html']
+
+    event, data = _read_event(iter(inbox_stream.response))
+    assert (event, data['unread']) == ('unread', 0)
+    stream.close()
+    inbox_stream.close()
+    assert not app.extensions['broker']._subscribers
+
+
+def test_conversation_stream_requires_participant(client, student_user, instructor_user, ta_user):
+    from app import db
+    from app.models import Conversation, ConversationParticipant
+    conv = Conversation(title='Private')
+    db.session.add(conv)
+    db.session.flush()
+    db.session.add(ConversationParticipant(conversation_id=conv.id, user_id=student_user.id))
+    db.session.commit()
+
+    login(client, 'testta')
+    assert client.get(f'/messages/{conv.id}/stream').status_code == 403
+
+
+def _conversation(*users):
+    from app import db
+    from app.models import Conversation, ConversationParticipant
+    conv = Conversation(title='Live')
+    db.session.add(conv)
+    db.session.flush()
+    db.session.add_all([ConversationParticipant(conversation_id=conv.id, user_id=u.id) for u in users])
+    db.session.commit()
+    return conv.id
+
+
+def test_stream_ends_after_max_duration(app, client, student_user, instructor_user):
+    app.config['SSE_MAX_STREAM_SECONDS'] = 0.2
+    conv_id = _conversation(student_user, instructor_user)
+    login(client, 'teststudent')
+    stream = client.get(f'/messages/{conv_id}/stream')
+    # the generator returns on its own; the browser's EventSource then reconnects
+    assert list(stream.response) == [b'retry: 3000\n\n']
+    stream.close()
+    assert not app.extensions['broker']._subscribers
+    assert not app.extensions['sse_streams']
+
+
+def test_streams_per_user_are_capped(app, client, student_user, instructor_user):
+    app.config['SSE_MAX_STREAMS_PER_USER'] = 2
+    conv_id = _conversation(student_user, instructor_user)
+    login(client, 'teststudent')
+    open_streams = [client.get('/messages/stream'), client.get(f'/messages/{conv_id}/stream')]
+    refused = client.get('/messages/stream')
+    assert refused.status_code == 429 and refused.headers['Retry-After']
+    open_streams.pop().close()
+    again = client.get(f'/messages/{conv_id}/stream')
+    assert again.status_code == 200
+    for stream in open_streams + [again]:
+        stream.close()
+    assert not app.extensions['sse_streams']
+
+
+def test_reconnect_replays_messages_after_last_event_id(app, client, student_user, instructor_user):
+    conv_id = _conversation(student_user, instructor_user)
+    login(client, 'teststudent')
+    for body in ('first', 'second', 'third'):
+        client.post(f'/messages/{conv_id}', data={'body': body})
+    from app.models import Message
+    first = Message.query.filter_by(conversation_id=conv_id).order_by(Message.id).first()
+
+    stream = client.get(f'/messages/{conv_id}/stream', headers={'Last-Event-ID': str(first.id)})
+    chunks = iter(stream.response)
+    replayed = [_read_event(chunks)[1] for _ in range(2)]
+    stream.close()
+    assert 'second' in replayed[0]['html'] and 'third' in replayed[1]['html']
+    assert replayed[0]['message_id'] > first.id
@@ -5,9 +5,9 @@ def test_calendar_shows_assignments(client, app, student_user, multiple_assignme
     # disable CSRF for test client
     app.config['WTF_CSRF_ENABLED'] = False
     # ensure the student is enrolled in the course so they see events
-    from app.models import Classes
+    from app.models import Enrollment
     with app.app_context():
-        record = Classes(user=student_user.id, classes=[course.id])
+        record = Enrollment(user_id=student_user.id, course_id=course.id)
         from app import db
         db.session.add(record)
         db.session.commit()
@@ -32,9 +32,9 @@ def test_calendar_shows_assignments(client, app, student_user, multiple_assignme
 def test_calendar_export_contains_events(client, app, student_user, multiple_assignments, course):
     app.config['WTF_CSRF_ENABLED'] = False
     # enroll student
-    from app.models import Classes
+    from app.models import Enrollment
     with app.app_context():
-        record = Classes(user=student_user.id, classes=[course.id])
+        record = Enrollment(user_id=student_user.id, course_id=course.id)
         from app import db
         db.session.add(record)
         db.session.commit()
@@ -51,3 +51,135 @@ def test_calendar_export_contains_events(client, app, student_user, multiple_ass
     assert 'Assignment 1' in ics or 'Assignment 2' in ics or 'Assignment 3' in ics
     # ICS should contain DTSTART entries
     assert 'DTSTART' in ics
+
+
+@pytest.mark.max_queries(2, endpoint='main.calendar_view')
+def test_calendar_month_window_is_filtered_in_sql(client, student_user, instructor_user, multiple_courses):
+    from datetime import datetime
+    from app import db
+    from app.models import Assignment, Enrollment
+
+    c1, c2, c3 = multiple_courses
+    db.session.add_all([Enrollment(user_id=student_user.id, course_id=c.id) for c in (c1, c2)])
+
+    def add(title, due, course):
+        db.session.add(Assignment(title=title, description='d', due_date=due,
+                                  course_id=course.id if course else None, created_by=instructor_user.id))
+
+    add('Last second of March', datetime(2030, 3, 31, 23, 59, 59, 500000), c1)
+    add('First of March', datetime(2030, 3, 1), c2)
+    add('Campus wide', datetime(2030, 3, 15), None)
+    add('First of April', datetime(2030, 4, 1), c1)
+    add('End of February', datetime(2030, 2, 28, 23, 59), c2)
+    add('Other course', datetime(2030, 3, 10), c3)
+    db.session.commit()
+
+    client.post('/login', data={'username': 'teststudent', 'password': 'password123'}, follow_redirects=True)
+    html = client.get('/calendar?year=2030&month=3').get_data(as_text=True)
+    for title in ('Last second of March', 'First of March', 'Campus wide'):
+        assert title in html
+    for title in ('First of April', 'End of February', 'Other course'):
+        assert title not in html
+
+
+def test_ical_escaping_and_folding():
+    from app.ical import escape_text, fold
+    assert escape_text('a;b,c\\d\ne') == r'a\;b\,c\\d\ne'
+
+    line = 'DESCRIPTION:' + 'é' * 100
+    folded = fold(line)
+    assert folded.endswith('\r\n')
+    parts = folded[:-2].split('\r\n')
+    assert all(len(p.encode('utf-8')) <= 75 for p in parts)
+    assert all(p.startswith(' ') for p in parts[1:])
+    assert ''.join([parts[0]] + [p[1:] for p in parts[1:]]) == line
+
+
+@pytest.mark.max_queries(2, endpoint='main.calendar_feed')
+def test_calendar_feed_etag_and_conditional_get(app, student_user, instructor_user, course):
+    from datetime import datetime, timedelta
+    from app import db, ical
+    from app.models import Assignment, Enrollment
+
+    db.session.add(Enrollment(user_id=student_user.id, course_id=course.id))
+    first = Assignment(title='Essay; draft, v2', description='Long ' * 40,
+                       due_date=datetime.utcnow() + timedelta(days=3), course_id=course.id,
+                       created_by=instructor_user.id)
+    second = Assignment(title='Quiz', description='q', due_date=datetime.utcnow() + timedelta(days=5),
+                        course_id=course.id, created_by=instructor_user.id)
+    db.session.add_all([first, second])
+    db.session.commit()
+    with app.test_request_context():
+        url = f'/calendar/feed/{ical.feed_token(student_user)}.ics'
+
+    client = app.test_client()  # no login: the token is the credential
+    res = client.get(url)
+    assert res.status_code == 200
+    assert res.mimetype == 'text/calendar'
+    body = res.get_data()
+    assert rb'SUMMARY:Essay\; draft\, v2' in body
+    assert all(len(line) <= 75 for line in body.split(b'\r\n'))
+    etag = res.headers['ETag']
+    assert not etag.startswith('W/')
+    assert client.get(url).get_data() == body  # byte-stable
+
+    assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+
+    first.title = 'Essay final'
+    first.updated_at = datetime.utcnow() + timedelta(seconds=1)
+    db.session.commit()
+    changed = client.get(url, headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert b'Essay final' in changed.get_data()
+
+    etag = changed.headers['ETag']
+    db.session.delete(second)
+    db.session.commit()
+    assert client.get(url, headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_calendar_feed_rejects_bad_token(client):
+    assert client.get('/calendar/feed/not-a-token.ics').status_code == 404
+
+
+def test_calendar_feed_etag_follows_course_code(app, student_user, instructor_user, course):
+    from datetime import datetime, timedelta
+    from app import db, ical
+    from app.models import Assignment, Enrollment
+
+    db.session.add(Enrollment(user_id=student_user.id, course_id=course.id))
+    db.session.add(Assignment(title='Quiz', description='q', due_date=datetime.utcnow() + timedelta(days=2),
+                              course_id=course.id, created_by=instructor_user.id))
+    db.session.commit()
+    with app.test_request_context():
+        url = f'/calendar/feed/{ical.feed_token(student_user)}.ics'
+    client = app.test_client()
+    etag = client.get(url).headers['ETag']
+
+    course.course_code = 'CS102'
+    db.session.commit()
+    changed = client.get(url, headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert b'CATEGORIES:CS102' in changed.get_data()
+
+
+def test_calendar_feed_reset_revokes_old_url(app, client, student_user):
+    from itsdangerous import URLSafeSerializer
+    from app import ical
+
+    with app.test_request_context():
+        old = ical.feed_token(student_user)
+        legacy = URLSafeSerializer(app.config['SECRET_KEY'], salt='calendar-feed').dumps(student_user.id)
+    anonymous = app.test_client()
+    assert anonymous.get(f'/calendar/feed/{old}.ics').status_code == 200
+    assert anonymous.get(f'/calendar/feed/{legacy}.ics').status_code == 200
+
+    client.post('/login', data={'username': 'teststudent', 'password': 'password123'})
+    assert client.post('/calendar/feed/reset').status_code == 302
+    assert anonymous.get(f'/calendar/feed/{old}.ics').status_code == 404
+    assert anonymous.get(f'/calendar/feed/{legacy}.ics').status_code == 404
+    with app.test_request_context():
+        new = ical.feed_token(student_user)
+    assert new != old
+    assert anonymous.get(f'/calendar/feed/{new}.ics').status_code == 200
+    assert new in client.get('/calendar').get_data(as_text=True)
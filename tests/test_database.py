@@ -0,0 +1,98 @@
+"""
+Tests for SQLite connection pragmas and the maintenance command.
+"""
+
+from sqlalchemy import text
+from app import create_app, db, database
+
+
+def _config(path, **extra):
+    class Config:
+        SQLALCHEMY_DATABASE_URI = "sqlite:///" + path
+        SQLALCHEMY_TRACK_MODIFICATIONS = False
+        SECRET_KEY = "test"
+    for key, value in extra.items():
+        setattr(Config, key, value)
+    return Config
+
+
+def test_file_database_gets_tuning_profile(tmp_path):
+    app = create_app(_config(str(tmp_path / "tuned.db")))
+    with app.app_context():
+        values = database.pragma_values()
+        assert values["journal_mode"] == "wal"
+        assert values["synchronous"] == 1  # NORMAL
+        assert values["busy_timeout"] == 5000
+        assert values["cache_size"] == -20000
+        assert values["mmap_size"] == 128 * 1024 * 1024
+        assert values["temp_store"] == 2  # MEMORY
+
+        result = app.test_cli_runner().invoke(args=['db-maintenance'])
+        assert result.exit_code == 0
+        assert 'Checkpointed' in result.output
+        db.session.remove()
+        db.engine.dispose()
+
+
+def test_empty_profile_keeps_sqlite_defaults(tmp_path):
+    app = create_app(_config(str(tmp_path / "plain.db"), SQLITE_PRAGMAS={}))
+    with app.app_context():
+        assert db.session.execute(text("PRAGMA journal_mode")).scalar() == "delete"
+        db.session.remove()
+        db.engine.dispose()
+
+
+def test_memory_database_skips_file_only_pragmas(app, runner):
+    values = database.pragma_values()
+    assert values["journal_mode"] == "memory"
+    assert values["busy_timeout"] == 5000
+
+    result = runner.invoke(args=['db-maintenance'])
+    assert result.exit_code == 0
+    assert 'not in WAL mode' in result.output
+
+
+def test_server_database_gets_pool_options():
+    config = {"DATABASE_POOL_SIZE": 4, "DATABASE_STATEMENT_TIMEOUT_MS": 1500}
+    options = database.engine_options(config, "postgresql://u:p@db/lms")
+    assert options["pool_size"] == 4
+    assert options["pool_pre_ping"] is True
+    assert options["connect_args"] == {"options": "-c statement_timeout=1500"}
+    assert database.engine_options(config, "sqlite:///x.db") == {}
+    assert database.normalize_url("postgres://u:p@db/lms") == "postgresql://u:p@db/lms"
+
+
+def test_read_only_views_use_the_replica(tmp_path):
+    from werkzeug.security import generate_password_hash
+    from app import migrations
+    from app.models import Announcement, User
+
+    app = create_app(_config(
+        str(tmp_path / "primary.db"),
+        DATABASE_REPLICA_URL="sqlite:///" + str(tmp_path / "replica.db"),
+        WTF_CSRF_ENABLED=False,
+    ))
+    with app.app_context():
+        replica = database.replica_engine()
+        migrations.upgrade(replica)
+        user = {"id": 1, "username": "reader", "email": "r@x", "role": "student",
+                "password": generate_password_hash("password123", method="pbkdf2:sha256")}
+        for engine, title in ((db.engine, "From the primary"), (replica, "From the replica")):
+            with engine.begin() as connection:
+                connection.execute(User.__table__.insert(), user)
+                connection.execute(Announcement.__table__.insert(), {"id": 1, "title": title, "body": "b", "created_by": 1})
+
+        client = app.test_client()
+        client.post('/login', data={'username': 'reader', 'password': 'password123'})
+        listing = client.get('/announcements').get_data(as_text=True)
+        assert 'From the replica' in listing and 'From the primary' not in listing
+        # views without @read_only, and writes, stay on the primary
+        assert 'From the primary' in client.get('/announcements/1').get_data(as_text=True)
+        db.session.add(Announcement(title="Written", body="b", created_by=1))
+        db.session.commit()
+        with replica.connect() as connection:
+            assert connection.execute(Announcement.__table__.select()).all()[-1].title == "From the replica"
+
+        db.session.remove()
+        db.engine.dispose()
+        replica.dispose()
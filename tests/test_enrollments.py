@@ -0,0 +1,89 @@
+"""
+Tests for the Enrollment table and the queries built on it.
+"""
+
+from datetime import datetime, timedelta
+from app import db, enrollments
+from app.models import Assignment, Classes, Course, Enrollment, Submission
+
+
+def login(client, username, password="password123"):
+    return client.post('/login', data={'username': username, 'password': password}, follow_redirects=True)
+
+
+def test_migrate_enrollments_cli(runner, student_user, ta_user, multiple_courses):
+    c1, c2, c3 = multiple_courses
+    db.session.add_all([
+        Classes(user=student_user.id, classes=[c1.id, c2.id, 9999]),
+        Classes(user=ta_user.id, classes=[str(c3.id)]),
+    ])
+    db.session.commit()
+
+    result = runner.invoke(args=['migrate-enrollments'])
+    assert result.exit_code == 0
+    assert '3 enrollments created' in result.output
+    assert '1 entries skipped' in result.output
+
+    assert enrollments.member_ids(c1.id) == [student_user.id]
+    assert enrollments.member_ids(c3.id, role='ta') == [ta_user.id]
+    assert enrollments.member_ids(c3.id) == []
+
+
+def test_set_courses_is_diff_based(student_user, multiple_courses):
+    c1, c2, c3 = multiple_courses
+    enrollments.set_courses(student_user, [c1.id, c2.id, c2.id])
+    db.session.commit()
+    first = Enrollment.query.filter_by(course_id=c1.id).one()
+
+    enrollments.set_courses(student_user, [c1.id, c3.id])
+    db.session.commit()
+    assert enrollments.course_ids_for(student_user.id) == [c1.id, c3.id]
+    # unchanged enrollments keep their row
+    assert Enrollment.query.filter_by(course_id=c1.id).one().id == first.id
+
+
+def test_ta_dashboard_only_lists_enrolled_courses(client, ta_user, student_user, instructor_user, multiple_courses):
+    c1, c2, _ = multiple_courses
+    due = datetime.utcnow() + timedelta(days=3)
+    mine = Assignment(title='Mine', description='d', due_date=due, course_id=c1.id, created_by=instructor_user.id)
+    other = Assignment(title='Other', description='d', due_date=due, course_id=c2.id, created_by=instructor_user.id)
+    db.session.add_all([mine, other, Enrollment(user_id=ta_user.id, course_id=c1.id, role='ta')])
+    db.session.flush()
+    db.session.add_all([
+        Submission(assignment_id=mine.id, student_id=student_user.id, content='m'),
+        Submission(assignment_id=other.id, student_id=student_user.id, content='o'),
+    ])
+    db.session.commit()
+
+    login(client, 'testta')
+    html = client.get('/dashboard').get_data(as_text=True)
+    assert 'Mine' in html
+    assert 'Other' not in html
+
+
+def test_legacy_link_cards_still_render(client, student_user, multiple_courses):
+    c1 = multiple_courses[0]
+    db.session.add(Classes(user=student_user.id, classes=[
+        c1.id, {'title': 'Robotics Club', 'link': 'https://club.example.edu', 'course_code': 'CLUB'},
+    ]))
+    db.session.commit()
+    enrollments.migrate_classes()
+    db.session.commit()
+
+    login(client, 'teststudent')
+    html = client.get('/dashboard').get_data(as_text=True)
+    assert 'Python Basics' in html
+    assert 'Robotics Club' in html and 'https://club.example.edu' in html
+
+
+def test_enrollment_role_follows_user_role(student_user, multiple_courses):
+    c1, c2, _ = multiple_courses
+    enrollments.set_courses(student_user, [c1.id, c2.id])
+    db.session.commit()
+    loaded = Enrollment.query.filter_by(course_id=c1.id).one()
+
+    student_user.role = 'ta'
+    db.session.commit()
+    assert loaded.role == 'ta'
+    assert enrollments.member_ids(c2.id) == []
+    assert enrollments.member_ids(c2.id, role='ta') == [student_user.id]
@@ -0,0 +1,120 @@
+"""
+Tests for the persisted gradebook rollup.
+"""
+
+import pytest
+from datetime import datetime, timedelta
+from app import db, gradebook
+from app.models import Assignment, Course, GradebookEntry, RubricCriterion, Submission
+
+
+def login(client, username, password="password123"):
+    return client.post('/login', data={'username': username, 'password': password}, follow_redirects=True)
+
+
+@pytest.fixture
+def graded_course(app_context, student_user, instructor_user):
+    course = Course(course_name='Grades', course_code='GRD1')
+    db.session.add(course)
+    db.session.commit()
+
+    due = datetime.utcnow() + timedelta(days=1)
+    hw = Assignment(title='HW', description='', due_date=due, points=50, category='homework', created_by=instructor_user.id, course_id=course.id)
+    exam = Assignment(title='Exam', description='', due_date=due, points=100, category='exam', created_by=instructor_user.id, course_id=course.id)
+    quiz = Assignment(title='Quiz', description='', due_date=due, points=10, category='quiz', created_by=instructor_user.id, course_id=course.id)
+    db.session.add_all([hw, exam, quiz])
+    db.session.commit()
+
+    db.session.add_all([
+        Submission(assignment_id=hw.id, student_id=student_user.id, status='Graded', score=45),
+        Submission(assignment_id=exam.id, student_id=student_user.id, status='Graded', score=80),
+        Submission(assignment_id=quiz.id, student_id=student_user.id, status='Graded', score=5),
+    ])
+    db.session.commit()
+    return course, hw, exam, quiz
+
+
+def test_rebuild_matches_reference_calculation(graded_course, student_user):
+    from app.main.routes import _calculate_weighted_grade
+    course, *_ = graded_course
+
+    written = gradebook.rebuild()
+    db.session.commit()
+
+    assert written == 2  # quiz folds into homework
+    assert gradebook.grades_for_student(student_user.id)[course.id] == _calculate_weighted_grade(student_user.id, course.id)
+
+
+def test_remove_assignment(graded_course, student_user):
+    from app.main.routes import _calculate_weighted_grade
+    course, hw, exam, quiz = graded_course
+    gradebook.rebuild()
+    db.session.commit()
+
+    gradebook.remove_assignment(exam)
+    Submission.query.filter_by(assignment_id=exam.id).delete()
+    db.session.delete(exam)
+    db.session.commit()
+    info = gradebook.grades_for_student(student_user.id)[course.id]
+    assert 'exam' not in info['category_grades']
+    assert info == _calculate_weighted_grade(student_user.id, course.id)
+
+
+def test_grading_route_updates_gradebook(client, app_context, student_user, instructor_user, course):
+    assignment = Assignment(title='Graded', description='D', due_date=datetime.utcnow() + timedelta(days=2), points=20, category='homework', created_by=instructor_user.id, course_id=course.id)
+    db.session.add(assignment)
+    db.session.flush()
+    crit = RubricCriterion(assignment_id=assignment.id, title='All', max_points=20)
+    sub = Submission(assignment_id=assignment.id, student_id=student_user.id, content='x', status='Submitted')
+    db.session.add_all([crit, sub])
+    db.session.commit()
+
+    login(client, 'testinstructor')
+    client.post(f'/assignments/{assignment.id}/grade', data={'submission_id': sub.id, f'criterion_{crit.id}': '15'})
+    entry = GradebookEntry.query.filter_by(student_id=student_user.id, course_id=course.id).one()
+    assert (entry.earned, entry.possible, entry.percentage) == (15, 20, 75.0)
+
+    # regrading replaces the previous score instead of adding to it
+    client.post(f'/assignments/{assignment.id}/grade', data={'submission_id': sub.id, f'criterion_{crit.id}': '18'})
+    db.session.refresh(entry)
+    assert (entry.earned, entry.possible) == (18, 20)
+
+    client.post(f'/assignments/{assignment.id}/delete')
+    db.session.refresh(entry)
+    assert (entry.earned, entry.possible, entry.percentage) == (0, 0, None)
+
+
+def test_resubmission_drops_out_until_regraded(client, graded_course, student_user):
+    from app import analytics, gradebook_export
+    from app.main.routes import _calculate_weighted_grade
+    from app.models import Enrollment
+    course, hw, exam, quiz = graded_course
+    db.session.add(Enrollment(user_id=student_user.id, course_id=course.id))
+    gradebook.rebuild()
+    db.session.commit()
+
+    login(client, 'teststudent')
+    client.post(f'/assignments/{exam.id}', data={'content': 'second try'})
+    sub = Submission.query.filter_by(assignment_id=exam.id).one()
+    assert (sub.status, sub.score) == ('Submitted', 80)
+
+    stored = gradebook.grades_for_student(student_user.id)[course.id]
+    assert 'exam' not in stored['category_grades']
+    assert stored == _calculate_weighted_grade(student_user.id, course.id)
+    gradebook.rebuild()
+    assert gradebook.grades_for_student(student_user.id)[course.id] == stored
+    assert analytics.course_analytics(course.id).final_for(student_user.id) == stored['grade']
+    _, scores, totals = next(gradebook_export.student_rows(course.id))
+    assert exam.id not in scores
+    assert totals == stored
+
+
+def test_rebuild_gradebook_cli(runner, graded_course, student_user):
+    course, *_ = graded_course
+    result = runner.invoke(args=['rebuild-gradebook', '--course', 'GRD1'])
+    assert result.exit_code == 0
+    assert '2 entries' in result.output
+    assert GradebookEntry.query.filter_by(course_id=course.id).count() == 2
+
+    result = runner.invoke(args=['rebuild-gradebook', '--course', 'NOPE'])
+    assert result.exit_code != 0
@@ -0,0 +1,95 @@
+"""
+Tests for the course gradebook export.
+"""
+
+import csv
+import io
+from datetime import datetime, timedelta
+import pytest
+from app import db, gradebook_export
+from app.main.routes import _calculate_weighted_grade
+from app.models import Assignment, Enrollment, Submission, User
+
+
+@pytest.fixture
+def graded_course(app, course, instructor_user):
+    due = datetime.utcnow() + timedelta(days=7)
+    homework = Assignment(title='HW, part 1', description='d', due_date=due, points=10,
+                          category='homework', course_id=course.id, created_by=instructor_user.id)
+    exam = Assignment(title='Midterm', description='d', due_date=due + timedelta(days=1), points=20,
+                      category='exam', course_id=course.id, created_by=instructor_user.id)
+    students = [User(username=name, email=f'{name}@test.com', role='student', password='x')
+                for name in ('amy', 'ben', 'cal', 'outsider')]
+    db.session.add_all([homework, exam] + students)
+    db.session.flush()
+    amy, ben, cal, outsider = students
+    db.session.add_all([Enrollment(user_id=s.id, course_id=course.id) for s in (amy, ben, cal)])
+    db.session.add_all([
+        Submission(assignment_id=homework.id, student_id=amy.id, status='Graded', score=8),
+        Submission(assignment_id=exam.id, student_id=amy.id, status='Graded', score=15),
+        Submission(assignment_id=homework.id, student_id=ben.id, status='Graded', score=10),
+        Submission(assignment_id=exam.id, student_id=ben.id, status='Submitted'),
+        Submission(assignment_id=homework.id, student_id=outsider.id, status='Graded', score=1),
+    ])
+    db.session.commit()
+    return course, (homework, exam), (amy, ben, cal)
+
+
+def _parse(lines):
+    return list(csv.DictReader(io.StringIO(''.join(lines))))
+
+
+def test_export_matches_weighted_grade_in_two_queries(app, graded_course, statement_log):
+    course, (homework, exam), students = graded_course
+    course_id, homework_id, exam_id = course.id, homework.id, exam.id
+    with statement_log() as statements:
+        rows = _parse(gradebook_export.csv_lines(course_id))
+
+    assert len(statements) == 2
+    assert [r['username'] for r in rows] == ['amy', 'ben', 'cal']
+    amy, ben, cal = rows
+    assert amy['HW, part 1 (#%d)' % homework_id] == '8'
+    assert ben['Midterm (#%d)' % exam_id] == ''
+    assert amy['homework %'] == '80.0' and amy['exam %'] == '75.0'
+    for row, student in zip(rows, students):
+        expected = _calculate_weighted_grade(student.id, course_id)['grade']
+        assert row['final %'] == ('' if expected is None else str(expected))
+
+
+def test_gradebook_export_route(app, client, graded_course, instructor_user, student_user):
+    course = graded_course[0]
+    client.post('/login', data={'username': 'teststudent', 'password': 'password123'})
+    assert client.get(f'/courses/{course.id}/gradebook.csv').status_code == 302
+
+    client.post('/logout')
+    client.post('/login', data={'username': 'testinstructor', 'password': 'password123'})
+    response = client.get(f'/courses/{course.id}/gradebook.csv')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/csv'
+    assert 'CS101_gradebook.csv' in response.headers['Content-Disposition']
+    assert len(_parse([response.get_data(as_text=True)])) == 3
+
+    parquet = client.get(f'/courses/{course.id}/gradebook.parquet')
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        assert parquet.status_code == 501
+    else:
+        assert parquet.status_code == 200
+
+
+def test_export_gradebook_cli(app, runner, graded_course, tmp_path):
+    result = runner.invoke(args=['export-gradebook', 'CS101'])
+    assert result.exit_code == 0
+    assert len(_parse([result.output])) == 3
+
+    assert runner.invoke(args=['export-gradebook', 'NOPE']).exit_code != 0
+
+
+def test_parquet_export(app, graded_course, tmp_path):
+    pq = pytest.importorskip('pyarrow.parquet')
+    path = tmp_path / 'grades.parquet'
+    gradebook_export.write_parquet(graded_course[0].id, str(path))
+    table = pq.read_table(path)
+    assert table.num_rows == 3
+    assert table.column('username').to_pylist() == ['amy', 'ben', 'cal']
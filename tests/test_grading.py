@@ -0,0 +1,126 @@
+"""
+Tests for bulk grading.
+"""
+
+import io
+import pytest
+from app import db, grading, rubrics
+from app.models import GradebookEntry, RubricCriterion, Submission, User
+
+
+@pytest.fixture
+def class_submissions(app, assignment, course):
+    """Five student submissions for an assignment with two rubric criteria."""
+    style = RubricCriterion(assignment_id=assignment.id, title='Style', max_points=40)
+    tests = RubricCriterion(assignment_id=assignment.id, title='Tests', max_points=60)
+    students = [User(username=f'student{i}', email=f's{i}@test.com', role='student', password='x')
+                for i in range(5)]
+    db.session.add_all([style, tests] + students)
+    db.session.flush()
+    subs = [Submission(assignment_id=assignment.id, student_id=s.id, content='x', status='Submitted')
+            for s in students]
+    db.session.add_all(subs)
+    db.session.commit()
+    return assignment.id, (style.id, tests.id), [s.id for s in subs]
+
+
+def _login(client, username):
+    client.post('/logout')
+    client.post('/login', data={'username': username, 'password': 'password123'})
+
+
+def test_grade_validates_everything_before_writing(app, class_submissions):
+    assignment_id, (style, tests), subs = class_submissions
+    entries = grading.entries_from_json({'grades': [
+        {'submission_id': subs[0], 'scores': {str(style): 30, str(tests): 50}},
+        {'submission_id': subs[1], 'scores': {str(style): 41, str(tests): 50}},
+        {'submission_id': subs[2], 'scores': {str(style): 10}},
+        {'submission_id': 999999, 'scores': {}},
+        {'submission_id': subs[0], 'scores': {str(style): 1, str(tests): 1}},
+        {'username': 'student3', 'scores': {'style': 1, 'Nope': 2}},
+    ]})
+    report = grading.grade(db.session.get(Submission, subs[0]).assignment, entries)
+
+    assert report.graded == 0
+    assert [row for row, _ in report.errors] == [2, 3, 4, 5, 6]
+    assert "must be 0-40" in dict(report.errors)[2]
+    assert "missing points for 'Tests'" in dict(report.errors)[3]
+    assert 'graded twice' in dict(report.errors)[5]
+    assert "unknown rubric criterion 'Nope'" in dict(report.errors)[6]
+    assert Submission.query.filter_by(status='Graded').count() == 0
+
+
+def test_grade_batches_updates_and_gradebook(app, client, class_submissions, course, instructor_user, query_counter):
+    assignment_id, (style, tests), subs = class_submissions
+    assignment = db.session.get(Submission, subs[0]).assignment
+    payload = [
+        {'submission_id': sub_id, 'scores': {f'criterion_{style}': 30 + i, 'Tests': 50}}
+        for i, sub_id in enumerate(subs)
+    ]
+    _login(client, 'testinstructor')
+    response = client.post(f'/assignments/{assignment_id}/grade/bulk', json=payload)
+    assert response.get_json() == {'graded': 5, 'errors': []}
+
+    stats = query_counter.worst('main.grade_submissions_bulk')
+    # one statement per kind of write, however many submissions are graded;
+    # new gradebook rows are flushed as ORM inserts, one per student
+    batched = [shape for shape in stats.shapes if not shape.startswith('INSERT INTO gradebook_entry')]
+    assert [shape for shape, _ in stats.repeated(2) if shape in batched] == []
+    writes = [' '.join(shape.split()[:3]) for shape in batched if not shape.startswith('SELECT')]
+    assert writes == ['UPDATE submission SET', 'DELETE FROM rubric_score', 'INSERT INTO rubric_score']
+
+    graded = Submission.query.filter(Submission.id.in_(subs)).order_by(Submission.id).all()
+    assert [s.score for s in graded] == [80, 81, 82, 83, 84]
+    assert rubrics.points_by_submission([subs[0]]) == {subs[0]: {style: 30, tests: 50}}
+    assert all(s.status == 'Graded' and s.submitted_at for s in graded)
+    entries = GradebookEntry.query.filter_by(course_id=course.id).all()
+    assert sorted(e.earned for e in entries) == [80, 81, 82, 83, 84]
+    assert all(e.possible == 100 for e in entries)
+
+    # regrading replaces the earlier points rather than adding to them
+    grading.grade(assignment, grading.entries_from_json([
+        {'submission_id': subs[0], 'scores': {'Style': 0, 'Tests': 0}},
+    ]))
+    entry = GradebookEntry.query.filter_by(course_id=course.id, student_id=graded[0].student_id).one()
+    assert (entry.earned, entry.possible) == (0, 100)
+
+
+def test_csv_entries_skip_blank_rows_and_note_columns(app, class_submissions):
+    assignment_id, _, subs = class_submissions
+    sheet = "username,Style,Tests,comment\nstudent0,40,60,great\nstudent1,,,\nstudent2,20,30,\n"
+    entries = grading.entries_from_csv(io.StringIO(sheet))
+    assert [e['row'] for e in entries] == [2, 4]
+
+    report = grading.grade(db.session.get(Submission, subs[0]).assignment, entries)
+    assert report.graded == 2
+    assert db.session.get(Submission, subs[2]).score == 50
+
+    with pytest.raises(grading.GradingError):
+        grading.entries_from_csv(io.StringIO("student,Style\nx,1\n"))
+
+
+def test_bulk_grade_endpoint(app, client, class_submissions, instructor_user, student_user):
+    assignment_id, (style, tests), subs = class_submissions
+    url = f'/assignments/{assignment_id}/grade/bulk'
+    payload = {'grades': [{'submission_id': subs[0], 'scores': {'Style': 40, 'Tests': 60}}]}
+
+    _login(client, 'teststudent')
+    assert client.post(url, json=payload).status_code == 403
+
+    _login(client, 'testinstructor')
+    response = client.post(url, json=payload)
+    assert response.status_code == 200
+    assert response.get_json() == {'graded': 1, 'errors': []}
+
+    response = client.post(url, json={'grades': [{'submission_id': subs[1], 'scores': {'Style': 99, 'Tests': 0}}]})
+    assert response.status_code == 422
+    assert response.get_json()['errors'][0]['row'] == 1
+    assert client.post(url, json={'grades': 'nope'}).status_code == 400
+
+    response = client.post(url, data="submission_id,Style,Tests\n%d,1,2\n" % subs[1], content_type='text/csv')
+    assert response.get_json() == {'graded': 1, 'errors': []}
+
+    upload = {'grades': (io.BytesIO(b"username,Style,Tests\nstudent4,10,10\n"), 'grades.csv')}
+    response = client.post(url, data=upload, content_type='multipart/form-data')
+    assert response.status_code == 302
+    assert db.session.get(Submission, subs[4]).score == 20
@@ -0,0 +1,91 @@
+"""
+Tests for the instructor and TA grading queue.
+"""
+
+from datetime import datetime, timedelta
+import pytest
+from app import db, grading_queue
+from app.models import Assignment, Course, Enrollment, Submission, User
+
+
+def login(client, username):
+    client.post('/logout')
+    client.post('/login', data={'username': username, 'password': 'password123'})
+
+
+@pytest.fixture
+def queue(app, course, instructor_user, ta_user):
+    """30 ungraded and 3 graded submissions over two assignments, plus one in a course the TA is not in."""
+    start = datetime.utcnow() - timedelta(days=10)
+    other = Course(course_name='Elsewhere', course_code='ELSE1')
+    db.session.add(other)
+    db.session.flush()
+    due = datetime.utcnow() + timedelta(days=3)
+    essay, lab, hidden = [
+        Assignment(title=title, description='d', due_date=due, course_id=course_id, created_by=instructor_user.id)
+        for title, course_id in (('Essay', course.id), ('Lab', course.id), ('Hidden', other.id))
+    ]
+    students = [User(username=f'student{n}', email=f's{n}@test.com', role='student', password='x') for n in range(15)]
+    db.session.add_all([essay, lab, hidden, Enrollment(user_id=ta_user.id, course_id=course.id, role='ta')] + students)
+    db.session.flush()
+    submissions = []
+    for n, student in enumerate(students):
+        # interleave so the oldest-first order alternates between the assignments
+        for offset, assignment in ((0, essay), (1, lab)):
+            submissions.append(Submission(assignment_id=assignment.id, student_id=student.id, content='c',
+                                          submitted_at=start + timedelta(hours=2 * n + offset)))
+    submissions += [
+        Submission(assignment_id=essay.id, student_id=students[0].id, status='Graded', score=5, submitted_at=start),
+        Submission(assignment_id=hidden.id, student_id=students[0].id, content='h', submitted_at=start),
+    ]
+    db.session.add_all(submissions)
+    db.session.commit()
+    # unknown submission times sort first
+    Submission.query.filter_by(id=submissions[5].id).update({'submitted_at': None})
+    db.session.commit()
+    return {'essay': essay.id, 'lab': lab.id, 'hidden': hidden.id, 'undated': submissions[5].id}
+
+
+def test_keyset_pages_cover_queue_oldest_first(app, queue, instructor_user):
+    seen, cursor = [], None
+    while True:
+        rows, next_cursor = grading_queue.page(instructor_user, after=grading_queue.decode_cursor(cursor or ''),
+                                               limit=7)
+        seen.extend(rows)
+        if next_cursor is None:
+            break
+        cursor = next_cursor
+    assert len(seen) == 31 and len({s.id for s in seen}) == 31
+    assert seen[0].id == queue['undated']
+    stamps = [s.submitted_at for s in seen[1:]]
+    assert stamps == sorted(stamps)
+    assert all(s.status != 'Graded' for s in seen)
+    assert grading_queue.decode_cursor('nonsense') is None
+
+
+def test_backlog_counts_per_assignment(app, queue, instructor_user, ta_user):
+    backlog = {row.title: row.waiting for row in grading_queue.backlog(instructor_user)}
+    assert backlog == {'Essay': 15, 'Lab': 15, 'Hidden': 1}
+    ta_backlog = grading_queue.backlog(ta_user)
+    assert [(row.title, row.course_name, row.waiting) for row in ta_backlog] == [
+        ('Lab', 'Introduction to Python', 15), ('Essay', 'Introduction to Python', 15),
+    ]
+    rows, _ = grading_queue.page(ta_user, limit=100)
+    assert {s.assignment_id for s in rows} == {queue['essay'], queue['lab']}
+
+
+@pytest.mark.max_queries(6, endpoint='main.dashboard')
+def test_dashboard_queue_page_has_no_lazy_loads(app, client, queue, ta_user):
+    app.config['GRADING_QUEUE_PAGE_SIZE'] = 10
+    login(client, 'testta')
+    html = client.get('/dashboard').get_data(as_text=True)
+    assert '30 waiting' in html
+    assert html.count('Grade now') == 10
+    assert 'Essay · Introduction to Python: 15' in html
+    assert 'Hidden' not in html
+
+    rows, cursor = grading_queue.page(ta_user, limit=10)
+    html = client.get(f'/dashboard?after={cursor}').get_data(as_text=True)
+    assert html.count('Grade now') == 10
+    assert rows[-1].submitted_at.strftime('%b %d, %I:%M %p') not in html
+    assert 'Oldest' in html and 'Next' in html
@@ -0,0 +1,82 @@
+"""
+Tests for the cached user_loader identity.
+"""
+
+from app import db
+from app.models import User
+
+
+def _fresh_request():
+    # the app fixture keeps one app context (and so one g and one session) across requests
+    from flask import g
+    g.pop('_login_user', None)
+    db.session.expunge_all()
+
+
+def _user_selects(client, query_counter, url):
+    """Statements on the user table issued by one request to ``url``."""
+    _fresh_request()
+    assert client.get(url).status_code == 200
+    stats = query_counter.requests[-1]
+    return [shape for shape, n in stats.shapes.items() if 'FROM user' in shape for _ in range(n)]
+
+
+def test_loader_skips_the_user_query_when_cached(app, client, student_user, query_counter):
+    client.post('/login', data={'username': 'teststudent', 'password': 'password123'})
+    _fresh_request()
+    client.get('/courses')  # loads the user and fills the cache
+
+    assert _user_selects(client, query_counter, '/courses') == []
+    # uncached columns still load on demand
+    from app import identity
+    _fresh_request()
+    user = identity.load_user(student_user.id)
+    assert user.username == 'teststudent'
+    assert user.check_password('password123')
+
+
+def test_role_change_evicts_cached_identity(app, client, student_user):
+    client.post('/login', data={'username': 'teststudent', 'password': 'password123'})
+    _fresh_request()
+    assert client.get('/study-plan').status_code == 200  # cached as a student
+
+    user = db.session.get(User, student_user.id)
+    user.role = 'instructor'
+    db.session.commit()
+    _fresh_request()
+
+    # students only: the new role is seen on the next request
+    response = client.get('/study-plan')
+    assert response.status_code == 302
+
+
+def test_cache_can_be_disabled(app, client, student_user, query_counter):
+    from app import identity
+    from app.cache import NullCache
+    app.config['IDENTITY_CACHE_TTL'] = 0
+    identity.init_app(app)
+    assert isinstance(app.extensions['identity_cache'], NullCache)
+
+    client.post('/login', data={'username': 'teststudent', 'password': 'password123'})
+    assert len(_user_selects(client, query_counter, '/courses')) == 1
+
+
+def test_eviction_waits_for_commit(app, student_user):
+    from app import identity
+    cache = app.extensions['identity_cache']
+    identity.load_user(student_user.id)
+    assert cache.get(student_user.id) is not None
+
+    user = db.session.get(User, student_user.id)
+    user.role = 'ta'
+    db.session.flush()
+    # another request could still cache the committed row, so the flush alone evicts nothing
+    assert cache.get(student_user.id) is not None
+    db.session.rollback()
+    db.session.commit()
+    assert cache.get(student_user.id) is not None
+
+    user = db.session.get(User, student_user.id)
+    user.role = 'ta'
+    db.session.commit()
+    assert cache.get(student_user.id) is None
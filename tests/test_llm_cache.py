@@ -0,0 +1,110 @@
+"""
+Tests for the AI answer cache.
+"""
+
+import pytest
+from werkzeug.security import generate_password_hash
+from app import db, llm_cache
+from app.llm_cache import MemoryCache, SqliteCache, create_cache, make_key
+from app.models import StudyPlanJob, User
+
+
+def login(client, username, password="password123"):
+    client.post('/logout')
+    return client.post('/login', data={'username': username, 'password': password}, follow_redirects=True)
+
+
+def test_key_ignores_whitespace_and_case():
+    assert make_key('m', 'sys', 'Focus  on exams\n', '- A') == make_key('m', 'sys', 'focus on exams', '- A ')
+    assert make_key('m', 'sys', 'exams', '- A') != make_key('m', 'sys', 'exams', '- B')
+    assert make_key('m', 'sys', 'x', 'y') != make_key('other', 'sys', 'x', 'y')
+
+
+def test_memory_cache_lru_and_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(llm_cache.time, 'time', lambda: now[0])
+    cache = MemoryCache(max_entries=2, ttl=60)
+
+    cache.set('a', 'A')
+    cache.set('b', 'B')
+    assert cache.get('a') == 'A'  # a is now most recently used
+    cache.set('c', 'C')
+    assert cache.get('b') is None
+    assert cache.get('a') == 'A'
+
+    now[0] += 61
+    assert cache.get('c') is None
+    assert cache.stats() == {'hits': 2, 'misses': 2, 'entries': 1}
+
+
+def test_sqlite_cache_survives_restart_and_evicts(tmp_path, monkeypatch):
+    path = str(tmp_path / 'cache.db')
+    now = [1000.0]
+    monkeypatch.setattr(llm_cache.time, 'time', lambda: now[0])
+
+    cache = SqliteCache(path, max_entries=2, ttl=60)
+    cache.set('a', 'A')
+    now[0] += 1
+    cache.set('b', 'B')
+    now[0] += 1
+    assert cache.get('a') == 'A'
+    now[0] += 1
+    cache.set('c', 'C')
+
+    reopened = create_cache(f'sqlite:///{path}', max_entries=2, ttl=60)
+    assert isinstance(reopened, SqliteCache)
+    assert reopened.get('a') == 'A'
+    assert reopened.get('b') is None
+    assert len(reopened) == 2
+
+    now[0] += 120
+    assert reopened.get('c') is None
+    # the counts live in the file, so they include the first instance's lookups
+    assert reopened.stats() == {'hits': 2, 'misses': 2, 'entries': 2}
+
+
+def test_create_cache_rejects_unknown_scheme():
+    with pytest.raises(ValueError):
+        create_cache('redis://localhost')
+
+
+def test_identical_prompts_are_answered_from_cache(app, client, student_user, assignment, fake_openai):
+    other = User(username='otherstudent', email='other@test.com',
+                 password=generate_password_hash('password123', method='pbkdf2:sha256'), role='student')
+    db.session.add(other)
+    db.session.commit()
+
+    login(client, 'teststudent')
+    client.post('/study-plan', data={'topics': 'Exams first'})
+    login(client, 'otherstudent')
+    res = client.post('/study-plan', data={'topics': 'exams   first'}, follow_redirects=True)
+
+    assert len(fake_openai.requests) == 1
+    assert b'Fake study plan' in res.data
+    jobs = StudyPlanJob.query.order_by(StudyPlanJob.id).all()
+    assert [job.student_id for job in jobs] == [student_user.id, other.id]
+    assert [job.status for job in jobs] == ['done', 'done']
+    assert jobs[1].started_at is None  # never went through the worker pool
+    assert app.extensions['llm_cache'].stats()['hits'] == 1
+
+
+def test_failed_answers_are_not_cached(app, client, student_user, fake_openai):
+    fake_openai.status = 500
+    login(client, 'teststudent')
+    client.post('/study-plan', data={'topics': 'x'})
+    assert len(app.extensions['llm_cache']) == 0
+
+
+def test_llm_cache_cli(app, runner):
+    app.extensions['llm_cache'].set('k', 'v')
+    result = runner.invoke(args=['llm-cache', '--clear'])
+    assert result.exit_code == 0
+    assert 'MemoryCache: 0 cached answers.' in result.output
+    assert '0 hits, 0 misses, hit rate n/a.' in result.output
+
+    cache = app.extensions['llm_cache']
+    cache.set('k', 'v')
+    for key in ('k', 'k', 'other'):
+        cache.get(key)
+    result = runner.invoke(args=['llm-cache'])
+    assert '2 hits, 1 misses, hit rate 67%.' in result.output
@@ -1,14 +1,14 @@
 import pytest
 from datetime import datetime, timedelta
 from app import db
-from app.models import Classes, Course, Assignment, Submission, RubricCriterion, Announcement
+from app.models import Classes, Enrollment, Course, Assignment, Submission, RubricCriterion, Announcement
 
 
 def login(client, username, password="password123"):
     return client.post('/login', data={'username': username, 'password': password}, follow_redirects=True)
 
 
-def test_selected_course_ids_various_entries(app_context):
+def test_selected_course_ids_various_entries(app_context, student_user):
     # create some courses
     c1 = Course(course_name='C1', course_code='C1')
     c2 = Course(course_name='C2', course_code='C2')
@@ -16,14 +16,21 @@ def test_selected_course_ids_various_entries(app_context):
     db.session.add_all([c1, c2, c3])
     db.session.commit()
 
-    # create classes record with mixed entries
-    rec = Classes(user=1, classes=[c1.id, str(c2.id), {'course_id': c3.id}])
+    # legacy classes record with mixed entries, converted by the one-shot migration
+    rec = Classes(user=student_user.id, classes=[c1.id, str(c2.id), {'course_id': c3.id}, {'title': 'Club', 'link': 'x'}])
     db.session.add(rec)
     db.session.commit()
 
+    from app.enrollments import migrate_classes
+    assert migrate_classes() == (1, 3, 1)
+    db.session.commit()
+    # re-running does not duplicate enrollments
+    assert migrate_classes() == (1, 0, 1)
+
     from app.main.routes import _selected_course_ids
-    ids = _selected_course_ids(1)
+    ids = _selected_course_ids(student_user.id)
     assert set(ids) == {c1.id, c2.id, c3.id}
+    assert {e.role for e in Enrollment.query.all()} == {'student'}
 
 
 def test_assignment_badge_variants(app_context):
@@ -85,9 +92,14 @@ def test_manage_classes_post_and_home_update(client, app_context, student_user,
     login(client, 'teststudent')
     res = client.post('/classes/manage', data={'courses': [str(course.id)]}, follow_redirects=True)
     assert res.status_code == 200
-    # Classes record should exist
-    rec = Classes.query.filter_by(user=student_user.id).first()
+    # Enrollment record should exist
+    rec = Enrollment.query.filter_by(user_id=student_user.id, course_id=course.id).first()
     assert rec is not None
+    assert rec.role == 'student'
+
+    # unchecking every course removes the enrollment
+    client.post('/classes/manage', data={}, follow_redirects=True)
+    assert Enrollment.query.filter_by(user_id=student_user.id).count() == 0
 
 
 def test_assignment_submission_and_grading_flow(client, app_context, student_user, instructor_user, course):
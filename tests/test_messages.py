@@ -74,3 +74,133 @@ def test_access_control_prevents_nonparticipants(app, client, student_user, inst
     res = client.get(f'/messages/{conv.id}', follow_redirects=True)
     html = res.get_data(as_text=True)
     assert 'You are not a participant' in html or res.status_code == 200
+
+
+def test_summary_maintained_on_send_and_read(app, client, student_user, instructor_user):
+    from app import db
+    from app.models import Conversation, ConversationParticipant, Message
+    login(client, 'teststudent')
+    client.post('/messages/new', data={'recipient_id': str(instructor_user.id), 'body': 'First', 'title': 'Thread'})
+    conv = Conversation.query.one()
+    client.post(f'/messages/{conv.id}', data={'body': 'Second'})
+
+    db.session.refresh(conv)
+    last = Message.query.filter_by(body='Second').one()
+    assert conv.last_message_id == last.id
+    assert conv.last_message_at == last.created_at
+
+    instructor_part = ConversationParticipant.query.filter_by(conversation_id=conv.id, user_id=instructor_user.id).one()
+    student_part = ConversationParticipant.query.filter_by(conversation_id=conv.id, user_id=student_user.id).one()
+    assert instructor_part.unread_count == 2
+    assert student_part.unread_count == 0
+
+    # reading the thread clears the counter
+    login(client, 'testinstructor')
+    client.get(f'/messages/{conv.id}')
+    db.session.refresh(instructor_part)
+    assert instructor_part.unread_count == 0
+
+
+@pytest.mark.max_queries(2, endpoint='main.messages_inbox')
+def test_inbox_orders_and_paginates(app, client, student_user, instructor_user):
+    from datetime import datetime, timedelta
+    from app import db
+    from app.models import Conversation, ConversationParticipant, Message
+    app.config['INBOX_PAGE_SIZE'] = 2
+    start = datetime.utcnow() - timedelta(days=10)
+    for n in range(5):
+        conv = Conversation(title=f'Thread {n}', created_at=start)
+        db.session.add(conv)
+        db.session.flush()
+        db.session.add_all([
+            ConversationParticipant(conversation_id=conv.id, user_id=student_user.id),
+            ConversationParticipant(conversation_id=conv.id, user_id=instructor_user.id),
+        ])
+        for i in range(n + 1):
+            db.session.add(Message(conversation_id=conv.id, sender_id=instructor_user.id, body=f'msg {n}-{i}', created_at=start + timedelta(hours=n, minutes=i)))
+    db.session.commit()
+
+    login(client, 'teststudent')
+    html = client.get('/messages').get_data(as_text=True)
+    assert html.index('Thread 4') < html.index('Thread 3')
+    assert 'Thread 2' not in html
+    assert 'msg 4-4' in html
+    html = client.get('/messages?page=3').get_data(as_text=True)
+    assert 'Thread 0' in html and 'Older' not in html
+
+
+def test_rebuild_inbox_cli(app, runner, student_user, instructor_user):
+    from datetime import datetime, timedelta
+    from app import db
+    from app.models import Conversation, ConversationParticipant, Message
+    now = datetime.utcnow()
+    conv = Conversation(title='Old')
+    db.session.add(conv)
+    db.session.flush()
+    part = ConversationParticipant(conversation_id=conv.id, user_id=student_user.id, last_read_at=now - timedelta(hours=1))
+    db.session.add_all([part, ConversationParticipant(conversation_id=conv.id, user_id=instructor_user.id)])
+    db.session.add_all([
+        Message(conversation_id=conv.id, sender_id=instructor_user.id, body='read', created_at=now - timedelta(hours=2)),
+        Message(conversation_id=conv.id, sender_id=instructor_user.id, body='unread', created_at=now),
+    ])
+    db.session.commit()
+    assert part.unread_count == 2
+
+    result = runner.invoke(args=['rebuild-inbox'])
+    assert result.exit_code == 0
+    db.session.refresh(part)
+    db.session.refresh(conv)
+    assert part.unread_count == 1
+    assert conv.latest_message.body == 'unread'
+
+
+@pytest.mark.max_queries(6, endpoint='main.messages_view')
+def test_thread_history_is_keyset_paginated(app, client, student_user, instructor_user):
+    from datetime import datetime, timedelta
+    from app import db
+    from app.models import Conversation, ConversationParticipant, Message
+    app.config['MESSAGES_PAGE_SIZE'] = 3
+    conv = Conversation(title='Long thread')
+    db.session.add(conv)
+    db.session.flush()
+    db.session.add_all([
+        ConversationParticipant(conversation_id=conv.id, user_id=student_user.id),
+        ConversationParticipant(conversation_id=conv.id, user_id=instructor_user.id),
+    ])
+    start = datetime.utcnow() - timedelta(days=1)
+    # two messages share a timestamp so the id tiebreaker matters
+    stamps = [start + timedelta(minutes=i) for i in range(6)] + [start + timedelta(minutes=5)]
+    for i, stamp in enumerate(stamps):
+        db.session.add(Message(conversation_id=conv.id, sender_id=instructor_user.id, body=f'body-{i}', created_at=stamp))
+    db.session.commit()
+
+    login(client, 'teststudent')
+    html = client.get(f'/messages/{conv.id}').get_data(as_text=True)
+    assert [f'body-{i}' in html for i in range(7)] == [False] * 4 + [True] * 3
+    assert 'Load older messages' in html
+
+    seen = []
+    cursor = html.split('data-cursor="')[1].split('"')[0]
+    while cursor:
+        data = client.get(f'/messages/{conv.id}/older', query_string={'before': cursor}).get_json()
+        seen.append(data['html'])
+        cursor = data['older_cursor']
+    older = ''.join(seen)
+    assert all(f'body-{i}' in older for i in range(4))
+    assert older.count('body-') == 4
+
+    assert client.get(f'/messages/{conv.id}/older?before=junk').status_code == 400
+
+
+def test_older_messages_requires_participant(app, client, student_user, instructor_user, ta_user):
+    from app import db
+    from app.models import Conversation, ConversationParticipant
+    conv = Conversation(title='Private')
+    db.session.add(conv)
+    db.session.flush()
+    db.session.add(ConversationParticipant(conversation_id=conv.id, user_id=student_user.id))
+    db.session.commit()
+
+    login(client, 'testta')
+    res = client.get(f'/messages/{conv.id}/older?before=2024-01-01T00:00:00_1')
+    assert res.status_code == 403
@@ -0,0 +1,144 @@
+"""
+Tests for versioned schema migrations and the query plan check.
+"""
+
+import sqlite3
+from app import create_app, db, migrations
+
+NEW_INDEXES = [
+    "ix_conversation_last_message_at",
+    "ix_participant_user_conversation",
+    "ix_participant_conversation_user",
+    "ix_message_conversation_created",
+    "ix_assignment_course_due",
+    "ix_assignment_due_date",
+    "ix_assignment_creator_due",
+    "ix_submission_assignment_student",
+    "ix_submission_student_status",
+    "ix_rubric_criterion_assignment",
+    "ix_announcement_course_created",
+    "ix_announcement_created_at",
+    "ix_gradebook_entry_course",
+    "ix_submission_updated_at",
+]
+NEW_COLUMNS = [
+    ("conversation", "last_message_id"),
+    ("conversation", "last_message_at"),
+    ("conversation_participant", "unread_count"),
+    ("assignment", "updated_at"),
+    ("submission", "updated_at"),
+    ("user", "feed_token_version"),
+]
+
+
+def _legacy_database(path):
+    """Build a database file shaped like one created before any migration existed."""
+    app = create_app(_config(path))
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+    conn = sqlite3.connect(path)
+    conn.execute("DROP TABLE schema_version")
+    for name in NEW_INDEXES:
+        conn.execute(f"DROP INDEX {name}")
+    for table in ("rubric_score", "student_risk", "pipeline_watermark", "course_rescore", "enrollment",
+                  "gradebook_entry"):
+        conn.execute(f"DROP TABLE {table}")
+    for table, column in NEW_COLUMNS:
+        conn.execute(f"ALTER TABLE {table} DROP COLUMN {column}")
+    conn.executescript("""
+        INSERT INTO user (id, username, password, email, role) VALUES
+            (1, 'a', 'x', 'a@x', 'student'), (2, 'b', 'x', 'b@x', 'instructor');
+        INSERT INTO course (id, course_name, course_code) VALUES (1, 'Old Course', 'OLD1');
+        INSERT INTO classes (id, user, classes) VALUES (1, 1, '[1, {"title": "Club", "link": "x"}]');
+        INSERT INTO conversation (id, title, is_group, created_at) VALUES (1, 'Old', 0, '2024-01-01 00:00:00');
+        INSERT INTO conversation_participant (id, conversation_id, user_id) VALUES (1, 1, 1), (2, 1, 2);
+        INSERT INTO message (id, conversation_id, sender_id, body, created_at, deleted) VALUES
+            (1, 1, 2, 'first', '2024-01-02 00:00:00', 0),
+            (2, 1, 2, 'second', '2024-01-03 00:00:00', 0);
+        INSERT INTO assignment (id, title, description, due_date, points, category, status, allow_submissions,
+                                created_by, course_id)
+            VALUES (1, 'HW', 'd', '2024-02-01 00:00:00', 15, 'homework', 'Published', 1, 2, 1);
+        INSERT INTO rubric_criterion (id, assignment_id, title, max_points) VALUES (1, 1, 'A', 10), (2, 1, 'B', 5);
+        INSERT INTO submission (id, assignment_id, student_id, status, score, rubric_scores) VALUES
+            (1, 1, 1, 'Graded', 12, '{"1": 8, "2": 4, "99": 3}');
+    """)
+    conn.commit()
+    conn.close()
+
+
+def _config(path):
+    class Config:
+        SQLALCHEMY_DATABASE_URI = "sqlite:///" + path
+        SQLALCHEMY_TRACK_MODIFICATIONS = False
+        SECRET_KEY = "test"
+    return Config
+
+
+def test_upgrade_migrates_legacy_database(tmp_path):
+    path = str(tmp_path / "legacy.db")
+    _legacy_database(path)
+
+    app = create_app(_config(path))
+    with app.app_context():
+        assert migrations.current_version() == 0
+        applied = migrations.upgrade()
+        assert [version for version, _ in applied] == list(range(1, migrations.HEAD + 1))
+        assert migrations.current_version() == migrations.HEAD
+        assert migrations.upgrade() == []
+        db.session.remove()
+        db.engine.dispose()
+
+    conn = sqlite3.connect(path)
+    indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert set(NEW_INDEXES) <= indexes
+    for table, column in NEW_COLUMNS:
+        assert column in {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    # the conversation summaries were backfilled from the existing messages
+    assert conn.execute("SELECT last_message_id FROM conversation").fetchone() == (2,)
+    assert conn.execute(
+        "SELECT user_id, unread_count FROM conversation_participant ORDER BY user_id"
+    ).fetchall() == [(1, 2), (2, 0)]
+    # rubric scores were copied out of the JSON, dropping the unknown criterion
+    assert conn.execute(
+        "SELECT submission_id, criterion_id, points FROM rubric_score ORDER BY criterion_id"
+    ).fetchall() == [(1, 1, 8), (1, 2, 4)]
+    # enrollments were converted from the legacy Classes JSON
+    assert conn.execute("SELECT user_id, course_id, role FROM enrollment").fetchall() == [(1, 1, 'student')]
+    # the gradebook rollup was filled from the graded submissions
+    assert conn.execute(
+        "SELECT student_id, course_id, category, earned, possible FROM gradebook_entry"
+    ).fetchall() == [(1, 1, 'homework', 12, 15)]
+    # existing assignments were last changed when they fell due
+    assert conn.execute("SELECT updated_at FROM assignment").fetchone() == ('2024-02-01 00:00:00',)
+    # existing submissions count as changed when they were submitted
+    assert conn.execute("SELECT updated_at IS NOT NULL FROM submission").fetchone() == (1,)
+    conn.close()
+
+
+def test_new_database_starts_at_head(tmp_path):
+    app = create_app(_config(str(tmp_path / "new.db")))
+    with app.app_context():
+        assert migrations.current_version() == migrations.HEAD
+        db.session.remove()
+        db.engine.dispose()
+
+
+def test_db_upgrade_cli(runner):
+    result = runner.invoke(args=['db-upgrade'])
+    assert result.exit_code == 0
+    assert f'schema version {migrations.HEAD}' in result.output
+
+
+def test_hot_queries_use_indexes(app, runner):
+    for name, plan, scans in migrations.explain_hot_queries():
+        assert scans == [], f"{name}: {plan}"
+
+    result = runner.invoke(args=['explain-queries'])
+    assert result.exit_code == 0
+    assert 'thread history' in result.output
+
+
+def test_full_scan_is_reported():
+    assert migrations._full_scans(["SCAN assignment"]) == ["SCAN assignment"]
+    assert migrations._full_scans(["SCAN announcement USING INDEX ix_announcement_created_at"]) == []
@@ -0,0 +1,51 @@
+"""
+Tests for the password hashing policy.
+"""
+
+from app import db, passwords
+from app.models import User
+
+
+def test_normalize_fills_in_werkzeug_defaults():
+    assert passwords.normalize("pbkdf2:sha256") == passwords.DEFAULT_METHOD
+    assert passwords.normalize("pbkdf2:sha256:1000") == "pbkdf2:sha256:1000"
+    assert passwords.normalize("scrypt") == "scrypt:32768:8:1"
+
+
+def test_new_hashes_follow_the_policy(app):
+    app.config['WERKZEUG_PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:1000'
+    user = User(username='p', email='p@x')
+    user.set_password('secret')
+    assert user.password.startswith('pbkdf2:sha256:1000$')
+    assert user.check_password('secret')
+    assert not passwords.needs_rehash(user.password)
+
+    app.config['WERKZEUG_PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:2000'
+    assert passwords.needs_rehash(user.password)
+    assert user.check_password('secret')  # old hashes keep working
+
+
+def test_login_rehashes_outdated_password(app, client, student_user):
+    app.config['WERKZEUG_PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:1000'
+    old_hash = student_user.password
+
+    client.post('/login', data={'username': 'teststudent', 'password': 'wrong'})
+    assert db.session.get(User, student_user.id).password == old_hash
+
+    response = client.post('/login', data={'username': 'teststudent', 'password': 'password123'})
+    assert response.status_code == 302
+    user = db.session.get(User, student_user.id)
+    assert user.password.startswith('pbkdf2:sha256:1000$')
+    assert user.check_password('password123')
+
+
+def test_hashing_in_process_pool(app):
+    app.config['PASSWORD_HASH_WORKERS'] = 1
+    app.config['WERKZEUG_PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:1000'
+    try:
+        stored = passwords.hash_password('secret')
+        assert passwords.verify(stored, 'secret')
+        assert not passwords.verify(stored, 'nope')
+        assert 'password_pool' in app.extensions
+    finally:
+        app.extensions.pop('password_pool').shutdown()
@@ -0,0 +1,96 @@
+"""
+Tests for bulk roster import.
+"""
+
+import io
+import pytest
+from app import db, roster
+from app.models import Enrollment, User
+
+ROSTER = """username,email,password,role,course_code
+alice,alice@school.edu,pw-alice,student,CS101
+bob,bob@school.edu,pw-bob,,CS101
+carol,carol@school.edu,pw-carol,ta,
+dave,not-an-email,pw-dave,student,CS101
+alice,alice2@school.edu,pw,student,CS101
+teststudent,student@test.com,,student,CS101
+testinstructor,other@school.edu,pw,instructor,CS101
+erin,erin@school.edu,pw-erin,student,NOPE999
+frank,frank@school.edu,,student,CS101
+"""
+
+
+@pytest.fixture
+def cheap_hashes(app):
+    app.config['WERKZEUG_PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:1000'
+
+
+def test_import_creates_accounts_and_enrollments(app, cheap_hashes, course, student_user, instructor_user):
+    report = roster.import_roster(io.StringIO(ROSTER), batch_size=2)
+
+    assert report.rows == 9
+    assert report.users_created == 3
+    assert report.users_existing == 1
+    assert report.enrollments_created == 3  # alice, bob, teststudent
+    assert [line for line, _ in report.errors] == [5, 6, 8, 9, 10]
+    assert 'duplicate username (first seen on line 2)' in dict(report.errors)[6]
+
+    alice = User.query.filter_by(username='alice').one()
+    assert alice.check_password('pw-alice')
+    assert User.query.filter_by(username='carol').one().role == 'ta'
+    assert Enrollment.query.filter_by(course_id=course.id).count() == 3
+
+    again = roster.import_roster(io.StringIO(ROSTER))
+    assert (again.users_created, again.enrollments_created) == (0, 0)
+    assert again.users_existing == 4
+
+
+def test_missing_columns_are_rejected(app):
+    with pytest.raises(roster.RosterError):
+        roster.import_roster(io.StringIO("name,mail\nx,y\n"))
+
+
+def test_import_roster_cli(app, runner, cheap_hashes, course, tmp_path):
+    path = tmp_path / 'roster.csv'
+    path.write_text("username,email,password\ngina,gina@school.edu,pw1\nhank,hank@school.edu,pw2\n")
+
+    result = runner.invoke(args=['import-roster', str(path), '--course', 'CS101', '--workers', '2'])
+    assert result.exit_code == 0, result.output
+    assert '2 accounts created' in result.output
+    assert Enrollment.query.filter_by(course_id=course.id).count() == 2
+    assert User.query.filter_by(username='hank').one().check_password('pw2')
+
+    result = runner.invoke(args=['import-roster', str(path), '--course', 'NOPE'])
+    assert result.exit_code != 0
+
+
+def test_roster_upload_page(app, client, cheap_hashes, course, instructor_user, student_user, monkeypatch):
+    from app import passwords
+    pools = []
+    real_pool = passwords.process_pool
+
+    def recording_pool(workers):
+        pools.append(workers)
+        return real_pool(workers)
+
+    monkeypatch.setattr(passwords, 'process_pool', recording_pool)
+    app.config['ROSTER_IMPORT_WORKERS'] = 2
+    upload = {'roster': (io.BytesIO(b"username,email,password\nivy,ivy@school.edu,pw\n,x@y.z,pw\n"), 'roster.csv')}
+
+    client.post('/login', data={'username': 'teststudent', 'password': 'password123'})
+    response = client.post(f'/courses/{course.id}/roster', data=upload, content_type='multipart/form-data')
+    assert response.status_code == 302
+    assert User.query.filter_by(username='ivy').first() is None
+
+    client.post('/logout')
+    client.post('/login', data={'username': 'testinstructor', 'password': 'password123'})
+    upload['roster'] = (io.BytesIO(b"username,email,password\nivy,ivy@school.edu,pw\n,x@y.z,pw\n"), 'roster.csv')
+    response = client.post(f'/courses/{course.id}/roster', data=upload, content_type='multipart/form-data')
+    html = response.get_data(as_text=True)
+    assert response.status_code == 200
+    assert '1 accounts created' in html
+    assert 'username is required' in html
+    ivy = User.query.filter_by(username='ivy').one()
+    assert Enrollment.query.filter_by(user_id=ivy.id, course_id=course.id).count() == 1
+    # only the instructor's upload reached the importer, and it hashed in the worker pool
+    assert pools == [2]
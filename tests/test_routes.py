@@ -251,3 +251,58 @@ class TestRoutePermissions:
             inst_course = Course.query.filter_by(course_code='INST101').first()
             assert inst_course is not None
             assert inst_course.course_name == 'Instructor Course'
+
+
+class TestQueryBudgets:
+    """Guard hot pages against N+1 query regressions."""
+
+    @pytest.fixture
+    def enrolled_student(self, student_user, instructor_user):
+        from app.models import Enrollment
+        for n in range(6):
+            course = Course(course_name=f"Course {n}", course_code=f"QB{n}")
+            db.session.add(course)
+            db.session.flush()
+            db.session.add(Enrollment(user_id=student_user.id, course_id=course.id))
+            for i in range(3):
+                assignment = Assignment(
+                    title=f"QB{n}-{i}",
+                    description="d",
+                    due_date=datetime.utcnow() + timedelta(days=i),
+                    course_id=course.id,
+                    created_by=instructor_user.id,
+                )
+                db.session.add(assignment)
+                db.session.flush()
+                db.session.add(Submission(
+                    assignment_id=assignment.id,
+                    student_id=student_user.id,
+                    status="Graded",
+                    score=80,
+                ))
+        db.session.commit()
+        return student_user
+
+    @pytest.mark.max_queries(6)
+    def test_home_query_budget(self, client, enrolled_student):
+        """Home page cost does not grow with the number of enrolled courses."""
+        client.post('/login', data={'username': 'teststudent', 'password': 'password123'})
+        response = client.get('/home')
+        assert response.status_code == 200
+        assert b'Course 5' in response.data
+
+    def test_query_headers_in_debug_mode(self, app, client, student_user):
+        """Debug responses report the query count and repeated statement shapes."""
+        app.debug = True
+        client.post('/login', data={'username': 'teststudent', 'password': 'password123'})
+        response = client.get('/courses')
+        assert int(response.headers['X-Query-Count']) >= 1
+        assert response.headers['X-Query-Repeats'] == '0'
+
+    def test_statement_shape_collapses_values(self):
+        """Statements differing only in literal values share a shape."""
+        from app.instrumentation import statement_shape
+        a = statement_shape("SELECT * FROM course WHERE id = 1 AND code = 'CS1'")
+        b = statement_shape("SELECT *\n  FROM course WHERE id = 22 AND code = 'CS2'")
+        assert a == b
+        assert statement_shape("SELECT 1 WHERE id IN (1, 2, 3)") == statement_shape("SELECT 1 WHERE id IN (4)")
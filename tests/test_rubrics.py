@@ -0,0 +1,60 @@
+"""
+Tests for normalized rubric score storage.
+"""
+
+from app import db, rubrics
+from app.models import RubricCriterion, RubricScore, Submission, User
+
+
+def _login(client, username):
+    client.post('/logout')
+    client.post('/login', data={'username': username, 'password': 'password123'})
+
+
+def test_criterion_stats_from_one_group_by(app, assignment, rubric_criterion, statement_log):
+    other = RubricCriterion(assignment_id=assignment.id, title='Ungraded', max_points=5)
+    students = [User(username=f'r{i}', email=f'r{i}@test.com', role='student', password='x') for i in range(4)]
+    db.session.add_all([other] + students)
+    db.session.flush()
+    subs = [Submission(assignment_id=assignment.id, student_id=s.id, status='Graded') for s in students]
+    db.session.add_all(subs)
+    db.session.flush()
+    rubrics.replace_points({sub.id: {rubric_criterion.id: points} for sub, points in zip(subs, (40, 50, 40, 20))})
+    db.session.commit()
+    criteria = [rubric_criterion, other]
+    for criterion in criteria:
+        criterion.max_points  # reload the expired criteria before counting statements
+
+    with statement_log() as statements:
+        stats, empty = rubrics.criterion_stats(criteria)
+
+    assert len(statements) == 1 and 'GROUP BY' in statements[0]
+    assert stats.distribution == {20: 1, 40: 2, 50: 1}
+    assert (stats.count, stats.average, stats.minimum, stats.maximum) == (4, 37.5, 20, 50)
+    assert stats.average_percentage == 75.0
+    assert (empty.count, empty.average, empty.distribution) == (0, None, {})
+
+
+def test_grading_stores_rows_and_detail_view_reads_them(app, client, assignment, rubric_criterion,
+                                                        submission, instructor_user, student_user):
+    assignment_id, criterion_id, submission_id = assignment.id, rubric_criterion.id, submission.id
+    _login(client, 'testinstructor')
+    for points in (30, 45):
+        client.post(f'/assignments/{assignment_id}/grade',
+                    data={'submission_id': submission_id, f'criterion_{criterion_id}': points})
+
+    rows = RubricScore.query.filter_by(submission_id=submission_id).all()
+    assert [(r.criterion_id, r.points) for r in rows] == [(criterion_id, 45)]
+    assert db.session.get(Submission, submission_id).rubric_scores is None
+
+    html = client.get(f'/assignments/{assignment_id}').get_data(as_text=True)
+    assert 'value="45"' in html
+    assert 'avg 45.0 (90.0%)' in html
+
+    _login(client, 'teststudent')
+    html = client.get(f'/assignments/{assignment_id}').get_data(as_text=True)
+    assert '45 / 50' in html
+
+    _login(client, 'testinstructor')
+    client.post(f'/assignments/{assignment_id}/delete')
+    assert RubricScore.query.count() == 0
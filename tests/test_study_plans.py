@@ -0,0 +1,229 @@
+"""
+Tests for background study plan generation.
+"""
+
+from datetime import datetime, timedelta
+from app import db, study_plans
+from app.models import Assignment, Course, Enrollment, StudyPlanJob, Submission
+
+
+def login(client, username, password="password123"):
+    return client.post('/login', data={'username': username, 'password': password}, follow_redirects=True)
+
+
+def test_post_returns_job_and_page_shows_result(client, student_user, assignment, fake_openai):
+    fake_openai.reply = 'Plan from the fake server'
+    db.session.add(Enrollment(user_id=student_user.id, course_id=assignment.course_id))
+    db.session.commit()
+    login(client, 'teststudent')
+
+    res = client.post('/study-plan', data={'topics': 'exams first'})
+    assert res.status_code == 302
+    job = StudyPlanJob.query.one()
+    assert f'job={job.id}' in res.headers['Location']
+    assert job.status == 'done'
+    assert job.result == 'Plan from the fake server'
+
+    prompt = fake_openai.requests[0]['messages'][1]['content']
+    assert 'exams first' in prompt
+    assert assignment.title in prompt
+
+    page = client.get(res.headers['Location'])
+    assert b'Plan from the fake server' in page.data
+
+    status = client.get(f'/study-plan/jobs/{job.id}').get_json()
+    assert status['status'] == 'done'
+    assert status['result'] == 'Plan from the fake server'
+
+
+def test_json_post_returns_accepted(client, student_user, fake_openai):
+    login(client, 'teststudent')
+    res = client.post('/study-plan', data={'topics': 'x'}, headers={'Accept': 'application/json'})
+    assert res.status_code == 202
+    assert res.get_json()['id'] == StudyPlanJob.query.one().id
+
+
+def test_job_runs_in_worker_pool(app, client, student_user, fake_openai):
+    app.config['STUDY_PLAN_JOBS_EAGER'] = False
+    fake_openai.delay = 0.2
+    login(client, 'teststudent')
+
+    res = client.post('/study-plan', data={'topics': 'slow please'}, headers={'Accept': 'application/json'})
+    assert res.status_code == 202
+    assert res.get_json()['status'] == 'pending'
+
+    app.extensions['study_plan_executor'].shutdown(wait=True)
+    db.session.expire_all()
+    status = client.get(f"/study-plan/jobs/{res.get_json()['id']}").get_json()
+    assert status['status'] == 'done'
+    assert status['result'] == 'Fake study plan'
+
+
+def test_openai_error_is_reported_in_result(client, student_user, fake_openai):
+    fake_openai.status = 500
+    login(client, 'teststudent')
+    client.post('/study-plan', data={'topics': 'x'})
+    job = StudyPlanJob.query.one()
+    assert job.status == 'done'
+    assert job.result.startswith('Warning: ChatGPT request failed')
+
+
+def test_unexpected_exception_marks_job_failed(client, student_user, monkeypatch):
+    def broken(question, prompt, publish=None):
+        raise RuntimeError('boom')
+
+    monkeypatch.setattr(study_plans, '_generate', broken)
+    login(client, 'teststudent')
+    res = client.post('/study-plan', data={'topics': 'x'}, follow_redirects=True)
+    job = StudyPlanJob.query.one()
+    assert (job.status, job.error) == ('failed', 'boom')
+    assert b'Could not generate a study plan: boom' in res.data
+
+
+def test_unfinished_job_is_reused_unless_stale(student_user):
+    pending = StudyPlanJob(student_id=student_user.id, comments='old')
+    db.session.add(pending)
+    db.session.commit()
+
+    assert study_plans.create_job(student_user.id, 'again').id == pending.id
+
+    pending.created_at = datetime.utcnow() - timedelta(hours=1)
+    job = study_plans.create_job(student_user.id, 'fresh')
+    assert job.id != pending.id
+    assert pending.status == 'failed'
+
+
+def test_full_queue_refuses_new_jobs(app, client, student_user, instructor_user):
+    app.config['STUDY_PLAN_MAX_PENDING'] = 1
+    db.session.add(StudyPlanJob(student_id=instructor_user.id, comments='queued'))
+    db.session.commit()
+
+    login(client, 'teststudent')
+    res = client.post('/study-plan', data={'topics': 'x'})
+    assert res.status_code == 503
+    assert StudyPlanJob.query.count() == 1
+
+
+def test_job_status_is_private(client, student_user, instructor_user):
+    job = StudyPlanJob(student_id=instructor_user.id, comments='theirs')
+    db.session.add(job)
+    db.session.commit()
+
+    login(client, 'teststudent')
+    assert client.get(f'/study-plan/jobs/{job.id}').status_code == 404
+    assert client.get(f'/study-plan?job={job.id}').status_code == 404
+
+
+def _add_assignment(course, creator, title, days, points=100):
+    a = Assignment(title=title, description='d', due_date=datetime.utcnow() + timedelta(days=days),
+                   points=points, course_id=course.id if course else None, created_by=creator.id)
+    db.session.add(a)
+    return a
+
+
+def test_prompt_lists_only_upcoming_unsubmitted_enrolled_work(student_user, instructor_user, multiple_courses):
+    mine, other, _ = multiple_courses
+    db.session.add(Enrollment(user_id=student_user.id, course_id=mine.id))
+    later = _add_assignment(mine, instructor_user, 'Later', 5)
+    _add_assignment(mine, instructor_user, 'Soon', 1)
+    done = _add_assignment(mine, instructor_user, 'Done', 2)
+    _add_assignment(mine, instructor_user, 'Overdue', -1)
+    _add_assignment(other, instructor_user, 'Not my course', 3)
+    _add_assignment(None, instructor_user, 'General', 4)
+    db.session.flush()
+    db.session.add(Submission(assignment_id=done.id, student_id=student_user.id, content='x'))
+    db.session.commit()
+
+    prompt = study_plans.assignment_prompt(student_user.id)
+    assert [line.split(',')[0] for line in prompt.splitlines()] == ['- Soon', '- General', '- Later']
+    assert f"due {later.due_date.strftime('%Y-%m-%d')}(100 points)" in prompt
+
+
+def test_prompt_respects_token_budget_in_two_queries(app, student_user, instructor_user, course, statement_log):
+    db.session.add(Enrollment(user_id=student_user.id, course_id=course.id))
+    for i in range(200):
+        _add_assignment(course, instructor_user, f'Task {i:03d}', 1 + i / 10)
+    db.session.commit()
+    student_id = student_user.id
+
+    with statement_log() as statements:
+        prompt = study_plans.assignment_prompt(student_id, token_budget=100)
+
+    lines = prompt.splitlines()
+    assert len(statements) == 2
+    assert study_plans._estimate_tokens(''.join(l + '\n' for l in lines[:-1])) <= 100
+    assert lines[0].startswith('- Task 000')
+    assert lines[-1].startswith(f'- ...and {200 - (len(lines) - 1)} more assignments due by ')
+
+    app.config['STUDY_PLAN_PROMPT_TOKENS'] = 10000
+    assert len(study_plans.assignment_prompt(student_user.id).splitlines()) == 200
+
+
+def test_stream_chatgpt_yields_pieces(fake_openai):
+    from app.main import gpt_client
+    fake_openai.reply = 'one two three four'
+    pieces = list(gpt_client.stream_chatgpt('q', 'a'))
+    assert len(pieces) == 4
+    assert ''.join(pieces) == 'one two three four'
+    assert fake_openai.requests[0]['stream'] is True
+
+
+def test_stream_chatgpt_falls_back_to_blocking(fake_openai):
+    from app.main import gpt_client
+    fake_openai.stream_failure = 'open'
+    assert list(gpt_client.stream_chatgpt('q', 'a')) == ['Fake study plan']
+
+
+def _run_and_collect(app, student_user):
+    from app import broker
+    job = study_plans.create_job(student_user.id, 'stream it')
+    db.session.commit()
+    subscription = broker.get_broker().subscribe(study_plans.channel(job.id))
+    study_plans.run_job(job.id)
+    events = []
+    while True:
+        event = subscription.get(timeout=0.1)
+        if event is None:
+            break
+        events.append(event)
+    subscription.close()
+    return job, events
+
+
+def test_streamed_job_publishes_deltas(app, student_user, fake_openai):
+    fake_openai.reply = 'alpha beta gamma'
+    job, events = _run_and_collect(app, student_user)
+
+    deltas = [e for e in events if e['type'] == 'delta']
+    assert [e['offset'] for e in deltas] == [0, 5, 10]
+    assert ''.join(e['text'] for e in deltas) == 'alpha beta gamma'
+    assert events[-1]['type'] == 'done'
+    assert events[-1]['result'] == job.result == 'alpha beta gamma'
+
+
+def test_broken_stream_is_retried_without_streaming(app, student_user, fake_openai):
+    fake_openai.reply = 'alpha beta gamma delta'
+    fake_openai.stream_failure = 'midway'
+    job, events = _run_and_collect(app, student_user)
+
+    assert [e['type'] for e in events] == ['delta', 'delta', 'reset', 'done']
+    assert events[2]['text'] == 'alpha beta gamma delta'
+    assert job.status == 'done'
+    assert job.result == 'alpha beta gamma delta'
+
+
+def test_stream_endpoint_sends_finished_job_and_closes(client, student_user, instructor_user, fake_openai):
+    login(client, 'teststudent')
+    client.post('/study-plan', data={'topics': 'x'})
+    job = StudyPlanJob.query.one()
+
+    res = client.get(f'/study-plan/jobs/{job.id}/stream')
+    assert res.mimetype == 'text/event-stream'
+    body = b''.join(res.response).decode()
+    assert 'event: done' in body
+    assert 'Fake study plan' in body
+    res.close()
+
+    client.post('/logout')
+    login(client, 'testinstructor')
+    assert client.get(f'/study-plan/jobs/{job.id}/stream').status_code == 404